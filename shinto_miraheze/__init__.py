@@ -0,0 +1,23 @@
+"""
+shinto_miraheze
+===============
+Maintenance scripts for shinto.miraheze.org.
+
+Each module is a script run as a file (see cleanup_loop.sh), and they
+import their shared helpers by bare name (``from wiki import ...``,
+``from qid_index import QidIndex``). Importing the package puts this
+directory on sys.path so the same modules also import as
+``shinto_miraheze.<script>`` from the repository root:
+
+    from shinto_miraheze import fix_ill_destinations
+    fix_ill_destinations.ILL_RE.sub(fix_ill_destinations.fix_ill, text)
+
+No module logs in or opens a connection when imported; see wiki.py.
+"""
+
+import os
+import sys
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+if _HERE not in sys.path:
+    sys.path.append(_HERE)
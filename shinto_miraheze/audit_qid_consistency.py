@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+audit_qid_consistency.py
+========================
+Read-only audit of the two halves of the category ↔ QID mapping:
+
+- category side: every category page transcluding {{wikidata link|Q...}}
+  (page text read in bulk, 50 pages per request)
+- Q page side: every Q{QID} mainspace page, from the local Q page index
+  (qid_index.py, refreshed incrementally)
+
+The two are joined in memory and every inconsistency is reported in one pass:
+
+  missing_redirect      category declares Q, but no Q page exists
+  wrong_target          Q page redirects to a different category than the
+                        one (and only one) category that declares Q
+  undeclared_duplicate  two or more categories declare Q, but the Q page is
+                        a plain redirect or its dup list is missing some of them
+  orphaned_q_page       Q page points at categories that do not declare Q
+  unrecognized_q_page   Q page for a declared Q is neither a redirect nor a
+                        dup list; left for manual review
+
+The result is written as a JSONL fix plan (one inconsistency per line, with
+a suggested action). Nothing is edited.
+
+This is the audit called for in VISION.md ("Category run race condition").
+
+Usage:
+    python shinto_miraheze/audit_qid_consistency.py
+    python shinto_miraheze/audit_qid_consistency.py --plan-file plan.jsonl
+"""
+
+import argparse
+import json
+import re
+import sys
+
+import mwclient
+
+from qid_index import QidIndex
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL
+
+sys.stdout.reconfigure(encoding="utf-8")
+
+DEFAULT_PLAN_FILE = "shinto_miraheze/audit_qid_consistency.plan.jsonl"
+
+WIKIDATA_TEMPLATE = "Template:Wikidata link"
+QID_RE = re.compile(r"\{\{\s*wikidata[_ ]link\s*\|\s*(Q\d+)\s*[\|\}]", re.IGNORECASE)
+REDIRECT_RE = re.compile(r"^\s*#redirect\b", re.IGNORECASE)
+
+
+def normalize_title(title):
+    """Canonical form of a page title for joining (no leading colon, spaces, first letter upper)."""
+    title = title.strip().lstrip(":").replace("_", " ")
+    title = " ".join(title.split())
+    if ":" in title:
+        ns, rest = title.split(":", 1)
+        rest = rest.strip()
+        title = f"{ns.strip().capitalize()}:{rest[:1].upper()}{rest[1:]}"
+    return title[:1].upper() + title[1:]
+
+
+def load_category_qids(site):
+    """Return {category title: [qids]} for every non-redirect category transcluding {{wikidata link}}."""
+    declared = {}
+    params = {
+        "generator": "embeddedin",
+        "geititle": WIKIDATA_TEMPLATE,
+        "geinamespace": 14,
+        "geilimit": 50,
+        "prop": "revisions",
+        "rvprop": "content",
+        "rvslots": "main",
+        "formatversion": 2,
+    }
+    while True:
+        data = site.api("query", **params)
+        for page in data.get("query", {}).get("pages", []):
+            revisions = page.get("revisions") or []
+            if not revisions:
+                continue
+            text = revisions[0].get("slots", {}).get("main", {}).get("content", "")
+            if REDIRECT_RE.match(text):
+                continue
+            qids = list(dict.fromkeys(q.upper() for q in QID_RE.findall(text)))
+            if qids:
+                declared[page["title"]] = qids
+        if "continue" in data:
+            params.update(data["continue"])
+        else:
+            break
+    return declared
+
+
+def audit(declared, index):
+    """Join category declarations against the Q page index. Returns a list of plan entries."""
+    by_qid = {}
+    for title, qids in declared.items():
+        for qid in qids:
+            by_qid.setdefault(qid, []).append(normalize_title(title))
+
+    plan = []
+    for qid in sorted(by_qid, key=lambda q: int(q[1:])):
+        cats = sorted(set(by_qid[qid]))
+        if qid not in index:
+            if len(cats) == 1:
+                plan.append({"class": "missing_redirect", "qid": qid, "categories": cats,
+                             "action": "create_redirect", "target": cats[0]})
+            else:
+                plan.append({"class": "undeclared_duplicate", "qid": qid, "categories": cats,
+                             "action": "create_dup_list", "entries": cats})
+            continue
+
+        redirect = index.redirect_target(qid)
+        if redirect is not None:
+            target = normalize_title(redirect)
+            if len(cats) > 1:
+                plan.append({"class": "undeclared_duplicate", "qid": qid, "categories": cats,
+                             "current_target": target, "action": "convert_to_dup_list", "entries": cats})
+            elif target != cats[0]:
+                plan.append({"class": "wrong_target", "qid": qid, "categories": cats,
+                             "current_target": target, "action": "retarget_redirect", "target": cats[0]})
+            continue
+
+        listed = {normalize_title(e) for e in index.entries(qid)}
+        if not listed:
+            # Q page with other content; nothing safe to suggest.
+            plan.append({"class": "unrecognized_q_page", "qid": qid, "categories": cats,
+                         "action": "review", "note": "Q page is neither a redirect nor a dup list"})
+            continue
+        missing = [c for c in cats if c not in listed]
+        if missing:
+            plan.append({"class": "undeclared_duplicate", "qid": qid, "categories": cats,
+                         "action": "add_to_dup_list", "entries": missing})
+
+    # Q pages whose targets do not declare that QID
+    declared_pairs = {(qid, c) for qid, cats in by_qid.items() for c in cats}
+    for qid in sorted(index.pages, key=lambda q: int(q[1:])):
+        redirect = index.redirect_target(qid)
+        targets = [redirect] if redirect else index.entries(qid)
+        targets = [normalize_title(t) for t in targets]
+        stale = [t for t in targets if t.startswith("Category:") and (qid, t) not in declared_pairs]
+        if not stale:
+            continue
+        if qid not in by_qid:
+            plan.append({"class": "orphaned_q_page", "qid": qid, "targets": stale,
+                         "action": "review_orphan"})
+        elif not redirect:
+            plan.append({"class": "orphaned_q_page", "qid": qid, "targets": stale,
+                         "action": "remove_from_dup_list", "entries": stale})
+        # A redirect whose QID is declared elsewhere is already reported as wrong_target.
+    return plan
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plan-file", default=DEFAULT_PLAN_FILE, help="Path for the JSONL fix plan.")
+    args = parser.parse_args()
+
+    site = mwclient.Site(
+        WIKI_URL,
+        path=WIKI_PATH,
+        clients_useragent="QidConsistencyAuditBot/1.0 (User:EmmaBot; shinto.miraheze.org)",
+    )
+    site.login(USERNAME, PASSWORD)
+    print(f"Logged in as {USERNAME}\n")
+
+    print("Loading category → QID declarations...")
+    declared = load_category_qids(site)
+    print(f"  {len(declared)} categories declare a QID")
+
+    print("Refreshing Q page index...")
+    index = QidIndex.load()
+    fetched, removed = index.refresh(site)
+    print(f"  {len(index)} Q pages ({fetched} re-read, {removed} removed)\n")
+
+    plan = audit(declared, index)
+    with open(args.plan_file, "w", encoding="utf-8") as f:
+        for entry in plan:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    counts = {}
+    for entry in plan:
+        counts[entry["class"]] = counts.get(entry["class"], 0) + 1
+
+    print("=" * 60)
+    for cls in ("missing_redirect", "wrong_target", "undeclared_duplicate", "orphaned_q_page",
+                "unrecognized_q_page"):
+        print(f"{cls + ':':22} {counts.get(cls, 0)}")
+    print(f"Plan written to {args.plan_file} ({len(plan)} entries)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+benchmark_cleanup_loop.py
+=========================
+Runs the cleanup loop end to end against local_api.py's stand-in wiki and
+reports per stage: API requests, writes, requests per write, bytes
+downloaded and uploaded, wall time and the throttle sleep the stage asked for.
+
+Stages and their arguments are read from cleanup_loop.sh, so the benchmark
+follows the loop as it changes. Each stage runs in its own process, as in
+the loop, from a scratch copy of the scripts, so the state files, logs and
+export cache in the repository are never touched. The wiki persists from
+stage to stage, so later stages see the edits of earlier ones, and the
+special-page reports are refreshed before each stage.
+
+The wiki is either a fixture (--fixture, format in local_api.py) or a
+synthetic one with --pages shrine pages and a backlog for every stage
+(--write-fixture saves it for reuse). Sleeps are counted on a virtual clock
+unless --real-sleep is given. --latency, --max-rps and --edit-rate model the
+real host. --save writes the results as JSON, and --baseline compares a run
+against saved results, e.g. before and after a change.
+
+Usage:
+    python shinto_miraheze/benchmark_cleanup_loop.py
+    python shinto_miraheze/benchmark_cleanup_loop.py --pages 500 --max-edits 50 --latency 0.2
+    python shinto_miraheze/benchmark_cleanup_loop.py --stages migrate_talk_pages,remove_crud_categories
+    python shinto_miraheze/benchmark_cleanup_loop.py --save before.json
+    python shinto_miraheze/benchmark_cleanup_loop.py --baseline before.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import profiling
+from local_api import LocalAPIServer, load_fixture
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+LOOP_SCRIPT = os.path.join(HERE, "cleanup_loop.sh")
+RUN_TAG = "[[github:local/benchmark|benchmark run]]"
+
+STAGE_RE = re.compile(r"^python3 shinto_miraheze/(\S+\.py)(.*?)(?:\s+\|\|.*)?$")
+LIMITED_RE = re.compile(r"^run_limited (\S+) (--\S+)(.*)$")
+DECLARE_RE = re.compile(r'^declare_stage "(.+)"\s*$')
+KNOWN_PREFIXES = ("Module:", "Template:", "Help:", "Category:", "Wikipedia:")
+
+
+def parse_loop(path, max_edits):
+    """Return [(stage name, script, argv)] in the order cleanup_loop.sh runs them."""
+    stages = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            m = DECLARE_RE.match(line)
+            if m:
+                stages.append(("declare_stage", "update_bot_userpage_status.py",
+                               ["--run-tag", RUN_TAG, "--stage", m.group(1)]))
+                continue
+            m = LIMITED_RE.match(line)
+            if m:
+                # The benchmark gives every limited stage the same --max-edits instead of edit_budget.py's limit
+                args = m.group(3).replace('"${RUN_TAG}"', shlex.quote(RUN_TAG))
+                stages.append((m.group(1), m.group(1) + ".py", [m.group(2), str(max_edits)] + shlex.split(args)))
+                continue
+            m = STAGE_RE.match(line)
+            if m:
+                args = m.group(2).replace('"$EDIT_LIMIT"', str(max_edits))
+                args = args.replace('"${RUN_TAG}"', shlex.quote(RUN_TAG))
+                stages.append((m.group(1)[:-3], m.group(1), shlex.split(args)))
+    return stages
+
+
+def make_fixture(n, seed=0):
+    """A synthetic wiki with n shrine pages and work for every loop stage."""
+    rng = random.Random(seed)
+    shinto, enwiki, jawiki, entities = {}, {}, {}, {}
+
+    def claim(pid, value):
+        return {"mainsnak": {"snaktype": "value", "property": pid,
+                             "datavalue": {"value": value, "type": "string"}},
+                "type": "statement", "rank": "normal"}
+
+    provinces = max(1, n // 25)
+    for i in range(n):
+        title, qid = f"Shrine {i}", f"Q{100000 + i}"
+        cats = ["Pages linked to Wikidata", f"Province {i % provinces}"]
+        if i % 2 == 0:
+            cats.append("Wikidata generated shikinaisha pages")
+        if i % 3 == 0:
+            cats.append(f"Crud {i % 10}")
+        if i % 5 == 0:
+            cats.append(f"Wanted {i}")
+        body = " ".join(rng.choice(["Shrine", "kami", "festival", "honden", "torii"]) for _ in range(200))
+        shinto[title] = (f"{{{{wikidata link|{qid}}}}}\n{{{{Shrine infobox|name={title}}}}}\n"
+                         f"'''{title}''' is a shrine. {body}\n\n"
+                         + "\n".join(f"[[Category:{c}]]" for c in cats))
+        if i % 3 == 0:
+            shinto[f"Talk:{title}"] = "Old discussion about the shrine. ~~~~"
+
+        sitelinks, claims = {}, {}
+        if i % 2 == 0:
+            sitelinks["enwiki"] = {"site": "enwiki", "title": title}
+            if i % 4 == 0:
+                enwiki[f"Talk:{title}"] = f"== Sources ==\nWhich sources cover {title}? ~~~~\n" * 3
+        if i % 3 == 0:
+            sitelinks["jawiki"] = {"site": "jawiki", "title": f"神社{i}"}
+            jawiki[f"Talk:神社{i}"] = "== 出典 ==\n出典について。~~~~"
+        if i % 4 == 0:
+            claims["P11250"] = [claim("P11250", f"shinto:{title}")]
+        entities[qid] = {"type": "item", "id": qid, "lastrevid": 1000 + i,
+                         "labels": {"en": {"language": "en", "value": title}},
+                         "sitelinks": sitelinks, "claims": claims}
+
+    shinto["Category:Pages linked to Wikidata"] = "[[Category:Maintenance]]"
+    shinto["Category:Maintenance"] = "Maintenance categories."
+    shinto["Category:Wikidata generated shikinaisha pages"] = "[[Category:Maintenance]]"
+    shinto["Category:Crud categories"] = "[[Category:Maintenance]]"
+    shinto["Category:Provinces"] = "[[Category:Maintenance]]"
+    shinto["Category:Japanese language category names"] = "[[Category:Maintenance]]"
+    shinto["Category:Erroneous qid category links"] = "[[Category:Maintenance]]"
+    shinto["Category:Categories autocreated by EmmaBot"] = "[[Category:Maintenance]]"
+    shinto["Template:Wikidata link"] = "[[d:{{{1}}}]]"
+    shinto["Template:Shrine infobox"] = "{| class=infobox\n|{{{name}}}\n|}"
+    shinto["User:EmmaBot"] = "<!-- BOT-RUN-STATUS:START -->\n<!-- BOT-RUN-STATUS:END -->\n"
+    for k in range(10):
+        shinto[f"Category:Crud {k}"] = "[[Category:Crud categories]]"
+    for p in range(provinces):
+        extra = "[[Category:Japanese language category names]]\n" if p % 2 else ""
+        shinto[f"Category:Province {p}"] = (f"{{{{wikidata link|Q{200000 + p}}}}}\n{{{{citation needed}}}}\n"
+                                            f"Shrines of province {p}.\n{extra}[[Category:Provinces]]")
+    for j in range(max(1, n // 10)):
+        shinto[f"Category:Loose {j}"] = "A category nobody filed."
+        shinto[f"Template:Unused {j}"] = "Unused template."
+        shinto[f"Talk:Gone {j}"] = "Talk page of a deleted page."
+        shinto[f"Alias A {j}"] = f"#REDIRECT [[Alias B {j}]]"
+        shinto[f"Alias B {j}"] = f"#REDIRECT [[Shrine {j}]]"
+    for j in range(max(1, n // 5)):
+        shinto[f"Category:Auto {j}"] = "[[Category:Categories autocreated by EmmaBot]]"
+        if j % 3 == 0:
+            enwiki[f"Category:Auto {j}"] = "An enwiki category."
+        elif j % 3 == 1:
+            jawiki[f"Category:Auto {j}"] = "A jawiki category."
+    for j in range(max(1, n // 20)):
+        target = f"Province {j % provinces}"
+        shinto[f"Q{300000 + j}"] = (f"# [[:Category:{target}]]\n# [[:Category:{target}]]\n"
+                                    "[[Category:Erroneous qid category links]]")
+
+    # A few rows of the real move list, with members to recategorize
+    with open(os.path.join(HERE, "category_moves.csv"), "r", encoding="utf-8") as f:
+        rows = [line.rstrip("\n").split(",", 1) for line in f][1:11]
+    for k, (src, _dst) in enumerate(rows):
+        shinto[src] = "[[Category:Japanese language category names]]"
+        for i in range(k, n, max(1, n // 5)):
+            shinto[f"Shrine {i}"] += f"\n[[{src}]]"
+
+    # enwiki pages for the head of the reimport list
+    with open(os.path.join(HERE, "erroneous_transclusion_pages.txt"), "r", encoding="utf-8") as f:
+        titles = [s.strip() for s in f if s.strip() and not s.startswith("#")][:30]
+    enwiki["Template:Documentation"] = "Documentation."
+    for title in titles:
+        if not title.startswith(KNOWN_PREFIXES):
+            title = f"Template:{title}"
+        enwiki[title] = f"{{{{Documentation}}}}\nContent of {title}."
+
+    return {
+        "shinto.miraheze.org": {"sitename": "Shinto Wiki", "pages": shinto},
+        "en.wikipedia.org": {"sitename": "Wikipedia", "pages": enwiki},
+        "ja.wikipedia.org": {"sitename": "Wikipedia", "pages": jawiki},
+        "www.wikidata.org": {"sitename": "Wikidata", "entities": entities},
+    }
+
+
+def make_workdir(with_state):
+    """A scratch tree mirroring the repository layout the scripts expect."""
+    workdir = tempfile.mkdtemp(prefix="benchmark_cleanup_loop_")
+    scripts = os.path.join(workdir, "shinto_miraheze")
+    os.makedirs(scripts)
+    patterns = ["*.py", "*.sh", "*.csv", "*.txt"] + (["*.state"] if with_state else [])
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(HERE, pattern)):
+            shutil.copy(path, scripts)
+    for name in ("EmmaBot.wiki", "TODO.md"):
+        if os.path.exists(os.path.join(ROOT, name)):
+            shutil.copy(os.path.join(ROOT, name), workdir)
+    return workdir
+
+
+def run_stage(server, workdir, n, name, script, argv, real_sleep, verbose, profile_dir=None):
+    """Run one stage in a subprocess. Returns its measurements."""
+    server.refresh_special_pages()
+    before = server.snapshot()
+    stats_file = os.path.join(workdir, "stage_stats.json")
+    log_file = os.path.join(workdir, "logs", f"{n:02d}_{name}.log")
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+    cmd = [sys.executable, os.path.join("shinto_miraheze", "local_api.py"), "run",
+           "--api", server.url, "--stats-file", stats_file]
+    if not real_sleep:
+        cmd.append("--virtual-sleep")
+    cmd += [os.path.join("shinto_miraheze", script)] + argv
+    env = dict(os.environ, WIKI_USERNAME="EmmaBot@benchmark", WIKI_PASSWORD="benchmark",
+               PYTHONIOENCODING="utf-8", GITHUB_EVENT_NAME="local", GITHUB_RUN_ID="benchmark",
+               WIKI_METRICS_LOG=os.path.join("shinto_miraheze", "run_metrics.log"))
+    env.pop("GITHUB_EVENT_PATH", None)
+    if profile_dir:
+        env["WIKI_PROFILE_DIR"] = profile_dir
+
+    start = time.perf_counter()
+    with open(log_file, "w", encoding="utf-8") as log:
+        proc = subprocess.run(cmd, cwd=workdir, env=env, stdout=None if verbose else log,
+                              stderr=subprocess.STDOUT)
+    wall = time.perf_counter() - start
+
+    after = server.snapshot()
+    sleep = {"sleep_s": 0.0}
+    if os.path.exists(stats_file):
+        with open(stats_file, "r", encoding="utf-8") as f:
+            sleep = json.load(f)
+        os.remove(stats_file)
+    modules = {k: v - before["modules"].get(k, 0) for k, v in after["modules"].items()
+               if v != before["modules"].get(k, 0)}
+    return {
+        "name": name,
+        "runs": 1,
+        "failed": int(proc.returncode != 0),
+        "requests": after["requests"] - before["requests"],
+        "writes": after["writes"] - before["writes"],
+        "bytes_in": after["bytes_in"] - before["bytes_in"],
+        "bytes_out": after["bytes_out"] - before["bytes_out"],
+        "throttled": after["throttled"] - before["throttled"],
+        "ratelimited": after["ratelimited"] - before["ratelimited"],
+        "wall_s": round(wall, 3),
+        "sleep_s": round(sleep["sleep_s"], 3),
+        "modules": modules,
+    }
+
+
+def merge(rows):
+    """Sum the measurements of repeated stages (declare_stage, the bookkeeping updates)."""
+    merged = {}
+    for row in rows:
+        if row["name"] not in merged:
+            merged[row["name"]] = dict(row, modules=dict(row["modules"]))
+            continue
+        total = merged[row["name"]]
+        for key in ("runs", "failed", "requests", "writes", "bytes_in", "bytes_out", "throttled", "ratelimited"):
+            total[key] += row[key]
+        for key in ("wall_s", "sleep_s"):
+            total[key] = round(total[key] + row[key], 3)
+        for module, count in row["modules"].items():
+            total["modules"][module] = total["modules"].get(module, 0) + count
+    return list(merged.values())
+
+
+def per_write(row):
+    return f"{row['requests'] / row['writes']:.1f}" if row["writes"] else "-"
+
+
+def print_report(rows, baseline=None):
+    base = {r["name"]: r for r in (baseline or [])}
+    header = f"{'stage':<40} {'runs':>4} {'reqs':>6} {'writes':>6} {'req/w':>6} {'KB down':>8} {'KB up':>7} {'wall s':>7} {'sleep s':>8}"
+    if base:
+        header += f" {'Δreqs':>7} {'Δwall s':>8}"
+    print(header)
+    print("-" * len(header))
+    totals = {"name": "TOTAL", "runs": 0, "failed": 0, "requests": 0, "writes": 0, "bytes_in": 0,
+              "bytes_out": 0, "wall_s": 0.0, "sleep_s": 0.0}
+    for row in rows + [totals]:
+        if row is not totals:
+            for key in totals:
+                if key != "name":
+                    totals[key] += row[key]
+        name = row["name"] + (" (FAILED)" if row["failed"] else "")
+        line = (f"{name:<40} {row['runs']:>4} {row['requests']:>6} {row['writes']:>6} {per_write(row):>6} "
+                f"{row['bytes_out'] / 1024:>8.1f} {row['bytes_in'] / 1024:>7.1f} {row['wall_s']:>7.1f} "
+                f"{row['sleep_s']:>8.1f}")
+        if base:
+            old = base.get(row["name"]) if row is not totals else {
+                "requests": sum(r["requests"] for r in base.values()),
+                "wall_s": sum(r["wall_s"] for r in base.values())}
+            if old:
+                line += f" {row['requests'] - old['requests']:>+7} {row['wall_s'] - old['wall_s']:>+8.1f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cleanup loop against a local API stand-in.")
+    parser.add_argument("--fixture", default="", help="Fixture JSON (default: synthetic wiki).")
+    parser.add_argument("--pages", type=int, default=200, help="Shrine pages in the synthetic wiki.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--write-fixture", default="", help="Save the synthetic fixture to this path and continue.")
+    parser.add_argument("--max-edits", type=int, default=20, help="Value substituted for $EDIT_LIMIT.")
+    parser.add_argument("--stages", default="", help="Comma-separated stage names to run (default: all).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request.")
+    parser.add_argument("--write-latency", type=float, default=0.0, help="Extra seconds added to every write.")
+    parser.add_argument("--max-rps", type=float, default=0.0, help="Requests per second before HTTP 429 (0 = off). mwclient does not retry 429, so stages fail when it is exceeded.")
+    parser.add_argument("--edit-rate", type=int, default=0, help="Writes per minute before 'ratelimited'.")
+    parser.add_argument("--high-limits", action="store_true", help="Grant apihighlimits (5000 per list request).")
+    parser.add_argument("--real-sleep", action="store_true", help="Actually sleep instead of counting sleeps.")
+    parser.add_argument("--with-state", action="store_true", help="Start from the repository's state files.")
+    parser.add_argument("--save", default="", help="Write the results as JSON to this path.")
+    parser.add_argument("--baseline", default="", help="Compare against results saved with --save.")
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep the scratch tree and stage logs.")
+    parser.add_argument("--verbose", action="store_true", help="Show stage output instead of logging it.")
+    parser.add_argument("--profile", metavar="DIR", default="",
+                        help="Profile every stage into DIR (see profiling.py) and print the report.")
+    args = parser.parse_args()
+
+    fixture = args.fixture or make_fixture(args.pages, args.seed)
+    if args.write_fixture and not args.fixture:
+        with open(args.write_fixture, "w", encoding="utf-8") as f:
+            json.dump(fixture, f, ensure_ascii=False)
+        print(f"Wrote synthetic fixture to {args.write_fixture}")
+
+    wanted = {s.strip() for s in args.stages.split(",") if s.strip()}
+    stages = [s for s in parse_loop(LOOP_SCRIPT, args.max_edits) if not wanted or s[0] in wanted]
+    if not stages:
+        print("No matching stages in cleanup_loop.sh.")
+        return
+
+    wikis = load_fixture(fixture, "EmmaBot@benchmark", args.high_limits)
+    pages = sum(len(w.pages) for w in wikis.values())
+    server = LocalAPIServer(wikis, latency=args.latency, write_latency=args.write_latency, max_rps=args.max_rps,
+                            edit_rate=args.edit_rate, username="EmmaBot@benchmark", high_limits=args.high_limits)
+    server.serve_in_thread()
+    workdir = make_workdir(args.with_state)
+    print(f"Local API at {server.url}: {pages} pages on {len(wikis)} hosts; scratch tree {workdir}")
+    print(f"Running {len(stages)} stage(s), $EDIT_LIMIT={args.max_edits}\n")
+
+    rows = []
+    try:
+        for n, (name, script, argv) in enumerate(stages, 1):
+            row = run_stage(server, workdir, n, name, script, argv, args.real_sleep, args.verbose,
+                            os.path.abspath(args.profile) if args.profile else None)
+            status = "FAILED" if row["failed"] else "ok"
+            print(f"[{n}/{len(stages)}] {name}: {row['requests']} requests, {row['writes']} writes, "
+                  f"{row['wall_s']:.1f}s wall, {row['sleep_s']:.1f}s sleep ({status})", flush=True)
+            rows.append(row)
+    finally:
+        server.shutdown()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    rows = merge(rows)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["stages"]
+    print()
+    print_report(rows, baseline)
+    if args.keep_workdir:
+        print(f"\nStage logs: {os.path.join(workdir, 'logs')}")
+    if args.profile:
+        print()
+        profiling.report(args.profile)
+
+    if args.save:
+        settings = {k: v for k, v in vars(args).items() if k not in ("save", "baseline", "verbose", "keep_workdir", "profile")}
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"settings": settings, "stages": rows}, f, indent=2, ensure_ascii=False)
+        print(f"\nSaved results to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
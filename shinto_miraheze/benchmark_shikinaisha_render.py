@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+benchmark_shikinaisha_render.py
+===============================
+Times render_pages() from generate_shikinaisha_pages_v25_with_redirects.py
+inline and across process pools of increasing size, on synthetic shrine
+entities held in ENTITY_CACHE (no network access, no wiki login).
+
+Every pooled run is checked to produce output identical, byte for byte and
+in the same order, to calling format_page_content inline.
+
+Usage:
+    python shinto_miraheze/benchmark_shikinaisha_render.py
+    python shinto_miraheze/benchmark_shikinaisha_render.py --shrines 3000 --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import random
+import time
+
+import generate_shikinaisha_pages_v25_with_redirects as gen
+from wikidata_entity import Entity
+
+LANGS = ["en", "ja", "zh", "ko", "de", "fr", "simple", "commons"]
+
+
+def item(qid):
+    return {"datavalue": {"value": {"id": qid}}}
+
+
+def make_ref_entity(qid, rng):
+    sitelinks = {f"{lang}wiki": {"title": f"{qid} in {lang}"} for lang in rng.sample(LANGS, 4)}
+    return {
+        "id": qid,
+        "lastrevid": rng.randint(1, 10**9),
+        "labels": {"en": {"value": f"Label of {qid}"}, "ja": {"value": f"{qid}のラベル"}},
+        "sitelinks": sitelinks,
+        "claims": {"P2699": [{"mainsnak": {"datavalue": {"value": f"https://example.org/{qid}"}}}]},
+    }
+
+
+def make_shrine(n, ref_ids, rng):
+    qid = f"Q{10_000_000 + n}"
+    claims = {}
+    for pid in ["P31", "P361", "P131", "P825", "P17", "P1435", "P5010", "P1705", "P3134", "P276"]:
+        claims[pid] = []
+        for _ in range(rng.randint(1, 4)):
+            claims[pid].append({
+                "mainsnak": item(rng.choice(ref_ids)),
+                "qualifiers": {"P580": [{"datavalue": {"value": "+1868-00-00T00:00:00Z"}}],
+                               "P642": [item(rng.choice(ref_ids))]},
+                "references": [{"snaks": {"P248": [item(rng.choice(ref_ids))],
+                                          "P854": [{"datavalue": {"value": "https://example.org/ref"}}]}}],
+            })
+    claims["P625"] = [{"mainsnak": {"datavalue": {"value": {"latitude": 35.0 + n / 1e5, "longitude": 135.0}}}}]
+    claims["P18"] = [{"mainsnak": {"datavalue": {"value": f"Shrine {n}.jpg"}}}]
+    entity = {
+        "id": qid,
+        "lastrevid": rng.randint(1, 10**9),
+        "labels": {"en": {"value": f"Shrine {n}"}, "ja": {"value": f"神社{n}"}},
+        "sitelinks": {"jawiki": {"title": f"神社{n}"}, "enwiki": {"title": f"Shrine {n}"}},
+        "claims": claims,
+    }
+    return f"Shrine {n}", qid, Entity.from_json(entity)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shrines", type=int, default=1000)
+    parser.add_argument("--refs", type=int, default=500, help="Number of distinct referenced items.")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    ref_ids = [f"Q{n}" for n in range(100, 100 + args.refs)]
+    for qid in ref_ids:
+        gen.ENTITY_CACHE[qid] = Entity.from_json(make_ref_entity(qid, rng), claims=gen.REF_CLAIMS)
+    tasks = [make_shrine(n, ref_ids, rng) for n in range(args.shrines)]
+
+    start = time.perf_counter()
+    expected = [gen.format_page_content(name, qid, entity) for name, qid, entity in tasks]
+    baseline = time.perf_counter() - start
+    print(f"{args.shrines} shrines, {args.refs} referenced items, {os.cpu_count()} CPU(s)")
+    print(f"  inline format_page_content: {baseline:8.2f} s")
+
+    for workers in args.workers:
+        pool = gen.make_render_pool(workers)
+        try:
+            start = time.perf_counter()
+            result = []
+            for i in range(0, len(tasks), gen.WD_BATCH):
+                result.extend(gen.render_pages(tasks[i:i + gen.WD_BATCH], pool, workers))
+            elapsed = time.perf_counter() - start
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        identical = result == expected
+        print(f"  render_pages, {workers:2d} worker(s): {elapsed:8.2f} s  "
+              f"({baseline / elapsed:4.1f}x)  identical: {identical}")
+
+
+if __name__ == "__main__":
+    main()
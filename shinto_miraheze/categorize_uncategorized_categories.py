@@ -13,20 +13,16 @@ Default mode is dry-run. Use --apply to save edits.
 """
 
 import argparse
-import io
-import os
 import re
 import sys
 import time
 
 import mwclient
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL, iter_querypage
+
+sys.stdout.reconfigure(encoding="utf-8")
 
-WIKI_URL = "shinto.miraheze.org"
-WIKI_PATH = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "")
 THROTTLE = 1.5
 
 TARGET_CAT = "Categories autocreated by EmmaBot"
@@ -38,22 +34,7 @@ CATEGORY_RE = re.compile(r"\[\[\s*Category\s*:", re.IGNORECASE)
 
 def iter_uncategorized_categories(site):
     """Yield category titles from Special:UncategorizedCategories."""
-    params = {
-        "list": "querypage",
-        "qppage": "Uncategorizedcategories",
-        "qplimit": "max",
-    }
-    while True:
-        data = site.api("query", **params)
-        entries = data.get("query", {}).get("querypage", {}).get("results", [])
-        for entry in entries:
-            title = entry.get("title", "")
-            if title:
-                yield title
-        if "continue" in data:
-            params.update(data["continue"])
-        else:
-            break
+    return iter_querypage(site, "Uncategorizedcategories")
 
 
 def main():
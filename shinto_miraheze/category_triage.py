@@ -0,0 +1,71 @@
+"""
+category_triage.py
+==================
+Batched category checks shared by the EmmaBot category triage scripts
+(triage_emmabot_categories_combined.py and the legacy
+triage_emmabot_categories_secondary.py):
+
+- get_member_counts: member counts from prop=categoryinfo, 50 titles per
+  request
+- find_reflections: which single-member categories contain only their
+  namesake page (the "category reflection error" heuristic)
+
+Not a standalone script.
+"""
+
+BATCH_SIZE = 50  # max titles per API query
+
+
+def get_member_counts(site, names):
+    """Return {name: member count} for bare category names via batched prop=categoryinfo."""
+    counts = {}
+    for i in range(0, len(names), BATCH_SIZE):
+        batch = names[i : i + BATCH_SIZE]
+        data = site.api(
+            "query",
+            prop="categoryinfo",
+            titles="|".join(f"Category:{n}" for n in batch),
+            formatversion=2,
+        )
+        for page in data.get("query", {}).get("pages", []):
+            title = page.get("title", "")
+            if title.startswith("Category:"):
+                counts[title[len("Category:"):]] = page.get("categoryinfo", {}).get("size", 0)
+    return counts
+
+
+def find_reflections(site, names):
+    """Return the subset of single-member categories whose member matches the name.
+
+    The only members that can match are the page titled exactly like the
+    category and the category page itself, so instead of listing members per
+    category this asks, for a batch of those candidate titles at once, which
+    of them sit in their namesake category.
+    """
+    reflected = set()
+    per_batch = BATCH_SIZE // 2
+    for i in range(0, len(names), per_batch):
+        batch = names[i : i + per_batch]
+        titles = []
+        for n in batch:
+            titles.extend([n, f"Category:{n}"])
+        params = {
+            "prop": "categories",
+            "titles": "|".join(titles),
+            "clcategories": "|".join(f"Category:{n}" for n in batch),
+            "cllimit": "max",
+            "formatversion": 2,
+        }
+        while True:
+            data = site.api("query", **params)
+            for page in data.get("query", {}).get("pages", []):
+                title = page.get("title", "")
+                bare = title[len("Category:"):] if title.startswith("Category:") else title
+                for cat in page.get("categories", []):
+                    if cat.get("title") == f"Category:{bare}":
+                        reflected.add(bare)
+            if "continue" in data:
+                params.update(data["continue"])
+            else:
+                break
+    return reflected
@@ -4,10 +4,28 @@ set -euo pipefail
 ROOT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
 cd "$ROOT_DIR"
 
+PROFILE=0
+for arg in "$@"; do
+  case "$arg" in
+    --profile)
+      PROFILE=1
+      ;;
+    *)
+      echo "Unknown option: $arg (usage: cleanup_loop.sh [--profile])"
+      exit 1
+      ;;
+  esac
+done
+
 echo "Running cleanup loop from: $ROOT_DIR"
 EDIT_LIMIT="${WIKI_EDIT_LIMIT:-100}"
+export LOOP_START_EPOCH="${LOOP_START_EPOCH:-$(date +%s)}"
+
+echo "Per-script max edits: set per stage by edit_budget.py (fallback $EDIT_LIMIT)"
 
-echo "Per-script max edits: $EDIT_LIMIT"
+# Every script appends its API/HTTP counters to this JSONL file (see metrics.py).
+export WIKI_METRICS_LOG="${WIKI_METRICS_LOG:-shinto_miraheze/run_metrics.log}"
+echo "Metrics log: $WIKI_METRICS_LOG"
 
 if [ -z "${WIKI_USERNAME:-}" ] || [ -z "${WIKI_PASSWORD:-}" ]; then
   echo "WIKI_USERNAME and WIKI_PASSWORD must be set."
@@ -29,6 +47,13 @@ if [ -z "${RUN_ID}" ]; then
 fi
 
 RUN_PATH="${REPO}/actions/runs/${RUN_ID}"
+
+# --profile: every script writes pstats, collapsed stacks and a
+# network/sleep/CPU breakdown to this directory (see profiling.py).
+if [ "$PROFILE" = 1 ]; then
+  export WIKI_PROFILE_DIR="shinto_miraheze/profiles/run-${RUN_ID}"
+  echo "Profiling stages into: $WIKI_PROFILE_DIR"
+fi
 CAUSE_TEXT="pipeline run"
 case "${EVENT_NAME}" in
   push)
@@ -52,6 +77,20 @@ declare_stage() {
   python3 shinto_miraheze/update_bot_userpage_status.py --run-tag "${RUN_TAG}" --stage "$1"
 }
 
+# Helper: run a stage with the edit limit edit_budget.py gives it for the
+# time left in the job, or skip it when that is 0 (empty backlog or no time).
+# Usage: run_limited <script> <limit flag> [args...]
+run_limited() {
+  local script="$1" flag="$2" limit
+  shift 2
+  limit="$(python3 shinto_miraheze/edit_budget.py next "$script")" || limit="$EDIT_LIMIT"
+  if [ "$limit" -le 0 ]; then
+    echo "Skipping ${script}: nothing to do in the time left."
+    return 0
+  fi
+  python3 "shinto_miraheze/${script}.py" "$flag" "$limit" "$@"
+}
+
 # ============================================================
 # [Bookkeeping: START] — mark workflow ACTIVE
 # ============================================================
@@ -60,6 +99,7 @@ echo "========================================"
 echo "[Bookkeeping: START]"
 echo "========================================"
 python3 shinto_miraheze/update_bot_userpage_status.py --run-tag "${RUN_TAG}" --status active --stage "Bookkeeping: START"
+python3 shinto_miraheze/edit_budget.py plan || echo "WARN: edit budget plan failed; stages fall back to $EDIT_LIMIT."
 
 # ============================================================
 # [Core Loop] — structural changes that later scripts depend on
@@ -70,31 +110,25 @@ echo "[Core Loop]"
 echo "========================================"
 
 declare_stage "Core Loop: reimport_from_enwiki"
-python3 shinto_miraheze/reimport_from_enwiki.py --apply --max-imports 10 --run-tag "${RUN_TAG}"
+run_limited reimport_from_enwiki --max-imports --apply --run-tag "${RUN_TAG}"
 
 declare_stage "Core Loop: create_wanted_categories"
-python3 shinto_miraheze/create_wanted_categories.py --apply --max-edits "$EDIT_LIMIT" --run-tag "${RUN_TAG}"
+run_limited create_wanted_categories --max-edits --apply --run-tag "${RUN_TAG}"
 
 declare_stage "Core Loop: categorize_uncategorized_categories"
-python3 shinto_miraheze/categorize_uncategorized_categories.py --apply --max-edits "$EDIT_LIMIT" --run-tag "${RUN_TAG}"
+run_limited categorize_uncategorized_categories --max-edits --apply --run-tag "${RUN_TAG}"
 
-declare_stage "Core Loop: triage_emmabot_categories"
-python3 shinto_miraheze/triage_emmabot_categories.py --apply --max-edits "$EDIT_LIMIT" --run-tag "${RUN_TAG}"
-
-declare_stage "Core Loop: triage_emmabot_categories_jawiki"
-python3 shinto_miraheze/triage_emmabot_categories_jawiki.py --apply --max-edits "$EDIT_LIMIT" --run-tag "${RUN_TAG}"
-
-declare_stage "Core Loop: triage_emmabot_categories_secondary"
-python3 shinto_miraheze/triage_emmabot_categories_secondary.py --apply --max-edits "$EDIT_LIMIT" --run-tag "${RUN_TAG}"
+declare_stage "Core Loop: triage_emmabot_categories_combined"
+run_limited triage_emmabot_categories_combined --max-edits --apply --run-tag "${RUN_TAG}"
 
 declare_stage "Core Loop: delete_unused_templates"
-python3 shinto_miraheze/delete_unused_templates.py --max-deletes "$EDIT_LIMIT" --run-tag "${RUN_TAG}"
+run_limited delete_unused_templates --max-deletes --run-tag "${RUN_TAG}"
 
 declare_stage "Core Loop: fix_double_redirects"
-python3 shinto_miraheze/fix_double_redirects.py --apply --max-edits "$EDIT_LIMIT" --run-tag "${RUN_TAG}"
+run_limited fix_double_redirects --max-edits --apply --run-tag "${RUN_TAG}"
 
 declare_stage "Core Loop: generate_p11250_quickstatements"
-python3 shinto_miraheze/generate_p11250_quickstatements.py --apply --max-edits "$EDIT_LIMIT" --run-tag "${RUN_TAG}"
+run_limited generate_p11250_quickstatements --max-edits --apply --run-tag "${RUN_TAG}"
 
 # ============================================================
 # [Cleanup Loop] — category cleanup + talk pages
@@ -105,16 +139,16 @@ echo "[Cleanup Loop]"
 echo "========================================"
 
 declare_stage "Cleanup Loop: delete_unused_categories"
-python3 shinto_miraheze/delete_unused_categories.py --max-deletes "$EDIT_LIMIT" --run-tag "${RUN_TAG}"
+run_limited delete_unused_categories --max-deletes --run-tag "${RUN_TAG}"
 
 declare_stage "Cleanup Loop: migrate_talk_pages"
-python3 shinto_miraheze/migrate_talk_pages.py --apply --max-edits "$EDIT_LIMIT" --run-tag "${RUN_TAG}"
+run_limited migrate_talk_pages --max-edits --apply --run-tag "${RUN_TAG}"
 
 declare_stage "Cleanup Loop: delete_orphaned_talk_pages"
-python3 shinto_miraheze/delete_orphaned_talk_pages.py --max-deletes "$EDIT_LIMIT" --run-tag "${RUN_TAG}"
+run_limited delete_orphaned_talk_pages --max-deletes --run-tag "${RUN_TAG}"
 
 declare_stage "Cleanup Loop: remove_crud_categories"
-python3 shinto_miraheze/remove_crud_categories.py --max-edits "$EDIT_LIMIT" --run-tag "${RUN_TAG}"
+run_limited remove_crud_categories --max-edits --run-tag "${RUN_TAG}"
 
 # ============================================================
 # [Deprecated] — likely complete, kept as safety net
@@ -126,19 +160,19 @@ echo "[Deprecated]"
 echo "========================================"
 
 declare_stage "Deprecated: normalize_category_pages"
-python3 shinto_miraheze/normalize_category_pages.py --apply --max-edits "$EDIT_LIMIT" --run-tag "${RUN_TAG}"
+run_limited normalize_category_pages --max-edits --apply --run-tag "${RUN_TAG}"
 
 declare_stage "Deprecated: tag_shikinaisha_talk_pages"
-python3 shinto_miraheze/tag_shikinaisha_talk_pages.py --apply --max-edits "$EDIT_LIMIT" --run-tag "${RUN_TAG}"
+run_limited tag_shikinaisha_talk_pages --max-edits --apply --run-tag "${RUN_TAG}"
 
 declare_stage "Deprecated: fix_erroneous_qid_category_links"
-python3 shinto_miraheze/fix_erroneous_qid_category_links.py --apply --max-edits "$EDIT_LIMIT" --run-tag "${RUN_TAG}"
+run_limited fix_erroneous_qid_category_links --max-edits --apply --run-tag "${RUN_TAG}"
 
 declare_stage "Deprecated: remove_legacy_cat_templates"
-python3 shinto_miraheze/remove_legacy_cat_templates.py --apply --max-edits "$EDIT_LIMIT" --run-tag "${RUN_TAG}"
+run_limited remove_legacy_cat_templates --max-edits --apply --run-tag "${RUN_TAG}"
 
 declare_stage "Deprecated: move_categories"
-python3 shinto_miraheze/move_categories.py --apply --max-edits "$EDIT_LIMIT" --run-tag "${RUN_TAG}"
+run_limited move_categories --max-edits --apply --run-tag "${RUN_TAG}"
 
 declare_stage "Deprecated: create_japanese_category_qid_redirects"
 python3 shinto_miraheze/create_japanese_category_qid_redirects.py
@@ -151,3 +185,11 @@ echo "========================================"
 echo "[Bookkeeping: END]"
 echo "========================================"
 python3 shinto_miraheze/update_bot_userpage_status.py --run-tag "${RUN_TAG}" --status inactive --stage "Complete"
+
+# Per-stage edits/min, error rate and edits to date across runs; flags regressions.
+# Reporting only: a failed save must not fail the job and skip the state-file commit.
+python3 shinto_miraheze/log_trend_report.py --publish --run-tag "${RUN_TAG}" --html shinto_miraheze/throughput.html || echo "WARN: throughput report failed; User:EmmaBot/Throughput not updated."
+
+if [ "$PROFILE" = 1 ]; then
+  python3 shinto_miraheze/profiling.py report "$WIKI_PROFILE_DIR"
+fi
@@ -10,27 +10,20 @@ For every category page with {{wikidata link|Q...}}:
 4. If Q{QID} is already a dup-disambiguation page, append the new entry
 """
 
-import re, time, io, sys
-import os
-import mwclient
+import re, time, sys
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+from qid_index import QidIndex
+from wiki import THROTTLE, lazy_site
+
+sys.stdout.reconfigure(encoding='utf-8')
 
-WIKI_URL  = "shinto.miraheze.org"
-WIKI_PATH = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "[REDACTED_SECRET_1]")
-THROTTLE  = 1.5
 DUP_CAT   = "duplicated qid category redirects"
 
 SOURCE_CAT  = "Pages linked to Wikidata"
 WD_LINK_RE  = re.compile(r'\{\{wikidata link\|(Q\d+)\}\}', re.IGNORECASE)
 REDIRECT_RE = re.compile(r'^#REDIRECT\s*\[\[(.+?)\]\]', re.IGNORECASE | re.MULTILINE)
 
-site = mwclient.Site(WIKI_URL, path=WIKI_PATH,
-                     clients_useragent='CategoryQidRedirectBot/1.0 (User:EmmaBot; shinto.miraheze.org)')
-site.login(USERNAME, PASSWORD)
-print("Logged in as", USERNAME, flush=True)
+site = lazy_site('CategoryQidRedirectBot/1.0 (User:EmmaBot; shinto.miraheze.org)')
 
 
 def main():
@@ -43,6 +36,10 @@ def main():
     ]
     print(f"Found {len(cat_titles)} category pages with wikidata links\n", flush=True)
 
+    index = QidIndex.load()
+    fetched, removed = index.refresh(site)
+    print(f"Q page index: {len(index)} pages ({fetched} re-read, {removed} removed)\n", flush=True)
+
     created = duplicates = skipped = errors = 0
 
     for i, title in enumerate(cat_titles, 1):
@@ -61,9 +58,23 @@ def main():
 
         qid = m.group(1)
         qid_title = qid          # main namespace, e.g. "Q12345"
-        qid_page  = site.pages[qid_title]
         print(f"[{i}/{len(cat_titles)}] {title}  →  {qid_title}", flush=True)
 
+        # Answer the common cases from the index without touching the Q page
+        if index.redirect_target(qid) == title:
+            print(f"  SKIP (already correct redirect)", flush=True)
+            skipped += 1
+            continue
+        if qid in index and index.has_category(qid, DUP_CAT) and any(title in e for e in index.entries(qid)):
+            print(f"  SKIP (already in dup page)", flush=True)
+            skipped += 1
+            continue
+        if qid in index and not index.redirect_target(qid) and not index.has_category(qid, DUP_CAT):
+            print(f"  SKIP (page exists with other content)", flush=True)
+            skipped += 1
+            continue
+
+        qid_page  = site.pages[qid_title]
         try:
             if not qid_page.exists:
                 # Simple case: create the redirect
@@ -72,6 +83,7 @@ def main():
                     summary=f"Bot: redirect {qid} → [[{title}]]"
                 )
                 print(f"  CREATED", flush=True)
+                index.record(qid, f"#REDIRECT [[{title}]]")
                 created += 1
 
             else:
@@ -95,6 +107,7 @@ def main():
                         )
                         qid_page.save(new_text,
                             summary=f"Bot: {qid} claimed by multiple categories — disambiguation")
+                        index.record(qid, new_text)
                         duplicates += 1
 
                 elif f"[[Category:{DUP_CAT}]]" in existing:
@@ -105,6 +118,7 @@ def main():
                         qid_page.save(new_text,
                             summary=f"Bot: adding [[{title}]] to {qid} disambiguation")
                         print(f"  ADDED to existing dup page", flush=True)
+                        index.record(qid, new_text)
                         duplicates += 1
                     else:
                         print(f"  SKIP (already in dup page)", flush=True)
@@ -124,6 +138,7 @@ def main():
 
         time.sleep(THROTTLE)
 
+    index.save()
     print(f"\n{'='*60}", flush=True)
     print(f"Done! Created: {created} | Duplicates: {duplicates} | Skipped: {skipped} | Errors: {errors}", flush=True)
 
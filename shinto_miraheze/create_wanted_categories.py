@@ -12,19 +12,15 @@ Default mode is dry-run. Use --apply to save edits.
 """
 
 import argparse
-import io
-import os
 import sys
 import time
 
 import mwclient
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL, iter_querypage
+
+sys.stdout.reconfigure(encoding="utf-8")
 
-WIKI_URL = "shinto.miraheze.org"
-WIKI_PATH = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "")
 THROTTLE = 1.5
 
 PARENT_CAT = "Categories autocreated by EmmaBot"
@@ -33,22 +29,7 @@ CONTENT = f"[[Category:{PARENT_CAT}]]"
 
 def iter_wanted_categories(site):
     """Yield category titles from Special:WantedCategories."""
-    params = {
-        "list": "querypage",
-        "qppage": "Wantedcategories",
-        "qplimit": "max",
-    }
-    while True:
-        data = site.api("query", **params)
-        entries = data.get("query", {}).get("querypage", {}).get("results", [])
-        for entry in entries:
-            title = entry.get("title", "")
-            if title:
-                yield title
-        if "continue" in data:
-            params.update(data["continue"])
-        else:
-            break
+    return iter_querypage(site, "Wantedcategories")
 
 
 def main():
@@ -4,43 +4,28 @@ delete_unused_templates.py
 ===========================
 Deletes template pages returned by Special:UnusedTemplates.
 
+Special:UnusedTemplates is a cached report, so every title is re-verified
+(still exists, still not transcluded) in batches of 50 before it is
+deleted; see page_deletion.py.
+
 Default mode deletes. Use --dry-run to preview.
 """
 
 import argparse
-import io
-import os
 import sys
-import time
 
 import mwclient
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+from page_deletion import DEFAULT_WORKERS, DeletionExecutor, append_log, iter_verified
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL, iter_querypage
+
+sys.stdout.reconfigure(encoding="utf-8")
 
-WIKI_URL = "shinto.miraheze.org"
-WIKI_PATH = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "")
-THROTTLE = 1.5
+DEFAULT_LOG_FILE = "shinto_miraheze/delete_unused_templates.log"
 
 
 def iter_unused_templates(site):
-    params = {
-        "list": "querypage",
-        "qppage": "Unusedtemplates",
-        "qplimit": "max",
-    }
-    while True:
-        data = site.api("query", **params)
-        entries = data.get("query", {}).get("querypage", {}).get("results", [])
-        for entry in entries:
-            title = entry.get("title", "")
-            if title:
-                yield title
-        if "continue" in data:
-            params.update(data["continue"])
-        else:
-            break
+    return iter_querypage(site, "Unusedtemplates")
 
 
 def main():
@@ -48,6 +33,8 @@ def main():
     parser.add_argument("--max-deletes", type=int, default=0, help="Max deletions for this run (0 = no limit).")
     parser.add_argument("--run-tag", required=True, help="Wiki-formatted run tag link for delete summaries.")
     parser.add_argument("--dry-run", action="store_true", help="Do not delete; only report actions.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Deletes to keep in flight at once.")
+    parser.add_argument("--log-file", default=DEFAULT_LOG_FILE, help="Path to JSONL run log.")
     args = parser.parse_args()
 
     site = mwclient.Site(
@@ -58,35 +45,40 @@ def main():
     site.login(USERNAME, PASSWORD)
     print(f"Logged in as {USERNAME}\n")
 
-    checked = deleted = skipped = errors = 0
-    for title in iter_unused_templates(site):
-        if args.max_deletes and deleted >= args.max_deletes:
-            print(f"Reached max deletions ({args.max_deletes}); stopping run.")
-            break
-
-        checked += 1
-        page = site.pages[title]
-        prefix = f"[{checked}] {title}"
-
-        if not page.exists:
-            print(f"{prefix} SKIP (missing)")
-            skipped += 1
-            continue
-
-        if args.dry_run:
-            print(f"{prefix} DRY RUN: would delete")
-            continue
-
-        try:
-            page.delete(
-                reason=f"Bot: delete unused template {args.run_tag}"
-            )
-            deleted += 1
-            print(f"{prefix} DELETED")
-            time.sleep(THROTTLE)
-        except Exception as e:
-            print(f"{prefix} ERROR deleting: {e}")
-            errors += 1
+    checked = skipped = 0
+
+    def candidates():
+        """Yield verified titles, reporting and logging the ones that are skipped."""
+        nonlocal checked, skipped
+        for title, skip_reason in iter_verified(site, iter_unused_templates(site), require_untranscluded=True):
+            checked += 1
+            prefix = f"[{checked}] {title}"
+
+            if skip_reason:
+                print(f"{prefix} SKIP ({skip_reason})")
+                skipped += 1
+                append_log(args.log_file, {"title": title, "status": "skipped", "reason": skip_reason})
+                continue
+
+            if args.dry_run:
+                print(f"{prefix} DRY RUN: would delete")
+                append_log(args.log_file, {"title": title, "status": "dry_run"})
+                continue
+
+            yield title
+
+    if args.dry_run:
+        deleted = errors = 0
+        for _title in candidates():
+            pass
+    else:
+        executor = DeletionExecutor(
+            site,
+            reason=f"Bot: delete unused template {args.run_tag}",
+            log_file=args.log_file,
+            workers=args.workers,
+        )
+        deleted, errors = executor.run(candidates(), max_deletes=args.max_deletes)
 
     print("\n" + "=" * 60)
     print(f"Checked: {checked}")
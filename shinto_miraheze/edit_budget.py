@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+edit_budget.py
+==============
+Per-stage edit limits for cleanup_loop.sh that fill the job's time budget
+(330 minutes, less a reserve) instead of giving every stage the same
+WIKI_EDIT_LIMIT.
+
+Each limited stage gets:
+  * a backlog estimate from one or two cheap queries (a querypage count,
+    categoryinfo, or a list file minus its state file). The sweep stages
+    count 0 when their completion probe (sweep_probe.py) finds nothing to
+    do. The estimate is None when there is no cheap way to count.
+  * a cost estimate from recent metrics.py records: startup seconds (reads,
+    scans, login) plus seconds per edit.
+
+Stages with an empty backlog get 0 and are skipped, so they cost no startup
+time. The time left goes first to a floor of FLOOR_EDITS per stage, so no
+stage starves, then to the cheapest edits first, each stage capped at its
+backlog. A stage with an unknown backlog is capped at WIKI_EDIT_LIMIT, the
+old fixed limit. The time of the stages that take no limit (declare_stage,
+status updates, ...) is reserved up front.
+
+`plan` probes every stage once at the start of the loop and prints the
+allocation. `next <script>` is called before each stage: it probes that
+stage again and re-plans the rest of the loop with the time actually left,
+then prints the stage's limit. The plan is kept in edit_budget.plan.
+
+Usage:
+    python3 shinto_miraheze/edit_budget.py plan
+    python3 shinto_miraheze/edit_budget.py next migrate_talk_pages    # prints e.g. 412
+"""
+
+import argparse
+import contextlib
+import csv
+import importlib
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+import metrics
+from wiki import THROTTLE, iter_querypage, lazy_site, load_state
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LOOP_SCRIPT = os.path.join(HERE, "cleanup_loop.sh")
+PLAN_FILE = os.path.join(HERE, "edit_budget.plan")
+DEFAULT_METRICS_LOG = os.path.join(HERE, "run_metrics.log")
+
+BUDGET_MINUTES = float(os.getenv("WIKI_BUDGET_MINUTES", "330"))
+RESERVE_MINUTES = float(os.getenv("WIKI_BUDGET_RESERVE_MINUTES", "20"))
+DEFAULT_LIMIT = int(os.getenv("WIKI_EDIT_LIMIT", "100"))
+FLOOR_EDITS = 10
+RECENT_RUNS = 10
+DEFAULT_STARTUP_S = 30.0
+DEFAULT_PER_EDIT_S = THROTTLE + 1.5
+MIN_PER_EDIT_S = 0.1
+
+LIMITED_RE = re.compile(r"^run_limited (\S+) (--\S+)")
+DECLARE_RE = re.compile(r'^declare_stage "')
+SCRIPT_RE = re.compile(r"^python3 shinto_miraheze/(\S+)\.py")
+
+site = lazy_site("EditBudgetBot/1.0 (User:EmmaBot; shinto.miraheze.org)")
+
+
+# ─── Backlog probes ─────────────────────────────────────────
+
+
+def _querypage_count(name):
+    """Entries on a cached special page, counted up to 5000."""
+    def probe():
+        count = 0
+        for _ in iter_querypage(site, name):
+            count += 1
+            if count >= 5000:
+                break
+        return count
+    return probe
+
+
+def _category_size(*names, key="pages", minus_state=None):
+    """Members of categories by categoryinfo, less the titles already done in a state file."""
+    def probe():
+        data = site.api("query", prop="categoryinfo", titles="|".join(f"Category:{n}" for n in names))
+        total = sum(p.get("categoryinfo", {}).get(key, 0) for p in data["query"]["pages"].values())
+        if minus_state:
+            total -= len(load_state(os.path.join(HERE, minus_state)))
+        return max(0, total)
+    return probe
+
+
+def _crud_members():
+    data = site.api("query", generator="categorymembers", gcmtitle="Category:Crud_categories",
+                    gcmtype="subcat", gcmlimit="max", prop="categoryinfo")
+    return sum(p.get("categoryinfo", {}).get("size", 0) for p in data.get("query", {}).get("pages", {}).values())
+
+
+def _reimport_left():
+    with open(os.path.join(HERE, "erroneous_transclusion_pages.txt"), "r", encoding="utf-8") as f:
+        titles = {line.strip() for line in f if line.strip()}
+    return len(titles - load_state(os.path.join(HERE, "reimport_from_enwiki.state")))
+
+
+def _migrate_talk_left():
+    stats = site.api("query", meta="siteinfo", siprop="statistics")["query"]["statistics"]
+    return max(0, stats["pages"] - len(load_state(os.path.join(HERE, "migrate_talk_pages.state"))))
+
+
+def _double_redirects():
+    """Redirects whose target is itself a redirect, from the live redirect graph (fix_double_redirects.py).
+
+    One request per namespace; None when a namespace has more redirect
+    targets than fit in it.
+    """
+    count = 0
+    for ns in sorted(ns for ns in site.namespaces if ns >= 0):
+        data = site.api("query", generator="allredirects", garnamespace=ns, garunique=1, garlimit="max",
+                        prop="info|redirects", rdlimit="max", formatversion=2)
+        if "continue" in data:
+            return None
+        for target in data.get("query", {}).get("pages", []):
+            if target.get("redirect"):
+                count += len(target.get("redirects", []))
+    return count
+
+
+def _moves_left():
+    """Move sources that still exist and are not yet redirects."""
+    with open(os.path.join(HERE, "category_moves.csv"), newline="", encoding="utf-8") as f:
+        sources = [row[0] for row in csv.reader(f)][1:]
+    left = 0
+    for i in range(0, len(sources), 50):
+        data = site.api("query", prop="info", titles="|".join(sources[i:i + 50]))
+        for page in data["query"]["pages"].values():
+            if "missing" not in page and "redirect" not in page:
+                left += 1
+    return left
+
+
+def _sweep_done(script, fallback=None):
+    """0 when the script's has_work() probe finds nothing to do, otherwise fallback's estimate (or None)."""
+    def probe():
+        stage = importlib.import_module(script)
+        state_file = os.path.join(HERE, os.path.basename(stage.DEFAULT_STATE_FILE))
+        if stage.has_work(site, state_file) is False:
+            return 0
+        return fallback() if fallback else None
+    return probe
+
+
+PROBES = {
+    "reimport_from_enwiki": _reimport_left,
+    "create_wanted_categories": _querypage_count("Wantedcategories"),
+    "categorize_uncategorized_categories": _querypage_count("Uncategorizedcategories"),
+    "triage_emmabot_categories_combined": _category_size(
+        "Categories autocreated by EmmaBot", "Emmabot categories without enwiki",
+        "Emmabot categories without enwiki or jawiki", key="subcats"),
+    "delete_unused_templates": _querypage_count("Unusedtemplates"),
+    "fix_double_redirects": _double_redirects,
+    "delete_unused_categories": _querypage_count("Unusedcategories"),
+    "migrate_talk_pages": _migrate_talk_left,
+    "delete_orphaned_talk_pages": _querypage_count("OrphanedTalkPages"),
+    "remove_crud_categories": _crud_members,
+    "normalize_category_pages": _sweep_done("normalize_category_pages"),
+    "tag_shikinaisha_talk_pages": _sweep_done("tag_shikinaisha_talk_pages", _category_size(
+        "Wikidata_generated_shikinaisha_pages", minus_state="tag_shikinaisha_talk_pages.state")),
+    "fix_erroneous_qid_category_links": _category_size("Erroneous_qid_category_links"),
+    "move_categories": _moves_left,
+    "remove_legacy_cat_templates": _sweep_done("remove_legacy_cat_templates"),
+}
+
+
+def probe(script):
+    """Backlog estimate for a stage, or None if it cannot be counted cheaply."""
+    fn = PROBES.get(script)
+    if fn is None:
+        return None
+    try:
+        # stdout is reserved for the limit printed by `next`
+        with contextlib.redirect_stdout(sys.stderr):
+            return fn()
+    except Exception as e:
+        print(f"WARN backlog probe for {script} failed: {e}", file=sys.stderr, flush=True)
+        return None
+
+
+# ─── Costs and allocation ───────────────────────────────────
+
+
+def loop_stages(path=LOOP_SCRIPT):
+    """[(script, limited)] in the order cleanup_loop.sh runs them."""
+    stages = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            m = LIMITED_RE.match(line)
+            if m:
+                stages.append((m.group(1), True))
+            elif DECLARE_RE.match(line):
+                stages.append(("update_bot_userpage_status", False))
+            else:
+                m = SCRIPT_RE.match(line)
+                if m:
+                    stages.append((m.group(1), False))
+    return stages
+
+
+def stage_costs(records):
+    """{script: (startup seconds, seconds per edit)} from the RECENT_RUNS latest records of each script.
+
+    Startup is the median wall time of runs that made no edits, or else the
+    intercept of a least-squares fit of wall time on writes. With a single
+    write count to go on it is taken as 0, which charges it all to the edits.
+    """
+    by_script = defaultdict(list)
+    for record in records:
+        if record.get("status", "ok") == "ok":
+            by_script[record["script"]].append(record)
+    costs = {}
+    for script, recs in by_script.items():
+        recs = recs[-RECENT_RUNS:]
+        idle = [r["wall_s"] for r in recs if not r.get("writes")]
+        busy = [(r["writes"], r["wall_s"]) for r in recs if r.get("writes")]
+        if idle:
+            startup = statistics.median(idle)
+        elif len({w for w, _ in busy}) >= 2:
+            fit = statistics.linear_regression([w for w, _ in busy], [t for _, t in busy])
+            startup = min(max(0.0, fit.intercept), min(t for _, t in busy))
+        else:
+            startup = 0.0
+        if busy:
+            per_edit = max(MIN_PER_EDIT_S, statistics.median((t - startup) / w for w, t in busy))
+        else:
+            per_edit = DEFAULT_PER_EDIT_S
+        costs[script] = (startup, per_edit)
+    return costs
+
+
+def allocate(stages, backlogs, costs, seconds):
+    """Edit limits {script: n} for the limited stages that fit in seconds."""
+    default = (DEFAULT_STARTUP_S, DEFAULT_PER_EDIT_S)
+    for script, limited in stages:
+        if not limited:
+            seconds -= costs.get(script, default)[0]
+        else:
+            seconds -= costs.get("edit_budget", (0.0, 0.0))[0]  # its own `next` call
+
+    caps = {}
+    for script, limited in stages:
+        if limited:
+            backlog = backlogs.get(script)
+            caps[script] = DEFAULT_LIMIT if backlog is None else backlog
+    active = [s for s, cap in caps.items() if cap > 0]
+    alloc = {s: 0 for s in caps}
+
+    # Startup and the floor for as many stages as fit, in loop order
+    for script in active:
+        startup, per_edit = costs.get(script, default)
+        floor = min(FLOOR_EDITS, caps[script])
+        if seconds < startup + per_edit:
+            break
+        alloc[script] = min(floor, int((seconds - startup) // per_edit))
+        seconds -= startup + alloc[script] * per_edit
+
+    # The rest to the cheapest edits first
+    for script in sorted((s for s in active if alloc[s]), key=lambda s: costs.get(s, default)[1]):
+        per_edit = costs.get(script, default)[1]
+        extra = min(caps[script] - alloc[script], int(seconds // per_edit))
+        if extra > 0:
+            alloc[script] += extra
+            seconds -= extra * per_edit
+    return alloc
+
+
+def seconds_left():
+    start = float(os.getenv("LOOP_START_EPOCH") or time.time())
+    return (BUDGET_MINUTES - RESERVE_MINUTES) * 60 - (time.time() - start)
+
+
+def load_costs():
+    path = os.getenv(metrics.METRICS_LOG_ENV, "").strip() or DEFAULT_METRICS_LOG
+    return stage_costs(metrics.load_records(path))
+
+
+def load_plan():
+    run_id = os.getenv("GITHUB_RUN_ID", "")
+    if os.path.exists(PLAN_FILE):
+        with open(PLAN_FILE, "r", encoding="utf-8") as f:
+            plan = json.load(f)
+        if plan.get("run_id") == run_id:
+            return plan
+    return {"run_id": run_id, "backlogs": {}, "limits": {}}
+
+
+def save_plan(plan):
+    with open(PLAN_FILE, "w", encoding="utf-8") as f:
+        json.dump(plan, f, indent=2)
+        f.write("\n")
+
+
+def print_plan(stages, backlogs, costs, alloc, seconds):
+    print(f"Time budget left: {seconds / 60:.0f} min ({BUDGET_MINUTES:.0f} min job, {RESERVE_MINUTES:.0f} min reserve)")
+    print(f"{'stage':<40} {'backlog':>8} {'startup s':>10} {'s/edit':>7} {'limit':>6} {'est min':>8}")
+    for script, limited in stages:
+        if not limited:
+            continue
+        startup, per_edit = costs.get(script, (DEFAULT_STARTUP_S, DEFAULT_PER_EDIT_S))
+        backlog = backlogs.get(script)
+        n = alloc.get(script, 0)
+        est = (startup + n * per_edit) / 60 if n else 0.0
+        print(f"{script:<40} {'?' if backlog is None else backlog:>8} {startup:>10.0f} {per_edit:>7.1f} {n:>6} {est:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage edit limits that fill the job's time budget.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("plan", help="Probe every stage and print the allocation.")
+    nxt = sub.add_parser("next", help="Re-plan and print the limit for the stage about to run.")
+    nxt.add_argument("script", help="Stage script name without .py, as in cleanup_loop.sh.")
+    args = parser.parse_args()
+
+    stages = loop_stages()
+    costs = load_costs()
+    plan = load_plan()
+
+    if args.command == "plan":
+        plan["backlogs"] = {script: probe(script) for script, limited in stages if limited}
+        seconds = seconds_left()
+        alloc = allocate(stages, plan["backlogs"], costs, seconds)
+        print_plan(stages, plan["backlogs"], costs, alloc, seconds)
+        plan["limits"] = alloc
+        save_plan(plan)
+        return
+
+    names = [s for s, _ in stages]
+    if args.script not in names:
+        parser.error(f"{args.script} is not a stage in cleanup_loop.sh")
+    remaining = stages[names.index(args.script):]
+    if not plan["backlogs"]:
+        plan["backlogs"] = {script: probe(script) for script, limited in remaining if limited}
+    else:
+        plan["backlogs"][args.script] = probe(args.script)
+    seconds = seconds_left()
+    alloc = allocate(remaining, plan["backlogs"], costs, seconds)
+    limit = alloc.get(args.script, 0)
+    plan["limits"][args.script] = limit
+    save_plan(plan)
+    backlog = plan["backlogs"].get(args.script)
+    print(f"{args.script}: backlog {'?' if backlog is None else backlog}, "
+          f"{seconds / 60:.0f} min left -> limit {limit}", file=sys.stderr, flush=True)
+    print(limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+export_cache.py
+===============
+On-disk cache of enwiki Special:Export pages, keyed by (title, revid).
+
+reimport_from_enwiki.py used to download every export again when an import
+failed, and a dry run downloaded everything only for the --apply run to
+download it all again. Exports are now split as they stream in, one file
+per <page>, named by a hash of the page's title and revision id:
+
+    .export_cache/
+        header.xml            <mediawiki ...><siteinfo>...</siteinfo>
+        pages/<sha1>.xml      <page>...</page>, timestamps already mangled
+
+An import file is assembled from the header, the cached page fragments
+and a closing </mediawiki>. The revids come from the batched
+prop=revisions query the import planner already makes, so a cached
+fragment is only reused while it is still the current enwiki revision; a
+changed page simply misses the cache and is downloaded again. Fragments
+not used for CACHE_MAX_AGE_DAYS are pruned.
+
+Not a standalone script; imported by reimport_from_enwiki.py.
+
+    cache = ExportCache()
+    missing = [t for t in titles if not cache.has(t, revids[t])]
+    with open(raw_path, "rb") as f:
+        revids.update(cache.store_export(f))
+    assembled = cache.assemble([(t, revids[t]) for t in titles], "import.xml")
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import xml.sax
+from xml.sax.handler import ContentHandler
+from xml.sax.saxutils import XMLGenerator
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), ".export_cache")
+CACHE_MAX_AGE_DAYS = 30
+CHUNK_SIZE = 1 << 16  # bytes per read/write when copying fragments
+
+
+def _mangle(name):
+    """Rename <timestamp> so MediaWiki treats imported revisions as having no timestamp."""
+    return "timestam" if name == "timestamp" else name
+
+
+class ExportSplitter(ContentHandler):
+    """SAX handler that splits an export into a header and one file per <page>.
+
+    Everything before the first <page> is written to header_out; each page is
+    written to a temporary file in page_dir and handed to on_page(path, title,
+    revid) once it is complete. <timestamp> elements are renamed on the way
+    through; "timestamp" inside page text is left alone.
+    """
+
+    def __init__(self, header_out, page_dir, on_page):
+        super().__init__()
+        self.header = XMLGenerator(header_out, encoding="utf-8")
+        self.page_dir = page_dir
+        self.on_page = on_page
+        self.in_header = True
+        self.page = None  # (file, XMLGenerator, path) while inside <page>
+        self.stack = []
+        self.title = self.revid = None
+        self.capture = None
+
+    def _out(self):
+        if self.page is not None:
+            return self.page[1]
+        return self.header if self.in_header else None
+
+    def startDocument(self):
+        self.header.startDocument()
+
+    def startElement(self, name, attrs):
+        if name == "page":
+            self.in_header = False
+            fd, path = tempfile.mkstemp(dir=self.page_dir, suffix=".tmp")
+            f = open(fd, "w", encoding="utf-8", closefd=True)
+            self.page = (f, XMLGenerator(f, encoding="utf-8"), path)
+            self.title = self.revid = None
+        if self.page is not None:
+            parent = self.stack[-1] if self.stack else None
+            if name == "title" and parent == "page":
+                self.capture = []
+            elif name == "id" and parent == "revision":
+                self.capture = []
+        self.stack.append(name)
+        out = self._out()
+        if out is not None:
+            out.startElement(_mangle(name), attrs)
+
+    def endElement(self, name):
+        self.stack.pop()
+        if self.capture is not None and name in ("title", "id"):
+            value = "".join(self.capture).strip()
+            if name == "title":
+                self.title = value
+            else:
+                self.revid = int(value) if value.isdigit() else None
+            self.capture = None
+        out = self._out()
+        if out is not None and not (name == "mediawiki" and self.page is None):
+            out.endElement(_mangle(name))
+        if name == "page":
+            f, _, path = self.page
+            f.close()
+            self.page = None
+            self.on_page(path, self.title, self.revid)
+
+    def characters(self, content):
+        if self.capture is not None:
+            self.capture.append(content)
+        out = self._out()
+        if out is not None:
+            out.characters(content)
+
+    def ignorableWhitespace(self, content):
+        self.characters(content)
+
+
+class ExportCache:
+    """Directory of mangled <page> fragments keyed by (title, revid), plus a shared header."""
+
+    def __init__(self, root=DEFAULT_CACHE_DIR):
+        self.root = root
+        self.page_dir = os.path.join(root, "pages")
+        self.header_path = os.path.join(root, "header.xml")
+        os.makedirs(self.page_dir, exist_ok=True)
+
+    def _path(self, title, revid):
+        key = hashlib.sha1(f"{title}\t{revid}".encode("utf-8")).hexdigest()
+        return os.path.join(self.page_dir, key + ".xml")
+
+    def has(self, title, revid):
+        return revid is not None and os.path.exists(self.header_path) and os.path.exists(self._path(title, revid))
+
+    def store_export(self, src):
+        """Split a raw export (binary file) into the cache. Returns {title: revid} of the pages stored."""
+        stored = {}
+
+        def on_page(tmp_path, title, revid):
+            if title is None or revid is None:
+                os.remove(tmp_path)
+                return
+            os.replace(tmp_path, self._path(title, revid))
+            stored[title] = revid
+
+        header_tmp = self.header_path + ".tmp"
+        with open(header_tmp, "w", encoding="utf-8") as header_out:
+            xml.sax.parse(src, ExportSplitter(header_out, self.page_dir, on_page))
+        os.replace(header_tmp, self.header_path)
+        return stored
+
+    def assemble(self, pages, dest_path):
+        """Write an import file from cached fragments for [(title, revid)].
+
+        Returns the titles written. Pages with no cached fragment (e.g. absent
+        from the export because they were deleted or renamed) are left out.
+        """
+        assembled = []
+        with open(dest_path, "wb") as dest:
+            with open(self.header_path, "rb") as f:
+                shutil.copyfileobj(f, dest, CHUNK_SIZE)
+            for title, revid in pages:
+                path = self._path(title, revid)
+                if revid is None or not os.path.exists(path):
+                    continue
+                dest.write(b"\n  ")
+                with open(path, "rb") as f:
+                    shutil.copyfileobj(f, dest, CHUNK_SIZE)
+                os.utime(path)  # keep fragments in use from being pruned
+                assembled.append(title)
+            dest.write(b"\n</mediawiki>\n")
+        return assembled
+
+    def prune(self, max_age_days=CACHE_MAX_AGE_DAYS):
+        """Delete fragments not used in max_age_days. Returns the number removed."""
+        cutoff = time.time() - max_age_days * 86400
+        removed = 0
+        for name in os.listdir(self.page_dir):
+            path = os.path.join(self.page_dir, name)
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        return removed
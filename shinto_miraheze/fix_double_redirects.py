@@ -2,58 +2,121 @@
 """
 fix_double_redirects.py
 =======================
-Fixes pages listed on Special:DoubleRedirects by updating each redirect
-to point directly to the final target, eliminating intermediate redirects.
+Fixes double redirects by updating each redirect to point directly to the
+final target, eliminating intermediate redirects.
+
+Instead of reading the cached Special:DoubleRedirects report and following
+each chain one page read per hop, the whole redirect graph is loaded in bulk
+(generator=allredirects + prop=redirects, 500 targets per request per
+namespace). Chains are collapsed in memory with path compression, cycles
+are detected and skipped, and only redirects whose target is itself a
+redirect are rewritten. Section anchors are preserved: the fragment closest
+to the final target wins, otherwise the redirect keeps its own.
 
 Default mode is dry-run. Use --apply to save edits.
 """
 
 import argparse
-import io
-import os
+import json
 import re
 import sys
 import time
 
 import mwclient
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL
+
+sys.stdout.reconfigure(encoding="utf-8")
 
-WIKI_URL = "shinto.miraheze.org"
-WIKI_PATH = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "")
 THROTTLE = 1.5
 
 REDIRECT_RE = re.compile(r"#REDIRECT\s*\[\[([^\]]+)\]\]", re.IGNORECASE)
 
 
 def normalize_title(title):
-    """Normalize a page title for comparison (strip anchor, collapse whitespace)."""
-    title = title.split("#")[0]
+    """Normalize a page title for comparison (strip anchor and leading colon, collapse whitespace)."""
+    title = title.split("#")[0].lstrip(":")
     title = title.replace("_", " ")
     title = " ".join(title.split())
     return title.casefold()
 
 
-def iter_double_redirects(site):
-    """Yield titles from Special:DoubleRedirects."""
-    params = {
-        "list": "querypage",
-        "qppage": "DoubleRedirects",
-        "qplimit": "max",
-    }
-    while True:
-        data = site.api("query", **params)
-        entries = data.get("query", {}).get("querypage", {}).get("results", [])
-        for entry in entries:
-            title = entry.get("title", "")
-            if title:
-                yield title
-        if "continue" in data:
-            params.update(data["continue"])
+def load_redirect_graph(site, namespaces):
+    """Return {redirect title: (target title, fragment)} for every redirect in the given namespaces."""
+    graph = {}
+    for ns in namespaces:
+        params = {
+            "generator": "allredirects",
+            "garnamespace": ns,
+            "garunique": 1,
+            "garlimit": "max",
+            "prop": "redirects",
+            "rdprop": "title|fragment",
+            "rdlimit": "max",
+            "formatversion": 2,
+        }
+        while True:
+            data = site.api("query", **params)
+            for target in data.get("query", {}).get("pages", []):
+                for source in target.get("redirects", []):
+                    graph[source["title"]] = (target["title"], source.get("fragment", ""))
+            if "continue" in data:
+                params.update(data["continue"])
+            else:
+                break
+    return graph
+
+
+def resolve_chains(graph):
+    """Collapse every redirect chain in the graph.
+
+    Returns {redirect title: (final title, fragment)}, with None for
+    redirects that lead into a cycle. Each node is walked once: results are
+    written back for every node on a walked path, so later walks that reach
+    an already-resolved node stop there.
+    """
+    resolved = {}
+    for start in graph:
+        if start in resolved:
+            continue
+        path = []
+        on_path = set()
+        node = start
+        while node in graph and node not in resolved and node not in on_path:
+            on_path.add(node)
+            path.append(node)
+            node = graph[node][0]
+
+        if node in on_path:
+            base = None  # cycle
+        elif node in resolved:
+            base = resolved[node]
         else:
-            break
+            base = (node, "")  # chain ends at a non-redirect (or missing) page
+
+        for n in reversed(path):
+            if base is not None:
+                final, tail_fragment = base
+                base = (final, tail_fragment or graph[n][1])
+            resolved[n] = base
+    return resolved
+
+
+def plan_rewrites(graph, resolved):
+    """Return sorted (title, current target, new target) for redirects that point at a redirect."""
+    rewrites = []
+    for title, (target, fragment) in graph.items():
+        if target not in graph:
+            continue  # already points at a final page
+        result = resolved.get(title)
+        if result is None:
+            continue
+        final, final_fragment = result
+        current = f"{target}#{fragment}" if fragment else target
+        new = f"{final}#{final_fragment}" if final_fragment else final
+        rewrites.append((title, current, new))
+    rewrites.sort()
+    return rewrites
 
 
 def get_redirect_target(text):
@@ -64,43 +127,12 @@ def get_redirect_target(text):
     return None
 
 
-def resolve_final_target(site, start_target, max_depth=10):
-    """Follow redirect chain from start_target to the final destination.
-
-    Returns the target string of the last redirect in the chain (preserving
-    any section anchor it contains), or None if the chain is broken or loops.
-    """
-    seen = set()
-    current = start_target
-
-    for _ in range(max_depth):
-        norm = normalize_title(current)
-        if norm in seen:
-            return None
-        seen.add(norm)
-
-        page_title = current.split("#")[0].strip()
-        try:
-            page = site.pages[page_title]
-            text = page.text() if page.exists else ""
-        except Exception:
-            return None
-        if not text:
-            return current
-
-        next_target = get_redirect_target(text)
-        if next_target is None:
-            return current
-        current = next_target
-
-    return None
-
-
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--apply", action="store_true", help="Save edits (default is dry-run).")
     parser.add_argument("--max-edits", type=int, default=0, help="Max edits for this run (0 = no limit).")
     parser.add_argument("--run-tag", required=True, help="Wiki-formatted run tag link for edit summaries.")
+    parser.add_argument("--plan-file", default="", help="Write the planned rewrites as JSONL to this path.")
     args = parser.parse_args()
 
     site = mwclient.Site(
@@ -111,9 +143,25 @@ def main():
     site.login(USERNAME, PASSWORD)
     print(f"Logged in as {USERNAME}\n")
 
+    namespaces = sorted(ns for ns in site.namespaces if ns >= 0)
+    print(f"Loading redirect graph for {len(namespaces)} namespaces...")
+    graph = load_redirect_graph(site, namespaces)
+    resolved = resolve_chains(graph)
+    cycles = sorted(t for t, r in resolved.items() if r is None)
+    rewrites = plan_rewrites(graph, resolved)
+    print(f"  {len(graph)} redirects, {len(rewrites)} double redirects to fix, {len(cycles)} in cycles\n")
+    for title in cycles:
+        print(f"CYCLE: {title} -> [[{graph[title][0]}]]")
+
+    if args.plan_file:
+        with open(args.plan_file, "w", encoding="utf-8") as f:
+            for title, current_target, final_target in rewrites:
+                f.write(json.dumps({"title": title, "from": current_target, "to": final_target}, ensure_ascii=False) + "\n")
+        print(f"Wrote {len(rewrites)} planned rewrites to {args.plan_file}")
+
     processed = fixed = skipped = errors = 0
 
-    for title in iter_double_redirects(site):
+    for title, planned_target, final_target in rewrites:
         if args.max_edits and fixed >= args.max_edits:
             print(f"Reached max edits ({args.max_edits}); stopping run.")
             break
@@ -140,14 +188,8 @@ def main():
             skipped += 1
             continue
 
-        final_target = resolve_final_target(site, current_target)
-        if final_target is None:
-            print(f"{prefix} SKIP (broken or looping redirect chain)")
-            skipped += 1
-            continue
-
-        if normalize_title(current_target) == normalize_title(final_target):
-            print(f"{prefix} SKIP (already points to final target)")
+        if normalize_title(current_target) != normalize_title(planned_target):
+            print(f"{prefix} SKIP (changed since graph was loaded: now [[{current_target}]])")
             skipped += 1
             continue
 
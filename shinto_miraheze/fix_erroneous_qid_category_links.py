@@ -8,21 +8,17 @@ For pages in Category:Erroneous_qid_category_links:
 Default mode is dry-run. Use --apply to save edits.
 """
 
-import os
 import argparse
-import io
 import re
 import sys
 import time
 
 import mwclient
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL
+
+sys.stdout.reconfigure(encoding="utf-8")
 
-WIKI_URL = "shinto.miraheze.org"
-WIKI_PATH = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "[REDACTED_SECRET_1]")
 THROTTLE = 1.5
 
 SOURCE_CAT = "Erroneous_qid_category_links"
@@ -13,27 +13,29 @@ Priority:
   5. The QID itself
 """
 
-import re, time, io, sys, requests
-import os
-import mwclient
+import re, time, sys
 from mwclient.errors import APIError
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+from qid_index import QidIndex
+from wiki import THROTTLE, get_session, lazy_site
+
+sys.stdout.reconfigure(encoding='utf-8')
 
-WIKI_URL = "shinto.miraheze.org"
-WIKI_PATH = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "[REDACTED_SECRET_1]")
 WD_API = "https://www.wikidata.org/w/api.php"
-THROTTLE = 1.5
 
-site = mwclient.Site(WIKI_URL, path=WIKI_PATH,
-                     clients_useragent='IllFixerBot/1.0 (User:EmmaBot; shinto.miraheze.org)')
-site.login(USERNAME, PASSWORD)
-print(f"Logged in as {USERNAME}", flush=True)
+site = lazy_site('IllFixerBot/1.0 (User:EmmaBot; shinto.miraheze.org)')
 
 # ── QID resolution cache ──────────────────────────────────
 _qid_cache = {}
+_qid_index = None
+
+
+def get_qid_index():
+    """The local Q page index, loaded from disk on first use."""
+    global _qid_index
+    if _qid_index is None:
+        _qid_index = QidIndex.load()
+    return _qid_index
 
 
 def resolve_qid(qid):
@@ -43,25 +45,18 @@ def resolve_qid(qid):
     if qid in _qid_cache:
         return _qid_cache[qid]
 
-    # 1. Check wiki QID redirect
-    try:
-        qid_page = site.pages[qid]
-        if qid_page.exists:
-            text = qid_page.text()
-            m = re.match(r'#REDIRECT\s*\[\[([^\]]+)\]\]', text, re.IGNORECASE)
-            if m:
-                target = m.group(1)
-                _qid_cache[qid] = target
-                return target
-    except Exception:
-        pass
+    # 1. Check wiki QID redirect (from the local Q page index)
+    target = get_qid_index().redirect_target(qid)
+    if target:
+        _qid_cache[qid] = target
+        return target
 
     # 2. Query Wikidata for enwiki sitelink / en label
     try:
         time.sleep(0.5)
-        resp = requests.get(WD_API, params={
+        resp = get_session().get(WD_API, params={
             'action': 'wbgetentities', 'ids': qid,
-            'props': 'labels|sitelinks', 'languages': 'en',
+            'props': 'labels|sitelinks', 'languages': 'en', 'sitefilter': 'enwiki',
             'format': 'json'
         }, headers={'User-Agent': 'IllFixerBot/1.0'}, timeout=30)
         entity = resp.json().get('entities', {}).get(qid, {})
@@ -156,6 +151,10 @@ def main():
     print("FIX ILL TEMPLATE DESTINATIONS", flush=True)
     print("=" * 70, flush=True)
 
+    index = get_qid_index()
+    fetched, removed = index.refresh(site)
+    print(f"Q page index: {len(index)} pages ({fetched} re-read, {removed} removed)", flush=True)
+
     total = 0
     edited = 0
     skipped = 0
@@ -18,7 +18,6 @@ Default mode is dry-run. Use --apply to actually edit the wiki page.
 """
 
 import argparse
-import io
 import os
 import re
 import sys
@@ -27,13 +26,12 @@ import time
 import mwclient
 import requests
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+from wikidata_entity import Entity
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL, append_state, load_state
+
+sys.stdout.reconfigure(encoding="utf-8")
 
 # ─── CONFIG ─────────────────────────────────────────────────
-WIKI_URL = "shinto.miraheze.org"
-WIKI_PATH = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "")
 THROTTLE = 1.5
 
 CATEGORY_NAME = "Pages linked to Wikidata"
@@ -45,6 +43,7 @@ WD_LINK_RE = re.compile(r'\{\{wikidata link\|(Q\d+)\}\}', re.IGNORECASE)
 QS_LINE_RE = re.compile(r'^(Q\d+)\|P11250\|"shinto:(.+)"$')
 
 USER_AGENT = "ShintoBotP11250/1.0 (User:EmmaBot; shinto.miraheze.org)"
+WIKIDATA_API = "https://www.wikidata.org/w/api.php"
 
 QS_PAGE_HEADER = """\
 QuickStatements for syncing [https://www.wikidata.org/wiki/Property:P11250 P11250] (Miraheze article ID) to Wikidata.
@@ -59,23 +58,6 @@ QS_PAGE_FOOTER = "</pre>"
 
 # ─── STATE ──────────────────────────────────────────────────
 
-def load_state(path):
-    done = set()
-    if not os.path.exists(path):
-        return done
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            s = line.strip()
-            if s:
-                done.add(s)
-    return done
-
-
-def append_state(path, title):
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(title + "\n")
-
-
 def clear_state(path):
     with open(path, "w", encoding="utf-8") as f:
         pass
@@ -153,20 +135,23 @@ def get_category_pages_recursive(site, category_name, visited_cats=None):
 def get_wikidata_p11250(qid):
     """
     Fetch P11250 values for a Wikidata item.
-    Returns a list of string values, or None on error.
+    Returns a list of string values, or None on error or if the item is
+    missing or deleted.
+
+    Only claims are requested (no labels, descriptions, aliases or
+    sitelinks), and only P11250 is kept.
     """
     try:
-        url = f"https://www.wikidata.org/wiki/Special:EntityData/{qid}.json"
-        resp = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=15)
+        resp = requests.get(WIKIDATA_API, params={
+            "action": "wbgetentities", "ids": qid, "props": "claims", "format": "json",
+        }, headers={"User-Agent": USER_AGENT}, timeout=15)
         resp.raise_for_status()
-        entity = resp.json().get("entities", {}).get(qid, {})
-        claims = entity.get("claims", {}).get("P11250", [])
-        values = []
-        for claim in claims:
-            dv = claim.get("mainsnak", {}).get("datavalue", {})
-            if dv.get("type") == "string":
-                values.append(dv["value"])
-        return values
+        data = resp.json().get("entities", {}).get(qid, {"id": qid})
+        if "missing" in data:
+            print(f"   ! {qid} does not exist on Wikidata")
+            return None
+        entity = Entity.from_json(data, claims=("P11250",))
+        return [c.value for c in entity.claims.get("P11250", ()) if isinstance(c.value, str)]
     except Exception as e:
         print(f"   ! error fetching P11250 for {qid}: {e}")
         return None
@@ -4,6 +4,35 @@
 V25: Handles both regular Shikinaisha pages and Wikidata redirects
 - For regular Wikidata items: generates full page content
 - For Wikidata redirects: creates a redirect page (#redirect[[Q_TARGET]])
+
+Page text is read 50 pages per request, and Wikidata is read with
+wbgetentities, 50 items per request: one props=info pass gives every
+shrine item's lastrevid and redirect target, then entities for the
+shrines and for every item they reference are prefetched in batches.
+Only en/ja labels, sitelinks and claims are requested, and they are kept
+as compact wikidata_entity.Entity records; referenced items keep only the
+claims rendering reads from them (REF_CLAIMS).
+A page is saved only when the render differs from its current text.
+
+Each rendered page's inputs (shrine and referenced item revids) are stored
+as a fingerprint in generate_shikinaisha_pages.state (JSONL). With
+--incremental, only pages whose fingerprinted items changed, or that have
+no fingerprint yet, are regenerated.
+
+With --entity-store, entities and property labels come from a local store
+built by ingest_wikidata_dump.py from a Wikidata JSON dump; only items not
+in the store are looked up live.
+
+Pages render inline, one 50-page batch at a time, by default: a batch
+renders in milliseconds next to over a minute of throttled saves. With
+--workers N and at least POOL_MIN_PAGES pages to regenerate, every entity
+is prefetched first and the whole list is rendered up front across N
+processes.
+
+Usage:
+    python generate_shikinaisha_pages_v25_with_redirects.py
+    python generate_shikinaisha_pages_v25_with_redirects.py --incremental
+    python generate_shikinaisha_pages_v25_with_redirects.py --entity-store shikinaisha_entities.jsonl.gz
 """
 
 import mwclient
@@ -13,16 +42,17 @@ import time
 import re
 import os
 import csv
+import json
+import argparse
+import multiprocessing
 from datetime import datetime
 
+from wikidata_entity import API_LANGUAGES, API_PROPS, Entity, load_entity_store, referenced_qids
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL
+
 if sys.platform == 'win32':
-    import io
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stdout.reconfigure(encoding='utf-8')
 
-WIKI_URL  = 'shinto.miraheze.org'
-WIKI_PATH = '/w/'
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "[REDACTED_SECRET_1]")
 PROPERTIES_TO_IGNORE = ['P11250']
 PROPERTIES_TO_OMIT = ['P1448', 'P2671']
 
@@ -30,116 +60,214 @@ PROPERTIES_TO_OMIT = ['P1448', 'P2671']
 PROPERTY_LABELS_CACHE = 'property_labels_cache.csv'
 PROPERTY_LABELS_CACHE_PARENT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'property_labels_cache.csv')
 
-# Load property labels cache
 PROPERTY_LABELS = {}
-cache_path = None
-if os.path.exists(PROPERTY_LABELS_CACHE):
-    cache_path = PROPERTY_LABELS_CACHE
-elif os.path.exists(PROPERTY_LABELS_CACHE_PARENT):
-    cache_path = PROPERTY_LABELS_CACHE_PARENT
-
-if cache_path:
-    print(f"Loading property labels cache from {cache_path}...")
-    try:
-        with open(cache_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                PROPERTY_LABELS[row['property_id']] = row['label']
-        print(f"Loaded {len(PROPERTY_LABELS)} cached property labels\n")
-    except Exception as e:
-        print(f"Warning: Could not load property labels cache: {e}\n")
-else:
-    print(f"Warning: Property labels cache file not found")
-    print("Run fetch_property_labels.py first to create cache\n")
+site = None
+
+def load_property_labels():
+    """Load the property labels cache into PROPERTY_LABELS."""
+    cache_path = None
+    if os.path.exists(PROPERTY_LABELS_CACHE):
+        cache_path = PROPERTY_LABELS_CACHE
+    elif os.path.exists(PROPERTY_LABELS_CACHE_PARENT):
+        cache_path = PROPERTY_LABELS_CACHE_PARENT
+
+    if cache_path:
+        print(f"Loading property labels cache from {cache_path}...")
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                reader = csv.DictReader(f)
+                for row in reader:
+                    PROPERTY_LABELS[row['property_id']] = row['label']
+            print(f"Loaded {len(PROPERTY_LABELS)} cached property labels\n")
+        except Exception as e:
+            print(f"Warning: Could not load property labels cache: {e}\n")
+    else:
+        print(f"Warning: Property labels cache file not found")
+        print("Run fetch_property_labels.py first to create cache\n")
 
-site = mwclient.Site(WIKI_URL, path=WIKI_PATH, clients_useragent='ShintoWikiBot/1.0 (EmmaBot@shinto.miraheze.org)')
-site.login(USERNAME, PASSWORD)
+def connect():
+    """Log in to shintowiki. Done from main() so render workers can import this module without logging in."""
+    global site
+    site = mwclient.Site(WIKI_URL, path=WIKI_PATH, clients_useragent='ShintoWikiBot/1.0 (EmmaBot@shinto.miraheze.org)')
+    site.login(USERNAME, PASSWORD)
 
-try:
-    ui = site.api('query', meta='userinfo')
-    logged_user = ui['query']['userinfo'].get('name', USERNAME)
-    print(f"Logged in as {logged_user}\n")
-except Exception:
-    print("Logged in (could not fetch username via API)\n")
+    try:
+        ui = site.api('query', meta='userinfo')
+        logged_user = ui['query']['userinfo'].get('name', USERNAME)
+        print(f"Logged in as {logged_user}\n")
+    except Exception:
+        print("Logged in (could not fetch username via API)\n")
 
 # ═══ SHARED HELPER FUNCTIONS ═══
 
+WIKIDATA_API = 'https://www.wikidata.org/w/api.php'
+WD_HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+WD_BATCH = 50  # max ids per wbgetentities request
+CONTENT_BATCH = 50  # max titles per content query
+RENDER_VERSION = 'v25'  # bump when format_page_content output changes, to force regeneration
+DEFAULT_STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'generate_shikinaisha_pages.state')
+REF_CLAIMS = ('P2699',)  # the only claims read from referenced items (source URL)
+POOL_MIN_PAGES = 500  # fewer pages than this render inline even with --workers
+MISSING = 'missing'  # revision marker for a deleted or nonexistent item
+
+# Entities fetched this run, by QID (None for missing/redirected items).
+# Filled in batches by fetch_entities so rendering does not hit the network.
+ENTITY_CACHE = {}
+# Revision markers (MISSING or 'redirect:QID') of the items cached as None,
+# so fingerprints record something stable for them instead of no revid.
+UNAVAILABLE = {}
+
 def get_wikidata_entity(qid):
+    if qid in ENTITY_CACHE:
+        return ENTITY_CACHE[qid]
     try:
         url = f'https://www.wikidata.org/wiki/Special:EntityData/{qid}.json'
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-        resp = requests.get(url, timeout=10, headers=headers)
+        resp = requests.get(url, timeout=10, headers=WD_HEADERS)
         resp.raise_for_status()
         data = resp.json()
-        if 'entities' in data and qid in data['entities']:
-            return data['entities'][qid]
-        return None
+        entity = Entity.from_json(data['entities'][qid]) if 'entities' in data and qid in data['entities'] else None
+        ENTITY_CACHE[qid] = entity
+        return entity
     except Exception as e:
         print(f"     ! Error fetching {qid}: {e}")
         return None
 
-def check_wikidata_redirect(qid):
-    """Check if a Wikidata QID is a redirect and return target QID if so"""
-    try:
-        url = f'https://www.wikidata.org/w/api.php'
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-        params = {
-            'action': 'wbgetentities',
-            'ids': qid,
-            'format': 'json'
-        }
-        resp = requests.get(url, params=params, timeout=10, headers=headers)
+def _wbgetentities(ids, props=None, languages=None):
+    """Yield (requested id, entity JSON) for ids, WD_BATCH per request."""
+    for i in range(0, len(ids), WD_BATCH):
+        batch = ids[i:i + WD_BATCH]
+        params = {'action': 'wbgetentities', 'ids': '|'.join(batch), 'format': 'json'}
+        if props:
+            params['props'] = props
+        if languages:
+            params['languages'] = languages
+        resp = requests.get(WIKIDATA_API, params=params, timeout=60, headers=WD_HEADERS)
         resp.raise_for_status()
-        data = resp.json()
-
-        if 'entities' in data and qid in data['entities']:
-            entity = data['entities'][qid]
-            # Check if it's a redirect
-            if 'redirects' in entity:
-                return entity['redirects'].get('to')
-        return None
-    except Exception as e:
-        print(f"     ! Error checking redirect for {qid}: {e}")
-        return None
+        entities = resp.json().get('entities', {})
+        for qid in batch:
+            yield qid, entities.get(qid)
+
+def get_entity_revisions(qids):
+    """Return {qid: (lastrevid, redirect target or None)}, WD_BATCH ids per request.
+
+    Redirects are reported in the same response (entity['redirects']), so no
+    separate redirect check is needed. Missing items map to (MISSING, None).
+    """
+    revisions = {}
+    for qid, entity in _wbgetentities(sorted(set(qids)), props='info'):
+        if not entity or 'missing' in entity:
+            revisions[qid] = (MISSING, None)
+            continue
+        target = entity.get('redirects', {}).get('to')
+        revisions[qid] = (entity.get('lastrevid'), target)
+    return revisions
+
+def fetch_entities(qids, claims=None):
+    """Load entities for qids into ENTITY_CACHE, WD_BATCH per request.
+
+    claims=(pid, ...) keeps only those claims; such partial entities are
+    fetched again if the item is later needed in full.
+    """
+    todo = sorted({q for q in qids
+                   if q not in ENTITY_CACHE or (claims is None and ENTITY_CACHE[q] and ENTITY_CACHE[q].partial)})
+    for qid, entity in _wbgetentities(todo, props=API_PROPS, languages=API_LANGUAGES):
+        if not entity or 'missing' in entity or 'redirects' in entity:
+            # Special:EntityData lookups treated these as missing too.
+            ENTITY_CACHE[qid] = None
+            target = entity.get('redirects', {}).get('to') if entity else None
+            UNAVAILABLE[qid] = f'redirect:{target}' if target else MISSING
+        else:
+            ENTITY_CACHE[qid] = Entity.from_json(entity, claims=claims)
+
+def fingerprint_revid(revision):
+    """What a fingerprint stores for (lastrevid, redirect target): the revid, 'redirect:QID' or MISSING."""
+    lastrevid, target = revision
+    return f'redirect:{target}' if target else lastrevid
+
+def ref_revid(qid):
+    """Fingerprint value for a referenced item as it was rendered from ENTITY_CACHE."""
+    entity = ENTITY_CACHE.get(qid)
+    if entity:
+        return entity.lastrevid
+    return UNAVAILABLE.get(qid, MISSING)
+
+def load_fingerprints(path):
+    """Return {page name: fingerprint} from the JSONL state file (last entry per page wins)."""
+    fingerprints = {}
+    if not os.path.exists(path):
+        return fingerprints
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                fingerprints[entry.pop('page')] = entry
+    return fingerprints
+
+def append_fingerprint(path, page_name, fingerprint):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'page': page_name, **fingerprint}, ensure_ascii=False) + '\n')
+
+def is_current(fingerprint, revisions):
+    """True if none of the entities a page was rendered from have changed since."""
+    if not fingerprint or fingerprint.get('render') != RENDER_VERSION:
+        return False
+    for qid, revid in fingerprint.get('revids', {}).items():
+        if qid not in revisions or fingerprint_revid(revisions[qid]) != revid:
+            return False
+    return True
+
+def load_member_texts():
+    """Return {page name: wikitext} for mainspace members of the generated-pages category, CONTENT_BATCH per request."""
+    texts = {}
+    params = {
+        'generator': 'categorymembers',
+        'gcmtitle': 'Category:Wikidata generated shikinaisha pages',
+        'gcmnamespace': 0,
+        'gcmlimit': CONTENT_BATCH,
+        'prop': 'revisions',
+        'rvprop': 'content',
+        'rvslots': 'main',
+        'formatversion': 2,
+    }
+    while True:
+        data = site.api('query', **params)
+        for page in data.get('query', {}).get('pages', []):
+            revisions = page.get('revisions') or []
+            if revisions:
+                texts[page['title']] = revisions[0].get('slots', {}).get('main', {}).get('content', '')
+        if 'continue' in data:
+            params.update(data['continue'])
+        else:
+            break
+    return texts
 
 def get_property_value(entity, property_id):
-    if not entity or 'claims' not in entity:
+    if not entity:
         return None
-    claims = entity.get('claims', {})
-    prop_claims = claims.get(property_id, [])
+    prop_claims = entity.claims.get(property_id)
     if not prop_claims:
         return None
-    claim = prop_claims[0]
-    mainsnak = claim.get('mainsnak', {})
-    datavalue = mainsnak.get('datavalue', {})
-    return datavalue.get('value')
+    return prop_claims[0].value
 
 def get_label(entity, lang='en'):
     if not entity:
         return None
-    labels = entity.get('labels', {})
-    if lang in labels:
-        return labels[lang].get('value')
-    return None
+    return entity.labels.get(lang)
 
 def get_sitelinks(entity):
-    sitelinks = {}
-    if entity and 'sitelinks' in entity:
-        for site_code, site_data in entity['sitelinks'].items():
-            sitelinks[site_code] = site_data.get('title', '')
-    return sitelinks
+    return entity.sitelinks if entity else {}
 
 def get_all_property_claims(entity):
-    if not entity or 'claims' not in entity:
+    if not entity:
         return {}
-    return entity.get('claims', {})
+    return entity.claims
 
 def extract_province_from_p361(entity):
-    p361_claims = entity.get('claims', {}).get('P361', [])
+    p361_claims = entity.claims.get('P361', ())
     for claim in p361_claims:
-        datavalue = claim.get('mainsnak', {}).get('datavalue', {})
-        if isinstance(datavalue.get('value'), dict):
-            list_qid = datavalue['value'].get('id')
+        if isinstance(claim.value, dict):
+            list_qid = claim.value.get('id')
             if list_qid:
                 list_entity = get_wikidata_entity(list_qid)
                 list_label = get_label(list_entity)
@@ -177,24 +305,20 @@ def get_property_heading(property_id):
     return f"{property_id} ({property_id})"
 
 def get_source_reference_with_url(claim):
-    references = claim.get('references', [])
+    references = claim.references
     if not references:
         return None
-    for ref in references:
-        ref_snaks = ref.get('snaks', {})
+    for ref_snaks in references:
         url = None
         if 'P854' in ref_snaks:
-            for snak in ref_snaks['P854']:
-                datavalue = snak.get('datavalue', {})
-                url = datavalue.get('value')
+            for url in ref_snaks['P854']:
                 if url:
                     source_label = None
                     source_qid = None
                     if 'P248' in ref_snaks:
-                        for source_snak in ref_snaks['P248']:
-                            source_datavalue = source_snak.get('datavalue', {})
-                            if isinstance(source_datavalue.get('value'), dict):
-                                source_qid = source_datavalue['value'].get('id')
+                        for source_value in ref_snaks['P248']:
+                            if isinstance(source_value, dict):
+                                source_qid = source_value.get('id')
                                 if source_qid:
                                     source_entity = get_wikidata_entity(source_qid)
                                     if source_entity:
@@ -212,29 +336,24 @@ def get_source_reference_with_url(claim):
             source_label = None
             source_qid = None
             source_url = None
-            for source_snak in ref_snaks['P248']:
-                source_datavalue = source_snak.get('datavalue', {})
-                if isinstance(source_datavalue.get('value'), dict):
-                    source_qid = source_datavalue['value'].get('id')
+            for source_value in ref_snaks['P248']:
+                if isinstance(source_value, dict):
+                    source_qid = source_value.get('id')
                     if source_qid:
                         source_entity = get_wikidata_entity(source_qid)
                         if source_entity:
                             source_label = get_label(source_entity)
                             break
             if 'P2699' in ref_snaks:
-                for url_snak in ref_snaks['P2699']:
-                    datavalue = url_snak.get('datavalue', {})
-                    source_url = datavalue.get('value')
+                for source_url in ref_snaks['P2699']:
                     if source_url:
                         break
             if not source_url and source_qid:
                 source_entity = get_wikidata_entity(source_qid)
                 if source_entity:
-                    source_claims = source_entity.get('claims', {})
-                    p2699_claims = source_claims.get('P2699', [])
+                    p2699_claims = source_entity.claims.get('P2699')
                     if p2699_claims:
-                        source_dataval = p2699_claims[0].get('mainsnak', {}).get('datavalue', {})
-                        source_url = source_dataval.get('value')
+                        source_url = p2699_claims[0].value
             if source_url and source_label and source_qid:
                 return f"{source_label} ({source_qid}) {source_url}"
             elif source_url and source_label:
@@ -249,13 +368,13 @@ def format_qualifier_value(qualifier_value):
     if isinstance(qualifier_value, dict) and 'id' in qualifier_value:
         qid = qualifier_value['id']
         ref_entity = get_wikidata_entity(qid)
-        return format_wikidata_link(ref_entity or {}, qid)
+        return format_wikidata_link(ref_entity, qid)
     if isinstance(qualifier_value, str):
         return qualifier_value
     return str(qualifier_value)
 
 def get_qualifiers_text(claim):
-    qualifiers = claim.get('qualifiers', {})
+    qualifiers = claim.qualifiers
     qualifier_lines = []
     if not qualifiers:
         return qualifier_lines
@@ -268,10 +387,8 @@ def get_qualifiers_text(claim):
         'P813': 'Retrieved',
         'P854': 'Reference URL',
     }
-    for qualifier_id, qualifier_claims in qualifiers.items():
-        for qualifier_claim in qualifier_claims:
-            qualifier_datavalue = qualifier_claim.get('datavalue', {})
-            qualifier_value = qualifier_datavalue.get('value')
+    for qualifier_id, qualifier_values in qualifiers.items():
+        for qualifier_value in qualifier_values:
             if qualifier_value:
                 qual_label = qualifier_labels.get(qualifier_id, qualifier_id)
                 formatted_qual_value = format_qualifier_value(qualifier_value)
@@ -279,15 +396,13 @@ def get_qualifiers_text(claim):
     return qualifier_lines
 
 def format_claim_value(claim, entity, property_id=None):
-    mainsnak = claim.get('mainsnak', {})
-    datavalue = mainsnak.get('datavalue', {})
-    value = datavalue.get('value')
+    value = claim.value
     if not value:
         return None, [], None
     if isinstance(value, dict) and 'id' in value:
         qid = value['id']
         ref_entity = get_wikidata_entity(qid)
-        formatted = format_wikidata_link(ref_entity or {}, qid)
+        formatted = format_wikidata_link(ref_entity, qid)
         qualifiers = get_qualifiers_text(claim)
         source = get_source_reference_with_url(claim)
         return formatted, qualifiers, source
@@ -354,7 +469,7 @@ def format_page_content(page_name, qid, entity):
         deity_qid = deity.get('id')
         if deity_qid:
             deity_entity = get_wikidata_entity(deity_qid)
-            deity_link = format_wikidata_link(deity_entity or {}, deity_qid)
+            deity_link = format_wikidata_link(deity_entity, deity_qid)
             infobox_parts.append(f"| deity = {deity_link}")
     established = get_property_value(entity, 'P571')
     if established:
@@ -418,11 +533,10 @@ def format_page_content(page_name, qid, entity):
         categories.append("[[Category:Autogenerated pages with simplewiki or enwiki interwikis, possibly accidentally overwritten]]")
     if has_jawiki:
         categories.append("[[Category:Autogenerated pages with jawiki interwikis, possibly accidentally overwritten]]")
-    p31_values = entity.get('claims', {}).get('P31', [])
+    p31_values = entity.claims.get('P31', ())
     for claim in p31_values:
-        datavalue = claim.get('mainsnak', {}).get('datavalue', {})
-        if isinstance(datavalue.get('value'), dict):
-            instance_qid = datavalue['value'].get('id')
+        if isinstance(claim.value, dict):
+            instance_qid = claim.value.get('id')
             if instance_qid:
                 instance_entity = get_wikidata_entity(instance_qid)
                 instance_label = get_label(instance_entity)
@@ -454,83 +568,204 @@ def format_redirect_page(target_qid):
     """Generate a redirect page that points to another Wikidata item"""
     return f"#redirect[[{target_qid}]]"
 
+def _init_render_worker(property_labels):
+    PROPERTY_LABELS.update(property_labels)
+
+def _render_slice(job):
+    tasks, refs = job
+    ENTITY_CACHE.update(refs)
+    return [format_page_content(page_name, qid, entity) for page_name, qid, entity in tasks]
+
+def render_pages(tasks, pool=None, workers=1):
+    """Render [(page name, qid, entity)] with format_page_content, in input order.
+
+    Tasks are split into one contiguous slice per worker, and each slice is
+    shipped with the referenced entities it needs from ENTITY_CACHE (once
+    per slice, not per page), so workers do no network I/O. With pool=None
+    everything renders inline.
+    """
+    if pool is None or workers <= 1:
+        return [format_page_content(page_name, qid, entity) for page_name, qid, entity in tasks]
+    size = -(-len(tasks) // workers)
+    jobs = []
+    for i in range(0, len(tasks), size):
+        part = tasks[i:i + size]
+        refs = set().union(*(referenced_qids(entity) for _, _, entity in part))
+        jobs.append((part, {r: ENTITY_CACHE.get(r) for r in refs}))
+    return [content for rendered in pool.map(_render_slice, jobs) for content in rendered]
+
+def prefetch_chunk(chunk, revisions):
+    """Fetch the shrine entities of [(page name, qid)], then every item they reference, in batches."""
+    fetch_entities([qid for _, qid in chunk if revisions.get(qid, (MISSING, None))[0] != MISSING
+                    and not revisions[qid][1]])
+    refs = set()
+    for _, qid in chunk:
+        if ENTITY_CACHE.get(qid):
+            refs |= referenced_qids(ENTITY_CACHE[qid])
+    fetch_entities(refs, claims=REF_CLAIMS)
+
+def render_chunk(chunk, revisions, pool=None, workers=1):
+    """Return {page name: rendered text} for the pages of [(page name, qid)] that have an entity."""
+    renderable = [(name, qid, ENTITY_CACHE[qid]) for name, qid in chunk
+                  if qid in revisions and not revisions[qid][1] and ENTITY_CACHE.get(qid)]
+    return dict(zip((name for name, _, _ in renderable), render_pages(renderable, pool, workers)))
+
+def make_render_pool(workers):
+    """Process pool for render_pages, or None when workers <= 1."""
+    if workers <= 1:
+        return None
+    return multiprocessing.Pool(workers, initializer=_init_render_worker, initargs=(dict(PROPERTY_LABELS),))
+
 # ═══ MAIN PROCESS ═══
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only regenerate pages whose Wikidata inputs changed since the stored fingerprint.')
+    parser.add_argument('--state-file', default=DEFAULT_STATE_FILE, help='Path to the JSONL fingerprint file.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help=f'Render processes for runs of at least {POOL_MIN_PAGES} pages (default 1: inline).')
+    parser.add_argument('--entity-store',
+                        help='Entity store from ingest_wikidata_dump.py to render from instead of live Wikidata.')
+    args = parser.parse_args()
+
+    load_property_labels()
+    stored = {}
+    if args.entity_store:
+        stored, labels = load_entity_store(args.entity_store)
+        ENTITY_CACHE.update(stored)
+        PROPERTY_LABELS.update(labels)
+        print(f"Loaded {len(stored)} entities and {len(labels)} property labels from {args.entity_store}\n")
+    connect()
+
     print("Generating standardized Shikinaisha pages (V25 - With Wikidata redirects)\n")
     print("=" * 60)
 
-    category = site.pages['Category:Wikidata generated shikinaisha pages']
-    all_members = list(category.members())
-    members = [m for m in all_members if m.namespace == 0]
-
-    print(f"Found {len(members)} mainspace pages\n")
+    texts = load_member_texts()
+    print(f"Found {len(texts)} mainspace pages\n")
 
-    processed_count = 0
+    pages = []  # (page name, qid)
     error_count = 0
-    redirect_count = 0
-
-    for i, page in enumerate(members, 1):
-        page_name = page.name
-
-        try:
-            page_text = page.text()
-        except Exception as e:
-            print(f"{i:4d}. {page_name:50s} [ERROR reading: {str(e)[:40]}]")
-            error_count += 1
-            continue
-
+    for page_name in sorted(texts):
         # Extract QID
-        match = re.search(r'{{wikidata link\|([Qq](\d+))}}', page_text, re.IGNORECASE)
+        match = re.search(r'{{wikidata link\|([Qq](\d+))}}', texts[page_name], re.IGNORECASE)
         if not match:
-            print(f"{i:4d}. {page_name:50s} [NO QID FOUND]")
+            print(f"      {page_name:50s} [NO QID FOUND]")
             error_count += 1
             continue
+        pages.append((page_name, match.group(1).upper()))
+
+    # One batched revision check covers the shrine items (and detects
+    # redirects) plus, in incremental mode, every item a page was rendered from.
+    fingerprints = load_fingerprints(args.state_file)
+    check = {qid for _, qid in pages}
+    if args.incremental:
+        for page_name, _ in pages:
+            check.update(fingerprints.get(page_name, {}).get('revids', {}))
+    # Items in the entity store are as of the dump; only the rest are checked live.
+    revisions = {qid: (stored[qid].lastrevid, None) for qid in check if qid in stored}
+    revisions.update(get_entity_revisions(check - set(stored)))
+    print(f"Checked revisions of {len(check)} Wikidata item(s)")
+
+    if args.incremental:
+        todo = [(name, qid) for name, qid in pages if not is_current(fingerprints.get(name), revisions)]
+        print(f"{len(pages) - len(todo)} page(s) unchanged since last run, {len(todo)} to regenerate\n")
+    else:
+        todo = pages
 
-        qid = match.group(1).upper()
+    processed_count = 0
+    unchanged_count = 0
+    redirect_count = 0
 
+    # A pool only pays for itself on a large batch: prefetch everything, render it all up front.
+    render_up_front = args.workers > 1 and len(todo) >= POOL_MIN_PAGES
+    if render_up_front:
+        for start in range(0, len(todo), WD_BATCH):
+            prefetch_chunk(todo[start:start + WD_BATCH], revisions)
+        pool = make_render_pool(args.workers)
         try:
-            print(f"{i:4d}. {page_name:50s} ({qid})", end="", flush=True)
-
-            # Check if this is a Wikidata redirect
-            target_qid = check_wikidata_redirect(qid)
-
-            if target_qid:
-                # This is a redirect - create a redirect page
-                redirect_content = format_redirect_page(target_qid)
-                page.edit(redirect_content, summary=f"v25: Wikidata redirect to {target_qid}")
-                print(f" ... → {target_qid} (redirect)")
-                redirect_count += 1
-            else:
-                # Regular page - generate full content
-                # Fetch Wikidata
-                entity = get_wikidata_entity(qid)
-                if not entity:
-                    print(f" ... ! Error fetching entity")
+            rendered = render_chunk(todo, revisions, pool, args.workers)
+        finally:
+            pool.close()
+            pool.join()
+        print(f"Rendered {len(rendered)} page(s) with {args.workers} workers\n")
+
+    for start in range(0, len(todo), WD_BATCH):
+        chunk = todo[start:start + WD_BATCH]
+        if not render_up_front:
+            # Prefetch, then render the whole chunk (CPU only) before the save loop.
+            prefetch_chunk(chunk, revisions)
+            rendered = render_chunk(chunk, revisions)
+
+        for i, (page_name, qid) in enumerate(chunk, start + 1):
+            try:
+                print(f"{i:4d}. {page_name:50s} ({qid})", end="", flush=True)
+
+                if revisions.get(qid, (MISSING, None))[0] == MISSING:
+                    print(f" ... ! Wikidata item not found")
                     error_count += 1
                     continue
 
-                # Generate content
-                new_content = format_page_content(page_name, qid, entity)
-
-                # Edit the page
-                page.edit(new_content, summary="v25: Standardize page format")
-                print(f" ... ✓ Edited")
-                processed_count += 1
-
-            # Rate limiting
-            time.sleep(1.5)
-
-        except Exception as e:
-            print(f"\n   ! ERROR: {e}")
-            error_count += 1
-            time.sleep(1)
+                target_qid = revisions[qid][1]
+                if target_qid:
+                    # This is a redirect - create a redirect page
+                    new_content = format_redirect_page(target_qid)
+                    summary = f"v25: Wikidata redirect to {target_qid}"
+                    fingerprint = {'revids': {qid: fingerprint_revid(revisions[qid])}}
+                else:
+                    entity = ENTITY_CACHE.get(qid)
+                    if not entity:
+                        print(f" ... ! Error fetching entity")
+                        error_count += 1
+                        continue
+                    new_content = rendered[page_name]
+                    summary = "v25: Standardize page format"
+                    used = sorted(referenced_qids(entity))
+                    fingerprint = {'revids': {qid: entity.lastrevid,
+                                              **{r: ref_revid(r) for r in used}}}
+                fingerprint['render'] = RENDER_VERSION
+
+                if new_content == texts[page_name]:
+                    print(f" ... = unchanged")
+                    unchanged_count += 1
+                else:
+                    site.pages[page_name].edit(new_content, summary=summary)
+                    if target_qid:
+                        print(f" ... → {target_qid} (redirect)")
+                        redirect_count += 1
+                    else:
+                        print(f" ... ✓ Edited")
+                        processed_count += 1
+                    # Rate limiting
+                    time.sleep(1.5)
+                append_fingerprint(args.state_file, page_name, fingerprint)
+
+            except Exception as e:
+                print(f"\n   ! ERROR: {e}")
+                error_count += 1
+                time.sleep(1)
+
+        # Shrine entities are only needed for their own page (unless they came
+        # from the entity store, which stays loaded for the whole run). Pages
+        # rendered up front may reference the shrines of earlier chunks, and
+        # ref_revid() reads those for their fingerprints, so they stay until the end.
+        if not render_up_front:
+            for _, qid in chunk:
+                if qid not in stored:
+                    ENTITY_CACHE.pop(qid, None)
+
+    if render_up_front:
+        for _, qid in todo:
+            if qid not in stored:
+                ENTITY_CACHE.pop(qid, None)
 
     print(f"\n{'=' * 60}")
     print(f"Summary:")
-    print(f"  Total pages: {len(members)}")
+    print(f"  Total pages: {len(texts)}")
+    print(f"  Regenerated: {len(todo)}")
     print(f"  Processed (full pages): {processed_count}")
     print(f"  Redirects created: {redirect_count}")
+    print(f"  Unchanged (not saved): {unchanged_count}")
     print(f"  Errors: {error_count}")
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+ingest_wikidata_dump.py
+=======================
+Builds a local entity store for the shikinaisha page generator from a
+Wikidata JSON dump, so a full rebuild does not need thousands of live
+wbgetentities calls.
+
+The dump (latest-all.json.gz / .bz2, or uncompressed; one entity per
+line inside a JSON array) is streamed line by line, twice, with constant
+memory apart from the entities kept:
+
+  pass 1  shrine items: QIDs listed in --qids-file and/or items whose P31
+          is one of --instance-of. Their referenced items (claims,
+          qualifiers, references — P361, P31, P825, P248, ...) are noted,
+          and every property's English label is kept.
+  pass 2  the referenced items.
+
+Kept entities are slimmed to wikidata_entity.Entity records: en/ja
+labels, sitelink titles, and claims reduced to their values, qualifiers
+and reference values; referenced items keep only the claims the generator
+reads from them (REF_CLAIMS). The store is gzip JSONL, one record per line:
+
+    {"id": "P31", "label": "instance of"}
+    {"id": "Q123", "lastrevid": ..., "labels": {...}, "sitelinks": {...}, "claims": {...}}
+
+The generator loads it with --entity-store (wikidata_entity.load_entity_store).
+
+Usage:
+    python shinto_miraheze/ingest_wikidata_dump.py latest-all.json.gz --qids-file shrine_qids.txt
+    python shinto_miraheze/ingest_wikidata_dump.py latest-all.json.bz2 --instance-of Q123 --out store.jsonl.gz
+"""
+
+import argparse
+import bz2
+import gzip
+import json
+import os
+import sys
+
+from generate_shikinaisha_pages_v25_with_redirects import REF_CLAIMS
+from wikidata_entity import Entity, referenced_qids
+
+DEFAULT_STORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shikinaisha_entities.jsonl.gz")
+PROGRESS_EVERY = 1_000_000  # dump lines between progress messages
+
+
+def open_dump(path):
+    """Open a dump for text reading, decompressing by extension."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def iter_dump_entities(path):
+    """Yield each entity dict from a Wikidata JSON dump, one line at a time."""
+    with open_dump(path) as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip().rstrip(",")
+            if not line or line in ("[", "]"):
+                continue
+            if n % PROGRESS_EVERY == 0:
+                print(f"  ... {n:,} lines")
+            yield json.loads(line)
+
+
+def _instance_of(entity):
+    return {
+        c.get("mainsnak", {}).get("datavalue", {}).get("value", {}).get("id")
+        for c in entity.get("claims", {}).get("P31", [])
+        if isinstance(c.get("mainsnak", {}).get("datavalue", {}).get("value"), dict)
+    }
+
+
+def ingest(dump_path, seeds=(), instance_of=()):
+    """Two streaming passes over the dump. Returns (entities by id, property labels)."""
+    seeds, instance_of = set(seeds), set(instance_of)
+    entities, property_labels, refs = {}, {}, set()
+
+    print("Pass 1: shrine items and property labels")
+    for entity in iter_dump_entities(dump_path):
+        eid = entity.get("id", "")
+        if eid.startswith("P"):
+            label = entity.get("labels", {}).get("en", {}).get("value")
+            if label:
+                property_labels[eid] = label
+            continue
+        if eid in seeds or (instance_of and _instance_of(entity) & instance_of):
+            entities[eid] = Entity.from_json(entity)
+            refs |= referenced_qids(entities[eid])
+    print(f"  {len(entities)} shrine item(s), {len(refs)} referenced item(s), {len(property_labels)} properties")
+
+    refs -= set(entities)
+    if refs:
+        print("Pass 2: referenced items")
+        for entity in iter_dump_entities(dump_path):
+            if entity.get("id") in refs:
+                entities[entity["id"]] = Entity.from_json(entity, claims=REF_CLAIMS)
+    missing = refs - set(entities)
+    if missing:
+        print(f"  {len(missing)} referenced item(s) not in the dump (deleted or redirected)")
+    return entities, property_labels
+
+
+def write_store(path, entities, property_labels):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for eid in sorted(property_labels, key=lambda p: int(p[1:])):
+            f.write(json.dumps({"id": eid, "label": property_labels[eid]}, ensure_ascii=False) + "\n")
+        for eid in sorted(entities, key=lambda q: int(q[1:])):
+            f.write(json.dumps(entities[eid].to_record(), ensure_ascii=False) + "\n")
+
+
+def main():
+    sys.stdout.reconfigure(encoding="utf-8")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dump", help="Path to a Wikidata JSON dump (.json, .json.gz or .json.bz2).")
+    parser.add_argument("--qids-file", help="File of shrine QIDs to keep, one per line.")
+    parser.add_argument("--instance-of", action="append", default=[],
+                        help="Also keep items whose P31 is this QID (repeatable).")
+    parser.add_argument("--out", default=DEFAULT_STORE, help="Path for the gzip JSONL entity store.")
+    args = parser.parse_args()
+
+    seeds = set()
+    if args.qids_file:
+        with open(args.qids_file, "r", encoding="utf-8") as f:
+            seeds = {line.strip().upper() for line in f if line.strip() and not line.startswith("#")}
+    if not seeds and not args.instance_of:
+        parser.error("give --qids-file and/or --instance-of")
+
+    entities, property_labels = ingest(args.dump, seeds, args.instance_of)
+    write_store(args.out, entities, property_labels)
+    print(f"Wrote {len(entities)} entities and {len(property_labels)} property labels to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
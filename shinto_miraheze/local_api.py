@@ -0,0 +1,1172 @@
+#!/usr/bin/env python3
+"""
+local_api.py
+============
+A local stand-in for the MediaWiki Action API and the Wikidata API, so the
+scripts can be run and measured without touching shinto.miraheze.org.
+
+LocalWiki keeps one wiki in memory (pages with their revisions, the
+category / template / redirect link tables, and Wikidata entities) and
+answers the subset of api.php the scripts use:
+
+- action=login; query meta=siteinfo|userinfo|tokens
+- query list=allpages|categorymembers|querypage|embeddedin|recentchanges|search
+- query generator=allpages|categorymembers|allredirects|embeddedin
+- query prop=info|revisions|categories|categoryinfo|transcludedin|redirects|templates|pageprops
+- action=edit|delete|move|import
+- action=wbgetentities (on www.wikidata.org)
+- index.php?title=Special:Export (for reimport_from_enwiki.py)
+
+LocalAPIServer serves one LocalWiki per host at
+http://127.0.0.1:PORT/<host>/w/api.php. It can add latency to every
+request, cap requests per second (HTTP 429 with Retry-After) and cap writes
+per minute (API error "ratelimited"). It counts requests, bytes and writes
+per host and API module.
+
+route() sends every request a process makes through requests or urllib to
+the server instead, so the scripts run against it unchanged:
+
+    python shinto_miraheze/local_api.py serve --fixture wiki.json --port 8765
+    python shinto_miraheze/local_api.py run --api http://127.0.0.1:8765 \\
+        shinto_miraheze/create_wanted_categories.py --apply --run-tag test
+
+A fixture is JSON keyed by host:
+
+    {"shinto.miraheze.org": {"pages": {"Foo": "text", "Bar": {"text": "...", "pageprops": {...}}}},
+     "www.wikidata.org": {"entities": {"Q1": {...wbgetentities entity...}}}}
+
+Special-page reports (Wantedcategories, Unusedcategories, ...) are computed
+when first queried and then cached until refresh_special_pages(), like the
+cached querypage tables on the real wiki. This is not a full MediaWiki: it
+has no parser or permissions, and it normalizes titles only as far as the
+scripts need.
+
+See benchmark_cleanup_loop.py for the end-to-end runner.
+"""
+
+import argparse
+import email.parser
+import gzip
+import hashlib
+import json
+import os
+import re
+import runpy
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+import xml.etree.ElementTree as ET
+from collections import Counter, defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape, quoteattr
+
+GENERATOR = "MediaWiki 1.43.0"
+CSRF_TOKEN = "0123456789abcdef0123456789abcdef+\\"
+LOGIN_TOKEN = "fedcba9876543210fedcba9876543210+\\"
+LIMIT = 500  # "max" for users without apihighlimits
+HIGH_LIMIT = 5000
+TITLES_LIMIT = 50
+HIGH_TITLES_LIMIT = 500
+
+NAMESPACES = {
+    0: "", 1: "Talk", 2: "User", 3: "User talk", 4: "Project", 5: "Project talk",
+    6: "File", 7: "File talk", 8: "MediaWiki", 9: "MediaWiki talk",
+    10: "Template", 11: "Template talk", 12: "Help", 13: "Help talk",
+    14: "Category", 15: "Category talk", 828: "Module", 829: "Module talk",
+}
+NAMESPACE_ALIASES = {"Image": 6, "Image talk": 7}
+SPECIAL_PAGES = ("Wantedcategories", "Uncategorizedcategories", "Unusedcategories",
+                 "Unusedtemplates", "OrphanedTalkPages", "DoubleRedirects")
+
+REDIRECT_RE = re.compile(r"^\s*#REDIRECT\s*:?\s*\[\[([^\]|]+)(?:\|[^\]]*)?\]\]", re.IGNORECASE)
+CATEGORY_RE = re.compile(r"\[\[\s*Category\s*:\s*([^\]|\[{}]+?)\s*(?:\|[^\]]*)?\]\]", re.IGNORECASE)
+TEMPLATE_RE = re.compile(r"\{\{\s*(#invoke\s*:)?\s*([^{}|<>\[\]\n]+?)\s*(?:\||\}\})", re.IGNORECASE)
+INVALID_TITLE_RE = re.compile(r"[\[\]{}|<>\n]")
+
+
+class APIError(Exception):
+    def __init__(self, code, info):
+        super().__init__(f"{code}: {info}")
+        self.code = code
+        self.info = info
+
+
+def _now():
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+def _flag(fv2):
+    return True if fv2 else ""
+
+
+def _split(value):
+    return [v for v in str(value or "").split("|") if v != ""]
+
+
+def _sha1_base36(text):
+    n = int(hashlib.sha1(text.encode("utf-8")).hexdigest(), 16)
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    out = ""
+    while n:
+        n, r = divmod(n, 36)
+        out = digits[r] + out
+    return out.rjust(31, "0")
+
+
+class LocalWiki:
+    """One in-memory wiki: pages, revisions, link tables and Wikidata entities."""
+
+    def __init__(self, host, sitename=None, username="EmmaBot", high_limits=False):
+        self.host = host
+        self.sitename = sitename or host.split(".")[0].capitalize()
+        self.username = username.split("@")[0]
+        self.limit = HIGH_LIMIT if high_limits else LIMIT
+        self.titles_limit = HIGH_TITLES_LIMIT if high_limits else TITLES_LIMIT
+        self.pages = {}  # title -> page dict
+        self.by_id = {}
+        self.entities = {}  # qid -> Wikidata entity JSON
+        self.members = defaultdict(set)  # category name -> member titles
+        self.transclusions = defaultdict(set)  # template title -> transcluding titles
+        self.redirects = defaultdict(set)  # target title -> redirect titles
+        self.member_since = {}  # (category name, member title) -> when the page was added
+        self.changes = []  # recentchanges rows, oldest first
+        self.special_pages = {}
+        self._next_pageid = 1
+        self._next_revid = 1
+        self._next_logid = 1
+
+    # ─── Titles and link tables ─────────────────────────────
+
+    def normalize(self, raw):
+        """Return (ns, full title) for a title as given, or None if it is invalid."""
+        title = " ".join(str(raw).replace("_", " ").split()).lstrip(":").strip()
+        if not title or INVALID_TITLE_RE.search(title) or "#" in title:
+            return None
+        ns = 0
+        if ":" in title:
+            prefix, rest = title.split(":", 1)
+            key = prefix.strip().lower()
+            names = {name.lower(): i for i, name in NAMESPACES.items() if name}
+            names[self.sitename.lower()] = 4
+            names[f"{self.sitename} talk".lower()] = 5
+            names.update((alias.lower(), i) for alias, i in NAMESPACE_ALIASES.items())
+            if key in names:
+                ns = names[key]
+                title = rest.strip()
+                if not title:
+                    return None
+        title = title[0].upper() + title[1:]
+        return ns, (f"{self.namespace_name(ns)}:{title}" if ns else title)
+
+    def namespace_name(self, ns):
+        if ns == 4:
+            return self.sitename
+        if ns == 5:
+            return f"{self.sitename} talk"
+        return NAMESPACES[ns]
+
+    def parse_links(self, text):
+        """Return (redirect (title, fragment) or None, category names, template titles)."""
+        m = REDIRECT_RE.match(text)
+        if m:
+            target, _, fragment = m.group(1).partition("#")
+            norm = self.normalize(target)
+            return ((norm[1], fragment.strip()) if norm else None), [], []
+        categories = []
+        for m in CATEGORY_RE.finditer(text):
+            norm = self.normalize(f"Category:{m.group(1)}")
+            if norm and norm[0] == 14 and norm[1] not in categories:
+                categories.append(norm[1])
+        templates = []
+        for m in TEMPLATE_RE.finditer(text):
+            name = m.group(2).strip()
+            if m.group(1):
+                name = f"Module:{name}"
+            elif name.startswith("#") or name.isupper():
+                continue  # parser function or magic word
+            elif ":" in name and not name.startswith(":"):
+                norm = self.normalize(name)
+                if not norm or norm[0] == 0:
+                    continue  # {{DEFAULTSORT:...}} and friends
+                name = norm[1]
+            elif name.startswith(":"):
+                name = name[1:]
+            else:
+                name = f"Template:{name}"
+            norm = self.normalize(name)
+            if norm and norm[1] not in templates:
+                templates.append(norm[1])
+        return None, categories, templates
+
+    def _unlink(self, page):
+        if page["redirect"]:
+            self.redirects[page["redirect"][0]].discard(page["title"])
+        for cat in page["categories"]:
+            self.members[cat].discard(page["title"])
+        for tpl in page["templates"]:
+            self.transclusions[tpl].discard(page["title"])
+
+    def _link(self, page, previous=()):
+        page["redirect"], page["categories"], page["templates"] = self.parse_links(page["revisions"][-1]["text"])
+        if page["redirect"]:
+            self.redirects[page["redirect"][0]].add(page["title"])
+        for cat in page["categories"]:
+            self.members[cat].add(page["title"])
+            if cat not in previous:
+                self.member_since[(cat, page["title"])] = _now()
+        for tpl in page["templates"]:
+            self.transclusions[tpl].add(page["title"])
+
+    # ─── Writes ─────────────────────────────────────────────
+
+    def save(self, title, text, summary="", user=None, pageprops=None):
+        """Add a revision to a page, creating it if needed. Returns (page, old revid or None)."""
+        norm = self.normalize(title)
+        if norm is None:
+            raise APIError("invalidtitle", f'Bad title "{title}".')
+        ns, title = norm
+        page = self.pages.get(title)
+        old = None
+        previous = ()
+        if page is None:
+            page = {"pageid": self._next_pageid, "ns": ns, "title": title, "revisions": [],
+                    "redirect": None, "categories": [], "templates": [], "pageprops": {}}
+            self._next_pageid += 1
+            self.pages[title] = page
+            self.by_id[page["pageid"]] = page
+        else:
+            old = page["revisions"][-1]["revid"]
+            previous = page["categories"]
+            self._unlink(page)
+        page["revisions"].append({
+            "revid": self._next_revid,
+            "parentid": old or 0,
+            "timestamp": _now(),
+            "user": user or self.username,
+            "comment": summary,
+            "text": text,
+            "sha1": hashlib.sha1(text.encode("utf-8")).hexdigest(),
+            "size": len(text.encode("utf-8")),
+        })
+        self._next_revid += 1
+        if pageprops:
+            page["pageprops"].update(pageprops)
+        self._link(page, previous)
+        self.changes.append({"type": "edit" if old else "new", "ns": ns, "title": title,
+                             "revid": page["revisions"][-1]["revid"], "timestamp": _now()})
+        return page, old
+
+    def delete(self, title):
+        norm = self.normalize(title)
+        page = self.pages.pop(norm[1], None) if norm else None
+        if page is None:
+            raise APIError("missingtitle", "The page you specified doesn't exist.")
+        self._unlink(page)
+        del self.by_id[page["pageid"]]
+        self.changes.append({"type": "log", "logtype": "delete", "ns": page["ns"], "title": page["title"],
+                             "timestamp": _now()})
+        return page
+
+    def move(self, src, dst, summary="", redirect=True):
+        snorm, dnorm = self.normalize(src), self.normalize(dst)
+        if snorm is None or dnorm is None:
+            raise APIError("invalidtitle", f'Bad title "{src if snorm is None else dst}".')
+        if snorm[1] not in self.pages:
+            raise APIError("missingtitle", "The page you specified doesn't exist.")
+        if snorm[1] == dnorm[1]:
+            raise APIError("selfmove", "The title is the same; cannot move a page over itself.")
+        if dnorm[1] in self.pages:
+            raise APIError("articleexists", "A page of that name already exists, or the name you have chosen is not valid.")
+        page = self.pages.pop(snorm[1])
+        self._unlink(page)
+        page["ns"], page["title"] = dnorm
+        self.pages[page["title"]] = page
+        self._link(page)
+        self.changes.append({"type": "log", "logtype": "move", "ns": snorm[0], "title": snorm[1],
+                             "timestamp": _now()})
+        if redirect:
+            self.save(snorm[1], f"#REDIRECT [[{page['title']}]]", summary=summary)
+        return page
+
+    def import_xml(self, xml_bytes, interwiki_prefix="", summary=""):
+        """Import a Special:Export file. Returns [{"ns", "title", "revisions"}]."""
+        root = ET.fromstring(xml_bytes)
+        result = []
+        for page_el in root:
+            if page_el.tag.rsplit("}", 1)[-1] != "page":
+                continue
+            fields = {el.tag.rsplit("}", 1)[-1]: el for el in page_el}
+            title = (fields["title"].text or "").strip()
+            revisions = 0
+            for rev_el in page_el:
+                if rev_el.tag.rsplit("}", 1)[-1] != "revision":
+                    continue
+                rev = {el.tag.rsplit("}", 1)[-1]: el for el in rev_el}
+                text = rev["text"].text or "" if "text" in rev else ""
+                comment = rev["comment"].text or "" if "comment" in rev else summary
+                user = f"{interwiki_prefix}>{self.username}" if interwiki_prefix else None
+                page, _ = self.save(title, text, summary=comment, user=user)
+                revisions += 1
+            if revisions:
+                result.append({"ns": page["ns"], "title": page["title"], "revisions": revisions})
+        return result
+
+    # ─── Special pages ──────────────────────────────────────
+
+    def refresh_special_pages(self):
+        self.special_pages = {}
+
+    def special_page(self, name):
+        if name not in SPECIAL_PAGES:
+            raise APIError("badvalue", f'Unrecognized value for parameter "qppage": {name}.')
+        if name not in self.special_pages:
+            self.special_pages[name] = self._compute_special_page(name)
+        return self.special_pages[name]
+
+    def _compute_special_page(self, name):
+        if name == "Wantedcategories":
+            rows = [(cat, len(titles)) for cat, titles in self.members.items() if titles and cat not in self.pages]
+            return [(14, cat, count) for cat, count in sorted(rows, key=lambda r: (-r[1], r[0]))]
+        pages = sorted(self.pages.values(), key=lambda p: p["title"])
+        if name == "Uncategorizedcategories":
+            return [(14, p["title"], 0) for p in pages if p["ns"] == 14 and not p["redirect"] and not p["categories"]]
+        if name == "Unusedcategories":
+            return [(14, p["title"], 0) for p in pages if p["ns"] == 14 and not self.members.get(p["title"])]
+        if name == "DoubleRedirects":
+            return [(p["ns"], p["title"], 0) for p in pages
+                    if p["redirect"] and (self.pages.get(p["redirect"][0]) or {}).get("redirect")]
+        if name == "Unusedtemplates":
+            return [(10, p["title"], 0) for p in pages
+                    if p["ns"] == 10 and not p["redirect"] and not self.transclusions.get(p["title"])]
+        return [(p["ns"], p["title"], 0) for p in pages
+                if p["ns"] % 2 == 1 and p["ns"] != 3 and self._subject(p["ns"], p["title"]) not in self.pages]
+
+    def _subject(self, ns, title):
+        bare = title.split(":", 1)[1] if ns else title
+        subject_ns = ns - 1
+        return f"{self.namespace_name(subject_ns)}:{bare}" if subject_ns else bare
+
+    def _talk(self, ns, title):
+        bare = title.split(":", 1)[1] if ns else title
+        return f"{self.namespace_name(ns + 1)}:{bare}"
+
+    # ─── Queries ────────────────────────────────────────────
+
+    def _limit(self, value, default=10):
+        if value in (None, ""):
+            return default
+        if value == "max":
+            return self.limit
+        return max(1, min(int(value), self.limit))
+
+    def _chunk(self, items, key, params, prefix, cont):
+        """Return one continuation chunk of sorted items, continuing by key (title-based, like allpages)."""
+        limit = self._limit(params.get(prefix + "limit"))
+        start = params.get(prefix + "continue")
+        if start:
+            items = [item for item in items if key(item) >= start]
+        if len(items) > limit:
+            cont[prefix + "continue"] = key(items[limit])
+        return items[:limit]
+
+    def _namespaces(self, value):
+        return {int(n) for n in _split(value)} if value not in (None, "") else None
+
+    def _allpages(self, params, prefix):
+        ns = int(params.get(prefix + "namespace", 0))
+        filt = params.get(prefix + "filterredir", "all")
+        head = self.namespace_name(ns) + ":" if ns else ""
+        start = head + params[prefix + "from"] if params.get(prefix + "from") else ""
+        wanted = head + params.get(prefix + "prefix", "")
+        titles = []
+        for title, page in self.pages.items():
+            if page["ns"] != ns or not title.startswith(wanted) or title < start:
+                continue
+            if filt == "redirects" and not page["redirect"] or filt == "nonredirects" and page["redirect"]:
+                continue
+            titles.append(title)
+        return sorted(titles)
+
+    def _categorymembers(self, params, prefix):
+        norm = self.normalize(params.get(prefix + "title", ""))
+        if norm is None or norm[0] != 14:
+            raise APIError("invalidcategory", "The category name you entered is not valid.")
+        namespaces = self._namespaces(params.get(prefix + "namespace"))
+        types = set(_split(params.get(prefix + "type", "page|subcat|file")))
+        titles = []
+        for title in self.members.get(norm[1], ()):
+            ns = self.pages[title]["ns"]
+            kind = "subcat" if ns == 14 else "file" if ns == 6 else "page"
+            if kind in types and (namespaces is None or ns in namespaces):
+                titles.append(title)
+        return sorted(titles, key=lambda t: (t.split(":", 1)[-1] if self.pages[t]["ns"] else t, t))
+
+    def _members_by_time(self, params, out):
+        """list=categorymembers with cmsort=timestamp, one chunk without continuation."""
+        newest_first = params.get("cmdir") in ("desc", "older")
+        rows = sorted(((self.member_since.get((self.normalize(params["cmtitle"])[1], t), ""), t)
+                       for t in self._categorymembers(params, "cm")), reverse=newest_first)
+        limit = self._limit(params.get("cmlimit"))
+        with_time = "timestamp" in _split(params.get("cmprop", "ids|title"))
+        out["categorymembers"] = [{**self._entry(t), **({"timestamp": ts} if with_time else {})}
+                                  for ts, t in rows[:limit]]
+
+    def _recentchanges(self, params, out):
+        """list=recentchanges, one chunk without continuation."""
+        namespaces = self._namespaces(params.get("rcnamespace"))
+        types = set(_split(params.get("rctype", "edit|new|log")))
+        newest_first = params.get("rcdir", "older") == "older"
+        low, high = params.get("rcend", ""), params.get("rcstart", "9999")
+        if not newest_first:
+            low, high = params.get("rcstart", ""), params.get("rcend", "9999")
+        rows = [dict(c) for c in self.changes if c["type"] in types and low <= c["timestamp"] <= high
+                and (namespaces is None or c["ns"] in namespaces)]
+        if newest_first:
+            rows.reverse()
+        out["recentchanges"] = rows[:self._limit(params.get("rclimit"))]
+
+    def _search(self, params, out, cont):
+        """list=search over the current text: insource:"..." phrases and plain words, all required."""
+        query = params.get("srsearch", "")
+        needles = re.findall(r'insource:"([^"]+)"', query)
+        needles += [w for w in re.sub(r'insource:"[^"]+"', " ", query).split() if w]
+        namespaces = self._namespaces(params.get("srnamespace")) or {0}
+        hits = sorted(t for t, p in self.pages.items() if p["ns"] in namespaces and not p["redirect"]
+                      and all(n in p["revisions"][-1]["text"] for n in needles))
+        offset = int(params.get("sroffset") or 0)
+        limit = self._limit(params.get("srlimit"))
+        if offset + limit < len(hits):
+            cont["sroffset"] = offset + limit
+        out["searchinfo"] = {"totalhits": len(hits)}
+        out["search"] = [self._entry(t) for t in hits[offset:offset + limit]]
+
+    def _embeddedin(self, params, prefix):
+        norm = self.normalize(params.get(prefix + "title", ""))
+        if norm is None:
+            raise APIError("invalidtitle", "Bad title.")
+        namespaces = self._namespaces(params.get(prefix + "namespace"))
+        return sorted(t for t in self.transclusions.get(norm[1], ())
+                      if namespaces is None or self.pages[t]["ns"] in namespaces)
+
+    def _allredirects(self, params, prefix):
+        ns = int(params.get(prefix + "namespace", 0))
+        return sorted(t for t, sources in self.redirects.items()
+                      if sources and (self.normalize(t) or (None,))[0] == ns)
+
+    def _entry(self, title):
+        page = self.pages.get(title)
+        norm = self.normalize(title)
+        entry = {"ns": norm[0] if norm else 0, "title": title}
+        if page:
+            entry = {"pageid": page["pageid"], **entry}
+        return entry
+
+    def query(self, params, fv2):
+        out, cont = {}, {}
+        if params.get("meta"):
+            self._meta(params, fv2, out)
+        for name in _split(params.get("list")):
+            if name == "querypage":
+                page = params.get("qppage", "")
+                rows = self.special_page(page)
+                limit = self._limit(params.get("qplimit"))
+                offset = int(params.get("qpoffset") or 0)
+                if offset + limit < len(rows):
+                    cont["qpoffset"] = offset + limit
+                results = [{"value": str(v), "ns": ns, "title": t} for ns, t, v in rows[offset:offset + limit]]
+                out["querypage"] = {"name": page, "results": results}
+                continue
+            if name == "recentchanges":
+                self._recentchanges(params, out)
+                continue
+            if name == "search":
+                self._search(params, out, cont)
+                continue
+            if name == "categorymembers" and params.get("cmsort") == "timestamp":
+                self._members_by_time(params, out)
+                continue
+            lister = {"allpages": ("ap", self._allpages), "categorymembers": ("cm", self._categorymembers),
+                      "embeddedin": ("ei", self._embeddedin)}.get(name)
+            if lister is None:
+                raise APIError("badvalue", f'Unrecognized value for parameter "list": {name}.')
+            prefix, fn = lister
+            titles = self._chunk(fn(params, prefix), lambda t: t, params, prefix, cont)
+            out[name] = [self._entry(t) for t in titles]
+
+        titles = None
+        if params.get("generator"):
+            name = params["generator"]
+            gen = {"allpages": ("gap", self._allpages), "categorymembers": ("gcm", self._categorymembers),
+                   "embeddedin": ("gei", self._embeddedin), "allredirects": ("gar", self._allredirects)}.get(name)
+            if gen is None:
+                raise APIError("badvalue", f'Unrecognized value for parameter "generator": {name}.')
+            prefix, fn = gen
+            titles = self._chunk(fn(params, prefix), lambda t: t, params, prefix, cont)
+        elif "titles" in params or "pageids" in params:
+            titles = self._resolve_titles(params, fv2, out)
+        if titles is not None:
+            pages = [self._page_json(t, params, fv2) for t in titles]
+            if fv2:
+                out["pages"] = pages
+            else:
+                missing = 0
+                out["pages"] = {}
+                for page in pages:
+                    if "pageid" in page:
+                        out["pages"][str(page["pageid"])] = page
+                    else:
+                        missing -= 1
+                        out["pages"][str(missing)] = page
+            if not pages:
+                del out["pages"]
+
+        result = {"batchcomplete": _flag(fv2)}
+        if cont:
+            result["continue"] = {**cont, "continue": "-||" if not params.get("generator") else f"{next(iter(cont))}||"}
+        if out:
+            result["query"] = out
+        return result
+
+    def _resolve_titles(self, params, fv2, out):
+        raw = _split(params.get("titles")) if "titles" in params else []
+        if len(raw) > self.titles_limit or len(_split(params.get("pageids"))) > self.titles_limit:
+            raise APIError("toomanyvalues",
+                           f'Too many values supplied for parameter "titles". The limit is {self.titles_limit}.')
+        titles, normalized = [], []
+        for t in raw:
+            norm = self.normalize(t)
+            if norm is None:
+                continue
+            if norm[1] != t:
+                normalized.append({"from": t, "to": norm[1]})
+            titles.append(norm[1])
+        for pid in _split(params.get("pageids")):
+            page = self.by_id.get(int(pid))
+            if page:
+                titles.append(page["title"])
+        if normalized:
+            out["normalized"] = normalized
+        if "redirects" in params and params["redirects"] not in ("0", "false"):
+            redirects, resolved = [], []
+            for t in titles:
+                page = self.pages.get(t)
+                if page and page["redirect"]:
+                    target, fragment = page["redirect"]
+                    entry = {"from": t, "to": target}
+                    if fragment:
+                        entry["tofragment"] = fragment
+                    redirects.append(entry)
+                    t = target
+                resolved.append(t)
+            titles = resolved
+            if redirects:
+                out["redirects"] = redirects
+        return list(dict.fromkeys(titles))
+
+    def _page_json(self, title, params, fv2):
+        page = self.pages.get(title)
+        norm = self.normalize(title)
+        ns = norm[0] if norm else 0
+        props = set(_split(params.get("prop")))
+        if page is None:
+            data = {"ns": ns, "title": title, "missing": _flag(fv2)}
+        else:
+            data = {"pageid": page["pageid"], "ns": ns, "title": title}
+        inprop = set(_split(params.get("inprop")))
+        if "info" in props:
+            if page is not None:
+                rev = page["revisions"][-1]
+                data.update(contentmodel="wikitext", pagelanguage="en", pagelanguagehtmlcode="en",
+                            pagelanguagedir="ltr", touched=rev["timestamp"], lastrevid=rev["revid"],
+                            length=rev["size"])
+                if page["redirect"]:
+                    data["redirect"] = _flag(fv2)
+                if len(page["revisions"]) == 1:
+                    data["new"] = _flag(fv2)
+            else:
+                data.update(contentmodel="wikitext", pagelanguage="en", pagelanguagehtmlcode="en",
+                            pagelanguagedir="ltr")
+            if "protection" in inprop:
+                data["protection"] = []
+                data["restrictiontypes"] = ["edit", "move"] if page is not None else ["create"]
+            if "subjectid" in inprop and ns % 2 == 1:
+                subject = self.pages.get(self._subject(ns, title))
+                if subject:
+                    data["subjectid"] = subject["pageid"]
+            if "talkid" in inprop and ns % 2 == 0:
+                talk = self.pages.get(self._talk(ns, title))
+                if talk:
+                    data["talkid"] = talk["pageid"]
+        if page is not None:
+            if "revisions" in props:
+                data["revisions"] = self._revisions(page, params, fv2)
+            if "categories" in props and page["categories"]:
+                wanted = None
+                if params.get("clcategories"):
+                    wanted = {(self.normalize(c) or (0, ""))[1] for c in _split(params["clcategories"])}
+                cats = [c for c in sorted(page["categories"]) if wanted is None or c in wanted]
+                if cats:
+                    data["categories"] = [{"ns": 14, "title": c} for c in cats]
+            if "templates" in props and page["templates"]:
+                data["templates"] = [{"ns": self.normalize(t)[0], "title": t} for t in sorted(page["templates"])]
+            if "transcludedin" in props and self.transclusions.get(title):
+                data["transcludedin"] = [self._entry(t) for t in sorted(self.transclusions[title])]
+            if "pageprops" in props and page["pageprops"]:
+                data["pageprops"] = dict(page["pageprops"])
+        if "redirects" in props and self.redirects.get(title):
+            entries = []
+            for source in sorted(self.redirects[title]):
+                entry = self._entry(source)
+                fragment = self.pages[source]["redirect"][1]
+                if fragment:
+                    entry["fragment"] = fragment
+                entries.append(entry)
+            data["redirects"] = entries
+        if "categoryinfo" in props and ns == 14 and (page is not None or self.members.get(title)):
+            members = [self.pages[t]["ns"] for t in self.members.get(title, ())]
+            subcats = sum(1 for n in members if n == 14)
+            files = sum(1 for n in members if n == 6)
+            data["categoryinfo"] = {"size": len(members), "pages": len(members) - subcats - files,
+                                    "files": files, "subcats": subcats}
+        return data
+
+    def _revisions(self, page, params, fv2):
+        rvprop = set(_split(params.get("rvprop", "ids|timestamp|flags|comment|user")))
+        revs = page["revisions"]
+        if "rvlimit" in params:
+            revs = revs[::-1] if params.get("rvdir", "older") == "older" else revs
+            revs = revs[: self._limit(params.get("rvlimit"), 1)]
+        else:
+            revs = revs[-1:]
+        out = []
+        for rev in revs:
+            entry = {}
+            if "ids" in rvprop:
+                entry.update(revid=rev["revid"], parentid=rev["parentid"])
+            for key in ("timestamp", "user", "comment", "sha1", "size"):
+                if key in rvprop:
+                    entry[key] = rev[key]
+            if "content" in rvprop:
+                if params.get("rvslots"):
+                    key = "content" if fv2 else "*"
+                    entry["slots"] = {"main": {"contentmodel": "wikitext", "contentformat": "text/x-wiki",
+                                               key: rev["text"]}}
+                else:
+                    entry.update(contentformat="text/x-wiki", contentmodel="wikitext")
+                    entry["content" if fv2 else "*"] = rev["text"]
+            out.append(entry)
+        return out
+
+    def _meta(self, params, fv2, out):
+        metas = set(_split(params["meta"]))
+        if "siteinfo" in metas:
+            siprop = set(_split(params.get("siprop", "general")))
+            if "general" in siprop:
+                out["general"] = {"mainpage": "Main Page", "base": f"https://{self.host}/wiki/Main_Page",
+                                  "sitename": self.sitename, "generator": GENERATOR, "case": "first-letter",
+                                  "lang": "en", "server": f"https://{self.host}", "articlepath": "/wiki/$1",
+                                  "scriptpath": "/w"}
+            if "namespaces" in siprop:
+                name_key = "name" if fv2 else "*"
+                out["namespaces"] = {}
+                for ns in [-2, -1] + sorted(NAMESPACES):
+                    name = {-2: "Media", -1: "Special"}.get(ns) or self.namespace_name(ns)
+                    entry = {"id": ns, "case": "first-letter", name_key: name}
+                    if ns:
+                        entry["canonical"] = NAMESPACES.get(ns, name) if ns not in (4, 5) else name
+                    if ns == 0:
+                        entry["content"] = _flag(fv2)
+                    out["namespaces"][str(ns)] = entry
+            if "statistics" in siprop:
+                content = [p for p in self.pages.values() if p["ns"] == 0 and not p["redirect"]]
+                out["statistics"] = {"pages": len(self.pages), "articles": len(content), "edits": self._next_revid - 1,
+                                     "images": 0, "users": 1, "activeusers": 1, "admins": 1, "jobs": 0}
+            if "namespacealiases" in siprop:
+                key = "alias" if fv2 else "*"
+                out["namespacealiases"] = [{"id": ns, key: alias} for alias, ns in NAMESPACE_ALIASES.items()]
+        if "userinfo" in metas:
+            out["userinfo"] = {"id": 1, "name": self.username,
+                               "groups": ["*", "user", "autoconfirmed", "bot", "sysop"],
+                               "rights": ["read", "edit", "createpage", "move", "delete", "import", "upload",
+                                          "bot", "noratelimit"] + (["apihighlimits"] if self.limit == HIGH_LIMIT else [])}
+        if "tokens" in metas:
+            types = set(_split(params.get("type", "csrf")))
+            out["tokens"] = {}
+            if "csrf" in types:
+                out["tokens"]["csrftoken"] = CSRF_TOKEN
+            if "login" in types:
+                out["tokens"]["logintoken"] = LOGIN_TOKEN
+
+    def wbgetentities(self, params):
+        ids = _split(params.get("ids"))
+        if len(ids) > self.titles_limit:
+            raise APIError("toomanyvalues",
+                           f'Too many values supplied for parameter "ids". The limit is {self.titles_limit}.')
+        props = set(_split(params.get("props", "info|sitelinks|aliases|labels|descriptions|claims|datatype")))
+        languages = set(_split(params.get("languages"))) or None
+        sites = set(_split(params.get("sitefilter"))) or None
+        entities = {}
+        for qid in ids:
+            entity = self.entities.get(qid.upper())
+            if entity is None:
+                entities[qid] = {"id": qid, "missing": ""}
+                continue
+            data = {"type": entity.get("type", "item"), "id": entity["id"]}
+            if "info" in props:
+                for key in ("pageid", "ns", "title", "lastrevid", "modified"):
+                    if key in entity:
+                        data[key] = entity[key]
+            for key in ("labels", "descriptions", "aliases"):
+                if key in props:
+                    data[key] = {lang: v for lang, v in entity.get(key, {}).items()
+                                 if languages is None or lang in languages}
+            if "sitelinks" in props:
+                data["sitelinks"] = {site: v for site, v in entity.get("sitelinks", {}).items()
+                                     if sites is None or site in sites}
+            if "claims" in props:
+                data["claims"] = entity.get("claims", {})
+            entities[qid] = data
+        return {"entities": entities, "success": 1}
+
+    def export(self, titles, templates=False):
+        """Return a Special:Export XML document for the given titles (current revisions)."""
+        wanted = [t for t in (self.normalize(t) for t in titles) if t]
+        order = list(dict.fromkeys(t for _, t in wanted))
+        if templates:
+            queue = list(order)
+            while queue:
+                page = self.pages.get(queue.pop())
+                for tpl in page["templates"] if page else ():
+                    if tpl not in order:
+                        order.append(tpl)
+                        queue.append(tpl)
+        out = ['<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.11/" version="0.11" xml:lang="en">',
+               "  <siteinfo>", f"    <sitename>{escape(self.sitename)}</sitename>",
+               f"    <base>https://{self.host}/wiki/Main_Page</base>", f"    <generator>{GENERATOR}</generator>",
+               "    <case>first-letter</case>", "    <namespaces>"]
+        for ns in sorted(NAMESPACES):
+            name = self.namespace_name(ns)
+            out.append(f'      <namespace key="{ns}" case="first-letter">{escape(name)}</namespace>'
+                       if name else f'      <namespace key="{ns}" case="first-letter" />')
+        out += ["    </namespaces>", "  </siteinfo>"]
+        for title in order:
+            page = self.pages.get(title)
+            if page is None:
+                continue
+            rev = page["revisions"][-1]
+            out += ["  <page>", f"    <title>{escape(title)}</title>", f"    <ns>{page['ns']}</ns>",
+                    f"    <id>{page['pageid']}</id>"]
+            if page["redirect"]:
+                out.append(f"    <redirect title={quoteattr(page['redirect'][0])} />")
+            out += ["    <revision>", f"      <id>{rev['revid']}</id>", f"      <parentid>{rev['parentid']}</parentid>",
+                    f"      <timestamp>{rev['timestamp']}</timestamp>",
+                    f"      <contributor><username>{escape(rev['user'])}</username></contributor>",
+                    f"      <comment>{escape(rev['comment'])}</comment>", "      <model>wikitext</model>",
+                    "      <format>text/x-wiki</format>",
+                    f'      <text bytes="{rev["size"]}" xml:space="preserve">{escape(rev["text"])}</text>',
+                    f"      <sha1>{_sha1_base36(rev['text'])}</sha1>", "    </revision>", "  </page>"]
+        out.append("</mediawiki>")
+        return "\n".join(out) + "\n"
+
+    # ─── Dispatch ───────────────────────────────────────────
+
+    def handle(self, params, files=None):
+        """Answer one api.php call. Returns (response dict, API module name, writes made)."""
+        action = params.get("action", "")
+        fv2 = str(params.get("formatversion", "1")) in ("2", "latest")
+        module = action
+        if action == "query":
+            parts = [f"{k}={params[k]}" for k in ("meta", "list", "generator", "prop") if params.get(k)]
+            module = "query:" + ",".join(parts)
+        try:
+            result, writes = self._dispatch(action, params, files or {}, fv2)
+        except APIError as e:
+            result, writes = {"error": {"code": e.code, "info": e.info, "*": "See the local API stand-in."}}, 0
+        return result, module, writes
+
+    def _dispatch(self, action, params, files, fv2):
+        if action == "query":
+            return self.query(params, fv2), 0
+        if action == "login":
+            return {"login": {"result": "Success", "lguserid": 1, "lgusername": self.username}}, 0
+        if action == "wbgetentities":
+            return self.wbgetentities(params), 0
+        if action not in ("edit", "delete", "move", "import"):
+            raise APIError("badvalue", f'Unrecognized value for parameter "action": {action}.')
+        if params.get("token") != CSRF_TOKEN:
+            raise APIError("badtoken", "Invalid CSRF token.")
+        if action == "edit":
+            return self._edit(params, fv2)
+        if action == "delete":
+            page = self.delete(params.get("title", ""))
+            self._next_logid += 1
+            return {"delete": {"title": page["title"], "reason": params.get("reason", ""),
+                               "logid": self._next_logid}}, 1
+        if action == "move":
+            src = params.get("from") or ""
+            page = self.move(src, params.get("to", ""), summary=params.get("reason", ""),
+                             redirect="noredirect" not in params)
+            result = {"from": self.normalize(src)[1], "to": page["title"], "reason": params.get("reason", "")}
+            if "noredirect" not in params:
+                result["redirectcreated"] = _flag(fv2)
+            if "movetalk" in params and page["ns"] % 2 == 0:
+                talk = self._talk(*self.normalize(src))
+                if talk in self.pages:
+                    result["talkfrom"] = talk
+                    result["talkto"] = self.move(talk, self._talk(page["ns"], page["title"]),
+                                                 summary=params.get("reason", ""),
+                                                 redirect="noredirect" not in params)["title"]
+            return {"move": result}, 1
+        xml = files.get("xml")
+        if not xml:
+            raise APIError("nofile", "You didn't upload a file.")
+        pages = self.import_xml(xml, params.get("interwikiprefix", ""), params.get("summary", ""))
+        return {"import": pages}, len(pages)
+
+    def _edit(self, params, fv2):
+        norm = self.normalize(params.get("title", ""))
+        if norm is None:
+            raise APIError("invalidtitle", f'Bad title "{params.get("title", "")}".')
+        page = self.pages.get(norm[1])
+        if page is None and "nocreate" in params:
+            raise APIError("missingtitle", "The page you specified doesn't exist.")
+        if page is not None and "createonly" in params:
+            raise APIError("articleexists", "The article you tried to create has been created already.")
+        current = page["revisions"][-1]["text"] if page else ""
+        if "text" in params:
+            text = params["text"]
+        elif "appendtext" in params or "prependtext" in params:
+            text = params.get("prependtext", "") + current + params.get("appendtext", "")
+        else:
+            raise APIError("missingparam", "One of the parameters text, appendtext and prependtext is required.")
+        if page is not None and text.rstrip() == current.rstrip():
+            return {"edit": {"result": "Success", "pageid": page["pageid"], "title": page["title"],
+                             "contentmodel": "wikitext", "nochange": _flag(fv2)}}, 0
+        page, old = self.save(norm[1], text.rstrip(), summary=params.get("summary", ""))
+        rev = page["revisions"][-1]
+        result = {"result": "Success", "pageid": page["pageid"], "title": page["title"],
+                  "contentmodel": "wikitext", "oldrevid": old or 0, "newrevid": rev["revid"],
+                  "newtimestamp": rev["timestamp"]}
+        if old is None:
+            result["new"] = _flag(fv2)
+        return {"edit": result}, 1
+
+
+def load_fixture(path_or_data, username="EmmaBot", high_limits=False):
+    """Return {host: LocalWiki} built from a fixture file path or an already-loaded dict."""
+    data = path_or_data
+    if isinstance(path_or_data, str):
+        with open(path_or_data, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    wikis = {}
+    for host, spec in data.items():
+        wiki = LocalWiki(host, sitename=spec.get("sitename"), username=username, high_limits=high_limits)
+        for title, page in spec.get("pages", {}).items():
+            if isinstance(page, str):
+                page = {"text": page}
+            wiki.save(title, page.get("text", ""), summary="fixture", user="Fixture",
+                      pageprops=page.get("pageprops"))
+        wiki.entities.update({qid.upper(): e for qid, e in spec.get("entities", {}).items()})
+        wikis[host] = wiki
+    return wikis
+
+
+# ─── HTTP server ────────────────────────────────────────────
+
+class LocalAPIServer(ThreadingHTTPServer):
+    """Serves LocalWikis over HTTP, keyed by the host in the first path segment."""
+
+    daemon_threads = True
+
+    def __init__(self, wikis=None, port=0, latency=0.0, write_latency=0.0, max_rps=0.0, edit_rate=0,
+                 username="EmmaBot", high_limits=False):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.wikis = dict(wikis or {})
+        self.username = username
+        self.high_limits = high_limits
+        self.latency = latency
+        self.write_latency = write_latency
+        self.max_rps = max_rps
+        self.edit_rate = edit_rate
+        self.lock = threading.RLock()
+        self._tokens = max_rps
+        self._refilled = time.monotonic()
+        self._writes = deque()
+        self.reset_stats()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def wiki(self, host):
+        with self.lock:
+            if host not in self.wikis:
+                self.wikis[host] = LocalWiki(host, username=self.username, high_limits=self.high_limits)
+            return self.wikis[host]
+
+    def refresh_special_pages(self):
+        with self.lock:
+            for wiki in self.wikis.values():
+                wiki.refresh_special_pages()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {"requests": 0, "bytes_in": 0, "bytes_out": 0, "writes": 0, "throttled": 0,
+                          "ratelimited": 0, "errors": 0, "hosts": Counter(), "modules": Counter()}
+
+    def snapshot(self):
+        """A JSON-serializable copy of the counters."""
+        with self.lock:
+            snap = dict(self.stats)
+            snap["hosts"] = dict(self.stats["hosts"])
+            snap["modules"] = dict(self.stats["modules"])
+            return snap
+
+    def _take_token(self):
+        """Token bucket for max_rps. Returns True if the request may proceed."""
+        if not self.max_rps:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self._tokens = min(self.max_rps, self._tokens + (now - self._refilled) * self.max_rps)
+            self._refilled = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def _allow_write(self):
+        if not self.edit_rate:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            while self._writes and self._writes[0] < now - 60:
+                self._writes.popleft()
+            if len(self._writes) >= self.edit_rate:
+                return False
+            self._writes.append(now)
+            return True
+
+    def serve_in_thread(self):
+        thread = threading.Thread(target=self.serve_forever, name="local-api", daemon=True)
+        thread.start()
+        return thread
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle(b"")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self._handle(self.rfile.read(length) if length else b"")
+
+    def _handle(self, body):
+        server = self.server
+        url = urllib.parse.urlsplit(self.path)
+        host, _, path = url.path.lstrip("/").partition("/")
+        params = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+        files = {}
+        ctype = self.headers.get("Content-Type", "")
+        if ctype.startswith("multipart/form-data"):
+            msg = email.parser.BytesParser().parsebytes(f"Content-Type: {ctype}\r\n\r\n".encode("latin-1") + body)
+            for part in msg.get_payload():
+                name = part.get_param("name", header="content-disposition")
+                payload = part.get_payload(decode=True)
+                if part.get_filename():
+                    files[name] = payload
+                else:
+                    params[name] = payload.decode("utf-8")
+        elif body:
+            params.update(urllib.parse.parse_qsl(body.decode("utf-8"), keep_blank_values=True))
+
+        with server.lock:
+            server.stats["requests"] += 1
+            server.stats["bytes_in"] += len(self.requestline) + len(str(self.headers)) + len(body)
+            server.stats["hosts"][host] += 1
+
+        if server.latency:
+            time.sleep(server.latency)
+        if not server._take_token():
+            with server.lock:
+                server.stats["throttled"] += 1
+            self._send(429, b"Too many requests", "text/plain", {"Retry-After": "1"})
+            return
+
+        wiki = server.wiki(host)
+        if path.endswith("index.php") and params.get("title") == "Special:Export":
+            with server.lock:
+                xml = wiki.export(params.get("pages", "").splitlines(), templates="templates" in params)
+                server.stats["modules"][f"{host} export"] += 1
+            self._send(200, xml.encode("utf-8"), "application/xml; charset=utf-8")
+            return
+        if not path.endswith("api.php"):
+            self._send(404, b"Not found", "text/plain")
+            return
+
+        if params.get("action") in ("edit", "delete", "move", "import") and not server._allow_write():
+            result, module, writes = {"error": {"code": "ratelimited", "info": (
+                "As an anti-abuse measure, you are limited from performing this action too many times "
+                "in a short space of time, and you have exceeded this limit. Please try again in a few minutes."
+            ), "*": ""}}, params.get("action"), 0
+            with server.lock:
+                server.stats["ratelimited"] += 1
+        else:
+            if server.write_latency and params.get("action") in ("edit", "delete", "move", "import"):
+                time.sleep(server.write_latency)
+            with server.lock:
+                result, module, writes = wiki.handle(params, files)
+        with server.lock:
+            server.stats["modules"][f"{host} {module}"] += 1
+            server.stats["writes"] += writes
+            if "error" in result:
+                server.stats["errors"] += 1
+        self._send(200, json.dumps(result, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8")
+
+    def _send(self, status, payload, ctype, headers=None):
+        if "gzip" in self.headers.get("Accept-Encoding", "") and len(payload) > 256:
+            payload = gzip.compress(payload, 6)
+            headers = {**(headers or {}), "Content-Encoding": "gzip"}
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+        with self.server.lock:
+            self.server.stats["bytes_out"] += len(payload)
+
+
+# ─── Client side ────────────────────────────────────────────
+
+def route(base_url):
+    """Send every HTTP(S) request this process makes via requests or urllib to the local server.
+
+    https://shinto.miraheze.org/w/api.php becomes <base_url>/shinto.miraheze.org/w/api.php,
+    and likewise for every other host, so nothing reaches the real wikis.
+    """
+    import requests.adapters
+
+    base = base_url.rstrip("/")
+    local = urllib.parse.urlsplit(base).netloc
+
+    def rewrite(url):
+        parts = urllib.parse.urlsplit(url)
+        if parts.netloc == local:
+            return url
+        return f"{base}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+
+    send = requests.adapters.HTTPAdapter.send
+
+    def routed_send(self, request, **kwargs):
+        request = request.copy()
+        request.url = rewrite(request.url)
+        kwargs["proxies"] = {}
+        return send(self, request, **kwargs)
+
+    urlopen = urllib.request.urlopen
+
+    def routed_urlopen(url, *args, **kwargs):
+        if isinstance(url, urllib.request.Request):
+            url.full_url = rewrite(url.full_url)
+        else:
+            url = rewrite(url)
+        return urlopen(url, *args, **kwargs)
+
+    requests.adapters.HTTPAdapter.send = routed_send
+    urllib.request.urlopen = routed_urlopen
+    os.environ["no_proxy"] = os.environ["NO_PROXY"] = local.split(":")[0]
+
+
+class VirtualClock:
+    """Replaces time.sleep with a counter and shifts time.time/monotonic/perf_counter by the total.
+
+    Scripts sleep 1.5 s after every save; under a virtual clock those sleeps
+    are recorded instead of waited out, while code that measures elapsed
+    time (e.g. DeletionExecutor's request spacing) still sees them pass.
+    """
+
+    def __init__(self):
+        self.slept = 0.0
+        self.sleeps = 0
+        self._lock = threading.Lock()
+
+    def install(self):
+        real = (time.time, time.monotonic, time.perf_counter)
+
+        def sleep(seconds):
+            with self._lock:
+                self.slept += max(0.0, seconds)
+                self.sleeps += 1
+
+        time.sleep = sleep
+        time.time = lambda: real[0]() + self.slept
+        time.monotonic = lambda: real[1]() + self.slept
+        time.perf_counter = lambda: real[2]() + self.slept
+
+
+def run_script(api_url, script, argv, virtual_sleep=False, stats_file=""):
+    """Run a script file as __main__ with its HTTP routed to api_url."""
+    route(api_url)
+    clock = VirtualClock() if virtual_sleep else None
+    if clock:
+        clock.install()
+    sys.argv = [script] + list(argv)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    try:
+        runpy.run_path(script, run_name="__main__")
+    finally:
+        if stats_file:
+            with open(stats_file, "w", encoding="utf-8") as f:
+                json.dump({"sleep_s": clock.slept if clock else 0.0, "sleeps": clock.sleeps if clock else 0}, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local MediaWiki/Wikidata API stand-in.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="Serve a fixture until interrupted.")
+    serve.add_argument("--fixture", default="", help="Fixture JSON (default: empty wikis).")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request.")
+    serve.add_argument("--write-latency", type=float, default=0.0, help="Extra seconds added to every write.")
+    serve.add_argument("--max-rps", type=float, default=0.0, help="Requests per second before HTTP 429 (0 = off).")
+    serve.add_argument("--edit-rate", type=int, default=0, help="Writes per minute before 'ratelimited' (0 = off).")
+    serve.add_argument("--high-limits", action="store_true", help="Grant apihighlimits (5000 per list request).")
+
+    run = sub.add_parser("run", help="Run a script with its HTTP routed to a local server.")
+    run.add_argument("--api", required=True, help="Base URL of the local server, e.g. http://127.0.0.1:8765")
+    run.add_argument("--virtual-sleep", action="store_true", help="Record time.sleep calls instead of sleeping.")
+    run.add_argument("--stats-file", default="", help="Write sleep totals as JSON to this path on exit.")
+    run.add_argument("script")
+    run.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run_script(args.api, args.script, args.args, virtual_sleep=args.virtual_sleep, stats_file=args.stats_file)
+        return
+
+    username = os.getenv("WIKI_USERNAME", "EmmaBot")
+    wikis = load_fixture(args.fixture, username, args.high_limits) if args.fixture else {}
+    server = LocalAPIServer(wikis, port=args.port, latency=args.latency, write_latency=args.write_latency,
+                            max_rps=args.max_rps, edit_rate=args.edit_rate, username=username,
+                            high_limits=args.high_limits)
+    print(f"Serving {len(wikis)} fixture wiki(s) at {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.snapshot(), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
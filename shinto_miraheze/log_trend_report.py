@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+log_trend_report.py
+===================
+Cross-run throughput trends from the scripts' JSONL logs: edits per minute,
+error rate and edits to date per script per run, with a flag on any stage
+whose edits/min dropped by 30% or more from its recent runs.
+
+Reads the per-page logs (migrate_talk_pages.log, normalize_category_pages.log,
+the delete_* logs, ...) and run_metrics.log (see metrics.py). Lines are
+grouped into runs by their run_id. Older lines have no run_id and are split
+wherever the log goes quiet for RUN_GAP.
+
+Each log is read incrementally: an index file keeps, per log, the byte offset
+already read, a hash of its first line (so a truncated or replaced log is
+re-read from the start) and the per-run totals parsed so far. A report
+therefore only parses the lines appended since the last one. The logs and
+the index are carried between workflow runs in the actions cache.
+
+Output is a table on stdout and optionally an HTML file (--html) and/or the
+wiki page User:EmmaBot/Throughput (--publish).
+
+Usage:
+    python3 shinto_miraheze/log_trend_report.py
+    python3 shinto_miraheze/log_trend_report.py --html throughput.html --runs 10
+    python3 shinto_miraheze/log_trend_report.py --publish --run-tag "[[github:...|...]]"
+"""
+
+import argparse
+import datetime as dt
+import glob
+import hashlib
+import html
+import json
+import os
+import statistics
+import sys
+from collections import defaultdict
+
+from wiki import lazy_site
+
+sys.stdout.reconfigure(encoding="utf-8")
+
+DEFAULT_LOGS = "shinto_miraheze/*.log"
+DEFAULT_INDEX = "shinto_miraheze/log_trend_report.index"
+REPORT_PAGE = "User:EmmaBot/Throughput"
+RUN_GAP = dt.timedelta(minutes=30)
+EDIT_STATUSES = {"edited", "deleted"}
+REGRESSION_DROP = 0.30
+BASELINE_RUNS = 5
+INDEX_VERSION = 1
+
+
+def parse_ts(value):
+    return dt.datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ")
+
+
+def _new_bucket(ts):
+    return {"first_ts": ts, "last_ts": ts, "lines": 0, "edits": 0, "errors": 0,
+            "requests": 0, "writes": 0, "http_errors": 0, "wall_s": 0.0, "commit": "", "event": ""}
+
+
+class LogIndex:
+    """Byte offsets into each log and the per-(script, run) totals read from it so far."""
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self.files = data["files"]
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "files": self.files}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def update(self, log_path):
+        """Parse the lines appended to log_path since the last update. Returns the number read."""
+        with open(log_path, "rb") as f:
+            head = hashlib.sha1(f.readline()).hexdigest()
+            size = f.seek(0, os.SEEK_END)
+            entry = self.files.get(log_path)
+            if entry is None or entry["head"] != head or entry["offset"] > size:
+                entry = {"head": head, "offset": 0, "last_ts": "", "last_run": "", "runs": {}}
+                self.files[log_path] = entry
+            f.seek(entry["offset"])
+            chunk = f.read()
+
+        end = chunk.rfind(b"\n") + 1  # leave a partly written last line for next time
+        default_script = os.path.splitext(os.path.basename(log_path))[0]
+        count = 0
+        for raw in chunk[:end].splitlines():
+            try:
+                record = json.loads(raw)
+                ts = record["ts_utc"]
+                parse_ts(ts)
+            except (ValueError, KeyError):
+                continue
+            run = record.get("run_id") or self._local_run(entry, ts)
+            entry["last_ts"], entry["last_run"] = ts, run
+            script = record.get("script", default_script)
+            key = f"{script}\t{run}"
+            bucket = entry["runs"].setdefault(key, _new_bucket(ts))
+            bucket["last_ts"] = max(bucket["last_ts"], ts)
+            if "requests" in record:
+                # A metrics.py record: one per script process
+                bucket["requests"] += record.get("requests", 0)
+                bucket["writes"] += record.get("writes", 0)
+                bucket["http_errors"] += record.get("errors", 0)
+                bucket["wall_s"] += record.get("wall_s", 0.0)
+                bucket["commit"] = record.get("commit") or bucket["commit"]
+                bucket["event"] = record.get("event") or bucket["event"]
+            else:
+                status = record.get("status", "")
+                bucket["lines"] += 1
+                if status in EDIT_STATUSES:
+                    bucket["edits"] += 1
+                elif status.startswith("error"):
+                    bucket["errors"] += 1
+            count += 1
+        entry["offset"] += end
+        return count
+
+    @staticmethod
+    def _local_run(entry, ts):
+        """Run name for a line without run_id: continue the previous run unless RUN_GAP has passed."""
+        if entry["last_run"].startswith("local-") and entry["last_ts"]:
+            if parse_ts(ts) - parse_ts(entry["last_ts"]) <= RUN_GAP:
+                return entry["last_run"]
+        return "local-" + ts[:16].replace("-", "").replace(":", "")
+
+    def runs(self):
+        """{script: [run stats, oldest first]} with the per-page and metrics totals combined."""
+        merged = {}
+        for entry in self.files.values():
+            for key, bucket in entry["runs"].items():
+                script, run = key.split("\t", 1)
+                row = merged.setdefault((script, run), dict(_new_bucket(bucket["first_ts"]), run=run))
+                row["first_ts"] = min(row["first_ts"], bucket["first_ts"])
+                row["last_ts"] = max(row["last_ts"], bucket["last_ts"])
+                for k in ("lines", "edits", "errors", "requests", "writes", "http_errors", "wall_s"):
+                    row[k] += bucket[k]
+                row["commit"] = row["commit"] or bucket["commit"]
+                row["event"] = row["event"] or bucket["event"]
+
+        by_script = defaultdict(list)
+        for (script, _run), row in merged.items():
+            by_script[script].append(_finish(row))
+        for rows in by_script.values():
+            rows.sort(key=lambda r: r["first_ts"])
+            done = 0
+            for row in rows:
+                done += row["done"]
+                row["done_to_date"] = done
+        return dict(by_script)
+
+
+def _finish(row):
+    """Add done, edits/min and error rate to a run's totals."""
+    # Per-page logs count edits exactly; scripts without one fall back to metrics write calls
+    row["done"] = row["edits"] if row["lines"] else row["writes"]
+    if row["wall_s"]:
+        minutes = row["wall_s"] / 60
+    else:
+        minutes = (parse_ts(row["last_ts"]) - parse_ts(row["first_ts"])).total_seconds() / 60
+    row["minutes"] = minutes
+    row["edits_per_min"] = row["done"] / minutes if minutes > 0 and row["done"] else None
+    if row["lines"]:
+        row["error_rate"] = row["errors"] / row["lines"]
+    elif row["requests"]:
+        row["error_rate"] = row["http_errors"] / row["requests"]
+    else:
+        row["error_rate"] = None
+    return row
+
+
+def trend(rows):
+    """Summary of a script's latest run against the median of the BASELINE_RUNS runs before it."""
+    latest = rows[-1]
+    earlier = [r["edits_per_min"] for r in rows[:-1][-BASELINE_RUNS:] if r["edits_per_min"]]
+    baseline = statistics.median(earlier) if earlier else None
+    change = None
+    if baseline and latest["edits_per_min"] is not None:
+        change = latest["edits_per_min"] / baseline - 1
+    return {
+        "latest": latest,
+        "runs": len(rows),
+        "baseline": baseline,
+        "change": change,
+        "regression": change is not None and change <= -REGRESSION_DROP,
+    }
+
+
+def _fmt(value, spec, none="-"):
+    return none if value is None else format(value, spec)
+
+
+def _after(latest):
+    return f" after {latest['commit']}" if latest["commit"] else ""
+
+
+def print_report(trends):
+    print(f"{'script':<44} {'runs':>4} {'last run':<17} {'edits':>6} {'ed/min':>7} {'base':>7} "
+          f"{'change':>7} {'err %':>6} {'to date':>8}")
+    print("-" * 115)
+    for script, t in sorted(trends.items()):
+        r = t["latest"]
+        flag = "  REGRESSION" if t["regression"] else ""
+        print(f"{script:<44} {t['runs']:>4} {r['first_ts'][:16]:<17} {r['done']:>6} "
+              f"{_fmt(r['edits_per_min'], '.1f'):>7} {_fmt(t['baseline'], '.1f'):>7} "
+              f"{_fmt(t['change'], '+.0%'):>7} {_fmt(r['error_rate'], '.1%'):>6} {r['done_to_date']:>8}{flag}")
+    for script, t in sorted(trends.items()):
+        if t["regression"]:
+            print(f"REGRESSION: {script} edits/min {t['latest']['edits_per_min']:.1f} vs "
+                  f"{t['baseline']:.1f} over its previous runs ({t['change']:+.0%}){_after(t['latest'])}")
+
+
+def wiki_table(trends, run_tag):
+    lines = [
+        f"Throughput per cleanup-loop stage, generated by <code>log_trend_report.py</code> {run_tag}.",
+        f"Edits/min of the latest run is compared with the median of the {BASELINE_RUNS} runs before it; "
+        f"a drop of {REGRESSION_DROP:.0%} or more is flagged.",
+        "",
+        '{| class="wikitable sortable"',
+        "! Script !! Runs !! Last run (UTC) !! Edits !! Edits/min !! Baseline !! Change !! Error rate !! Edits to date",
+    ]
+    for script, t in sorted(trends.items()):
+        r = t["latest"]
+        change = _fmt(t["change"], "+.0%")
+        if t["regression"]:
+            change = f"'''{change}''' (regression{_after(r)})"
+        lines.append("|-")
+        lines.append(f"| {script} || {t['runs']} || {r['first_ts'][:16].replace('T', ' ')} || {r['done']} || "
+                     f"{_fmt(r['edits_per_min'], '.1f')} || {_fmt(t['baseline'], '.1f')} || {change} || "
+                     f"{_fmt(r['error_rate'], '.1%')} || {r['done_to_date']}")
+    lines.append("|}")
+    return "\n".join(lines) + "\n"
+
+
+def html_report(trends, runs, history):
+    out = ["<!DOCTYPE html>", '<html><head><meta charset="utf-8"><title>Cleanup loop throughput</title>',
+           "<style>body{font-family:sans-serif}table{border-collapse:collapse;margin-bottom:1.5em}"
+           "td,th{border:1px solid #ccc;padding:2px 8px;text-align:right}td:first-child{text-align:left}"
+           ".reg{background:#fdd}</style></head><body>",
+           "<h1>Cleanup loop throughput</h1>",
+           f"<p>Generated {html.escape(dt.datetime.utcnow().isoformat(timespec='seconds'))}Z. "
+           f"Flagged: edits/min {REGRESSION_DROP:.0%} or more below the median of the previous "
+           f"{BASELINE_RUNS} runs.</p>"]
+    for script, t in sorted(trends.items()):
+        heading = '<h2 class="reg">' if t["regression"] else "<h2>"
+        out.append(f"{heading}{html.escape(script)}</h2>")
+        out.append("<table><tr><th>Run</th><th>Start (UTC)</th><th>Commit</th><th>Edits</th><th>Minutes</th>"
+                   "<th>Edits/min</th><th>Error rate</th><th>Requests</th><th>Edits to date</th></tr>")
+        for r in runs[script][-history:]:
+            cls = ' class="reg"' if t["regression"] and r is t["latest"] else ""
+            out.append(f"<tr{cls}><td>{html.escape(r['run'])}</td><td>{r['first_ts'][:16]}</td>"
+                       f"<td>{html.escape(r['commit'])}</td><td>{r['done']}</td><td>{r['minutes']:.1f}</td>"
+                       f"<td>{_fmt(r['edits_per_min'], '.1f')}</td><td>{_fmt(r['error_rate'], '.1%')}</td>"
+                       f"<td>{r['requests']}</td><td>{r['done_to_date']}</td></tr>")
+        out.append("</table>")
+    out.append("</body></html>")
+    return "\n".join(out) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-run throughput trends from the JSONL run logs.")
+    parser.add_argument("--logs", default=DEFAULT_LOGS, help="Glob of JSONL logs to read.")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help="Byte-offset index file.")
+    parser.add_argument("--html", default="", help="Also write an HTML report to this path.")
+    parser.add_argument("--runs", type=int, default=10, help="Runs per script shown in the HTML report.")
+    parser.add_argument("--publish", action="store_true", help=f"Save the table to [[{REPORT_PAGE}]].")
+    parser.add_argument("--run-tag", default="", help="Wiki-formatted run tag link for the edit summary.")
+    args = parser.parse_args()
+
+    index = LogIndex(args.index)
+    read = 0
+    paths = sorted(glob.glob(args.logs))
+    for path in paths:
+        read += index.update(path)
+    index.save()
+    print(f"Read {read} new log lines from {len(paths)} logs\n")
+
+    runs = index.runs()
+    if not runs:
+        print("No runs recorded yet.")
+        return
+    trends = {script: trend(rows) for script, rows in runs.items()}
+    print_report(trends)
+
+    if args.html:
+        with open(args.html, "w", encoding="utf-8") as f:
+            f.write(html_report(trends, runs, args.runs))
+        print(f"\nWrote {args.html}")
+
+    if args.publish:
+        if not args.run_tag:
+            parser.error("--publish needs --run-tag")
+        site = lazy_site("ThroughputReportBot/1.0 (User:EmmaBot; shinto.miraheze.org)")
+        site.pages[REPORT_PAGE].save(wiki_table(trends, args.run_tag),
+                                     summary=f"Bot: update stage throughput report {args.run_tag}")
+        print(f"\nUpdated [[{REPORT_PAGE}]]")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,15 @@ merge_by_ja_interwiki.py
 =========================
 Scans Category:Categories missing Wikidata with Japanese interwikis.
 
-Extracts the [[ja:...]] link from each category page to build a map of
-jawiki category target → [shintowiki categories that link to it].
+Extracts the [[ja:...]] link from each category page (read in bulk, 50 pages
+per request) to build a map of jawiki category target → [shintowiki
+categories that link to it]. All distinct jawiki targets are then resolved
+to QIDs with batched pageprops queries before any edits are made.
 
 For each jawiki target:
 
   Single shintowiki category:
-    - Fetch QID from jawiki API using the ja: link.
+    - Use the QID resolved from jawiki via the ja: link.
     - If found: create Q{QID} redirect + add {{wikidata link|Q...}} (same
       flow as resolve_missing_wikidata_categories.py Case A/B).
 
@@ -23,27 +25,25 @@ Run dry-run first:
     python merge_by_ja_interwiki.py --dry-run
 """
 
-import os
 import re
 import time
-import io
 import sys
 import argparse
 import mwclient
 import requests
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL
+
+sys.stdout.reconfigure(encoding='utf-8')
 
-WIKI_URL    = "shinto.miraheze.org"
-WIKI_PATH   = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "[REDACTED_SECRET_1]")
 THROTTLE    = 1.5
 WD_THROTTLE = 0.5
+JAWIKI_BATCH = 50   # titles per jawiki pageprops request
 
 SOURCE_CAT = "Categories missing Wikidata with Japanese interwikis"
 MULTI_CAT  = "jawiki categories with multiple enwiki"
 WP_UA      = "ShintowikiBot/1.0 (User:EmmaBot; shinto.miraheze.org)"
+JA_CAT_PREFIXES = ("Category:", "カテゴリ:")
 
 JA_LINK_RE  = re.compile(r'\[\[ja:([^\]|]+)', re.IGNORECASE)
 REDIRECT_RE = re.compile(r'#REDIRECT\s*\[\[Category:([^\]]+)\]\]', re.IGNORECASE)
@@ -65,23 +65,79 @@ def is_cjk(text):
     return False
 
 
-def get_qid_from_jawiki(ja_cat_name):
-    """Query jawiki for the QID of Category:ja_cat_name."""
-    for prefix in ("Category:", "カテゴリ:"):
+def iter_category_texts(site, category):
+    """Yield (title, text) for every category page in Category:category.
+
+    Reads page content in bulk via generator=categorymembers instead of
+    one page.text() request per member.
+    """
+    params = {
+        "generator": "categorymembers",
+        "gcmtitle": f"Category:{category}",
+        "gcmnamespace": 14,
+        "gcmlimit": 50,
+        "prop": "revisions",
+        "rvprop": "content",
+        "rvslots": "main",
+        "formatversion": 2,
+    }
+    while True:
+        data = site.api("query", **params)
+        for page in data.get("query", {}).get("pages", []):
+            revisions = page.get("revisions") or []
+            if not revisions:
+                # Content for this page arrives in a later rvcontinue batch.
+                continue
+            yield page["title"], revisions[0].get("slots", {}).get("main", {}).get("content", "")
+        if "continue" in data:
+            params.update(data["continue"])
+        else:
+            break
+
+
+def get_qids_from_jawiki(ja_cat_names):
+    """Query jawiki for the QIDs of many Category:ja_cat_name pages at once.
+
+    Both the Category: and カテゴリ: spellings go into the same title list;
+    jawiki normalizes them to one canonical title, so each batch of
+    JAWIKI_BATCH titles resolves JAWIKI_BATCH // 2 categories.
+    Returns {ja_cat_name: qid} for the names that have a QID.
+    """
+    names = list(dict.fromkeys(ja_cat_names))
+    per_batch = JAWIKI_BATCH // 2
+    qids = {}
+    for start in range(0, len(names), per_batch):
+        chunk = names[start:start + per_batch]
+        titles = []
+        for name in chunk:
+            titles.extend(f"{prefix}{name}" for prefix in JA_CAT_PREFIXES)
         try:
             r = requests.get("https://ja.wikipedia.org/w/api.php", params={
-                "action": "query", "format": "json",
+                "action": "query", "format": "json", "formatversion": 2,
                 "prop": "pageprops",
-                "titles": f"{prefix}{ja_cat_name}",
-            }, headers={"User-Agent": WP_UA}, timeout=10)
-            pages = r.json()["query"]["pages"]
-            for page in pages.values():
-                qid = page.get("pageprops", {}).get("wikibase_item")
+                "ppprop": "wikibase_item",
+                "titles": "|".join(titles),
+            }, headers={"User-Agent": WP_UA}, timeout=30)
+            query = r.json()["query"]
+        except Exception as e:
+            print(f"  WARNING: jawiki batch lookup failed ({len(chunk)} names): {e}")
+            time.sleep(WD_THROTTLE)
+            continue
+
+        normalized = {n["from"]: n["to"] for n in query.get("normalized", [])}
+        by_title = {
+            page["title"]: page.get("pageprops", {}).get("wikibase_item")
+            for page in query.get("pages", [])
+        }
+        for name in chunk:
+            for prefix in JA_CAT_PREFIXES:
+                title = f"{prefix}{name}"
+                qid = by_title.get(normalized.get(title, title))
                 if qid:
-                    return qid
-        except Exception:
-            pass
-    return None
+                    qids[name] = qid
+                    break
+        time.sleep(WD_THROTTLE)
+    return qids
 
 
 def ensure_multi_cat(site, dry_run):
@@ -180,10 +236,8 @@ def recategorize_members(site, from_cat, to_cat, dry_run):
             time.sleep(THROTTLE)
 
 
-def handle_single(site, cat_page, cat_name, ja_cat_name, dry_run):
-    """Single shintowiki category for this jawiki target — get QID and link."""
-    qid = get_qid_from_jawiki(ja_cat_name)
-    time.sleep(WD_THROTTLE)
+def handle_single(site, cat_page, cat_name, ja_cat_name, qid, dry_run):
+    """Single shintowiki category for this jawiki target — link the pre-resolved QID."""
     if not qid:
         print(f"  SKIP (no QID on jawiki for ja:{ja_cat_name})")
         return False
@@ -245,21 +299,14 @@ def main():
 
     ensure_multi_cat(site, args.dry_run)
 
-    source = site.categories[SOURCE_CAT]
-    all_cats = [p for p in source if p.namespace == 14]
-    print(f"Found {len(all_cats)} categories in source\n")
-
     # --- Phase 1: Build map of jawiki target → shintowiki categories ---
     print("Phase 1: Reading pages to build ja: map...")
-    ja_map = {}  # normalized ja category name → [(cat_page, cat_name)]
+    ja_map = {}  # normalized ja category name → [(cat_title, cat_name)]
 
-    for i, cat_page in enumerate(all_cats, 1):
-        cat_name = cat_page.name.removeprefix("Category:")
-        try:
-            text = cat_page.text()
-        except Exception as e:
-            print(f"  [{i}] ERROR reading {cat_name}: {e}")
-            continue
+    total = 0
+    for i, (title, text) in enumerate(iter_category_texts(site, SOURCE_CAT), 1):
+        total = i
+        cat_name = title.removeprefix("Category:")
 
         if REDIRECT_RE.search(text):
             print(f"  [{i}] SKIP (already redirect): {cat_name}")
@@ -274,7 +321,8 @@ def main():
         # Strip Category:/カテゴリ: prefix from the target
         ja_cat_name = re.sub(r'^カテゴリ:|^Category:', '', raw_target, flags=re.IGNORECASE).strip()
 
-        ja_map.setdefault(ja_cat_name, []).append((cat_page, cat_name))
+        ja_map.setdefault(ja_cat_name, []).append((title, cat_name))
+    print(f"Read {total} categories from source")
 
     singles = {k: v for k, v in ja_map.items() if len(v) == 1}
     multis  = {k: v for k, v in ja_map.items() if len(v) > 1}
@@ -283,16 +331,26 @@ def main():
 
     linked = merged = tagged = skipped = errors = 0
 
-    # --- Phase 2a: Single matches — look up QID and link ---
-    print("Phase 2a: Processing single-match categories...")
     singles_list = list(singles.items())
     if args.limit:
         singles_list = singles_list[:args.limit]
 
+    # Only singles and CJK+Latin merge groups need a QID; resolve them all up front.
+    lookup_names = [name for name, _ in singles_list]
+    for ja_cat_name, entries in multis.items():
+        cjk_count = sum(1 for _, n in entries if is_cjk(n))
+        if cjk_count == 1 and len(entries) == 2:
+            lookup_names.append(ja_cat_name)
+    print(f"Resolving {len(lookup_names)} jawiki targets in batches of {JAWIKI_BATCH // 2}...")
+    qid_map = get_qids_from_jawiki(lookup_names)
+    print(f"  Found QIDs for {len(qid_map)} of {len(lookup_names)} targets\n")
+
+    # --- Phase 2a: Single matches — link the resolved QID ---
+    print("Phase 2a: Processing single-match categories...")
     for ja_cat_name, entries in singles_list:
-        cat_page, cat_name = entries[0]
+        cat_title, cat_name = entries[0]
         print(f"SINGLE: {cat_name}  (ja:{ja_cat_name})")
-        if handle_single(site, cat_page, cat_name, ja_cat_name, args.dry_run):
+        if handle_single(site, site.pages[cat_title], cat_name, ja_cat_name, qid_map.get(ja_cat_name), args.dry_run):
             linked += 1
         else:
             skipped += 1
@@ -308,8 +366,8 @@ def main():
 
         if len(cjk_entries) == 1 and len(latin_entries) == 1:
             # Ideal case: one CJK + one Latin → merge CJK into Latin
-            cjk_page, cjk_name = cjk_entries[0]
-            lat_page, lat_name = latin_entries[0]
+            cjk_title, cjk_name = cjk_entries[0]
+            lat_title, lat_name = latin_entries[0]
             print(f"  MERGE: {cjk_name} → {lat_name}")
 
             if args.dry_run:
@@ -321,7 +379,7 @@ def main():
 
             recategorize_members(site, cjk_name, lat_name, dry_run=False)
             try:
-                cjk_page.save(
+                site.pages[cjk_title].save(
                     f"#REDIRECT [[Category:{lat_name}]]",
                     summary=f"Bot: merge Japanese-named category into English equivalent [[Category:{lat_name}]] (same jawiki target)"
                 )
@@ -332,14 +390,14 @@ def main():
                 errors += 1
                 continue
 
-            handle_single(site, lat_page, lat_name, ja_cat_name, dry_run=False)
+            handle_single(site, site.pages[lat_title], lat_name, ja_cat_name, qid_map.get(ja_cat_name), dry_run=False)
             merged += 1
 
         else:
             # Multiple Latin, multiple CJK, or 3+ entries — tag all for manual review
-            for cat_page, cat_name in entries:
+            for cat_title, cat_name in entries:
                 print(f"  TAG MULTI: {cat_name}")
-                if tag_multi(cat_page, args.dry_run):
+                if tag_multi(site.pages[cat_title], args.dry_run):
                     time.sleep(THROTTLE)
                     tagged += 1
 
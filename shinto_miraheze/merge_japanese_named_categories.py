@@ -22,20 +22,17 @@ Run dry-run first:
     python merge_japanese_named_categories.py --dry-run
 """
 
-import os
 import re
 import time
-import io
 import sys
 import argparse
 import mwclient
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+from qid_index import QidIndex
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL
+
+sys.stdout.reconfigure(encoding='utf-8')
 
-WIKI_URL  = "shinto.miraheze.org"
-WIKI_PATH = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "[REDACTED_SECRET_1]")
 THROTTLE  = 1.5
 
 SOURCE_CAT    = "Japanese_language_category_names"
@@ -117,6 +114,10 @@ def main():
         ja_cats = ja_cats[:args.limit]
         print(f"(Limited to first {args.limit})\n")
 
+    index = QidIndex.load()
+    fetched, removed = index.refresh(site)
+    print(f"Q page index: {len(index)} pages ({fetched} re-read, {removed} removed)\n")
+
     merged = skipped = errors = 0
 
     for i, ja_page in enumerate(ja_cats, 1):
@@ -143,29 +144,19 @@ def main():
             continue
 
         qid = m.group(1)
-        q_page = site.pages[qid]
 
-        if not q_page.exists:
+        if qid not in index:
             print(f"[{i}/{len(ja_cats)}] SKIP ({qid} does not exist): {ja_name}")
             skipped += 1
             continue
 
-        try:
-            q_text = q_page.text()
-        except Exception as e:
-            print(f"[{i}/{len(ja_cats)}] ERROR reading {qid}: {e}")
-            errors += 1
-            continue
-
         # Check Q page is a simple redirect to one category
-        redir_m = REDIRECT_RE.search(q_text)
-        if not redir_m:
+        en_name = index.category_target(qid)
+        if not en_name:
             print(f"[{i}/{len(ja_cats)}] SKIP ({qid} is not a simple redirect): {ja_name}")
             skipped += 1
             continue
 
-        en_name = redir_m.group(1).strip()
-
         # Skip if target is also CJK (shouldn't happen but guard anyway)
         if is_cjk(en_name):
             print(f"[{i}/{len(ja_cats)}] SKIP (target is also CJK): {ja_name} → {en_name}")
@@ -18,19 +18,15 @@ of both A and B, and B's content (minus the {{moved from}} template).
 Pages that link to more than one partner are skipped (must be exclusive pairs).
 """
 
-import os
 import mwclient
 import re
 import time
-import io
 import sys
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL
+
+sys.stdout.reconfigure(encoding='utf-8')
 
-WIKI_URL = 'shinto.miraheze.org'
-WIKI_PATH = '/w/'
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "[REDACTED_SECRET_1]")
 SLEEP     = 1.5
 
 CAT_STARTING = 'Move starting points'
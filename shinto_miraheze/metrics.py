@@ -0,0 +1,302 @@
+"""
+metrics.py
+==========
+Per-script counters for wiki traffic, written as one JSONL record when the
+script exits.
+
+install() wraps the three places traffic and waiting go through:
+requests' HTTPAdapter.send (mwclient and wiki.get_session()),
+urllib.request.urlopen (migrate_talk_pages.py) and time.sleep (THROTTLE
+pauses and mwclient's retry back-off). It counts calls by host and by API
+module, such as "query:list=categorymembers" or "edit". It also keeps a
+latency histogram per host and counts bytes, writes, HTTP errors, sleep
+time and mwclient retries.
+
+wiki.py calls install() when WIKI_METRICS_LOG is set (cleanup_loop.sh sets
+it), so every script in the loop is covered without changes of its own.
+update_bot_userpage_status.py reads the current run's records back to
+write the throughput line in the User:EmmaBot status block.
+
+Not a standalone script.
+"""
+
+import atexit
+import json
+import os
+import re
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+
+import requests.adapters
+
+METRICS_LOG_ENV = "WIKI_METRICS_LOG"
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+WRITE_ACTIONS = {"edit", "move", "delete", "undelete", "import", "upload", "protect",
+                 "wbeditentity", "wbcreateclaim", "wbsetclaim"}
+MULTIPART_FIELD_RE = re.compile(rb'name="([^"]+)"\r\n\r\n([^\r]*)\r\n')
+
+_metrics = None
+
+
+class RunMetrics:
+    """Counters for one script process."""
+
+    def __init__(self, script):
+        self.script = script
+        self.run_id = os.getenv("GITHUB_RUN_ID", "")
+        self.commit = os.getenv("GITHUB_SHA", "")[:7]
+        self.event = os.getenv("GITHUB_EVENT_NAME", "local")
+        self.argv = sys.argv[1:]
+        self.status = "ok"
+        self._t0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        self.requests = 0
+        self.writes = 0
+        self.errors = 0
+        self.bytes_up = 0
+        self.bytes_down = 0
+        self.hosts = Counter()
+        self.modules = Counter()
+        self.latency_s = Counter()
+        self.latency_hist = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+        self.sleep_s = 0.0
+        self.sleeps = 0
+        self.retries = 0
+        self.retry_sleep_s = 0.0
+        self._in_retry = False
+
+    def record_request(self, host, module, seconds, bytes_up, bytes_down, status):
+        self.requests += 1
+        self.hosts[host] += 1
+        self.modules[f"{host} {module}"] += 1
+        self.latency_s[host] += seconds
+        ms = seconds * 1000
+        bucket = next((i for i, edge in enumerate(LATENCY_BUCKETS_MS) if ms <= edge), len(LATENCY_BUCKETS_MS))
+        self.latency_hist[host][bucket] += 1
+        self.bytes_up += bytes_up
+        self.bytes_down += bytes_down
+        if status is None or status >= 400:
+            self.errors += 1
+        if module in WRITE_ACTIONS:
+            self.writes += 1
+
+    def record_sleep(self, seconds):
+        if self._in_retry:
+            self.retry_sleep_s += seconds
+        else:
+            self.sleep_s += seconds
+            self.sleeps += 1
+
+    def to_record(self):
+        return {
+            "script": self.script,
+            "run_id": self.run_id,
+            "commit": self.commit,
+            "event": self.event,
+            "argv": self.argv,
+            "status": self.status,
+            "wall_s": round(time.perf_counter() - self._t0, 3),
+            "cpu_s": round(time.process_time() - self._cpu0, 3),
+            "sleep_s": round(self.sleep_s, 3),
+            "sleeps": self.sleeps,
+            "retries": self.retries,
+            "retry_sleep_s": round(self.retry_sleep_s, 3),
+            "requests": self.requests,
+            "writes": self.writes,
+            "errors": self.errors,
+            "bytes_up": self.bytes_up,
+            "bytes_down": self.bytes_down,
+            "hosts": dict(self.hosts),
+            "modules": dict(self.modules),
+            "latency_s": {h: round(s, 3) for h, s in self.latency_s.items()},
+            "latency_buckets_ms": list(LATENCY_BUCKETS_MS),
+            "latency_hist": dict(self.latency_hist),
+        }
+
+
+def api_module(params, path=""):
+    """Name a call the way the counters do: the action, with query's list/prop/meta/generator."""
+    action = params.get("action", "")
+    if action == "query":
+        parts = [f"{k}={params[k]}" for k in ("meta", "list", "generator", "prop") if params.get(k)]
+        return "query:" + ",".join(parts)
+    if action:
+        return action
+    if params.get("title"):
+        return params["title"]
+    return path.rsplit("/", 1)[-1] or "/"
+
+
+def _params(url, body, content_type):
+    """The request parameters from the query string and a form-encoded or multipart body."""
+    params = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(url).query))
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if not isinstance(body, bytes):
+        return params
+    if "multipart/form-data" in (content_type or ""):
+        for name, value in MULTIPART_FIELD_RE.findall(body):
+            params[name.decode("utf-8", "replace")] = value.decode("utf-8", "replace")
+    else:
+        params.update(urllib.parse.parse_qsl(body.decode("utf-8", "replace")))
+    return params
+
+
+def _body_len(body):
+    if isinstance(body, (bytes, str)):
+        return len(body)
+    return 0
+
+
+def _patch_requests(metrics):
+    original = requests.adapters.HTTPAdapter.send
+
+    def send(self, request, *args, **kwargs):
+        parts = urllib.parse.urlsplit(request.url)
+        module = api_module(_params(request.url, request.body, request.headers.get("Content-Type")), parts.path)
+        start = time.perf_counter()
+        status, down = None, 0
+        try:
+            response = original(self, request, *args, **kwargs)
+            status = response.status_code
+            if kwargs.get("stream"):
+                down = int(response.headers.get("Content-Length") or 0)
+            else:
+                down = len(response.content)
+            return response
+        finally:
+            metrics.record_request(parts.hostname or "", module, time.perf_counter() - start,
+                                   _body_len(request.body), down, status)
+
+    requests.adapters.HTTPAdapter.send = send
+
+
+def _patch_urllib(metrics):
+    original = urllib.request.urlopen
+
+    def urlopen(url, data=None, *args, **kwargs):
+        full_url = url.full_url if isinstance(url, urllib.request.Request) else url
+        if data is None and isinstance(url, urllib.request.Request):
+            data = url.data
+        parts = urllib.parse.urlsplit(full_url)
+        module = api_module(_params(full_url, data, ""), parts.path)
+        start = time.perf_counter()
+        status, down = None, 0
+        try:
+            response = original(url, data, *args, **kwargs)
+            status = response.status
+            down = int(response.headers.get("Content-Length") or 0)
+            return response
+        except urllib.error.HTTPError as e:
+            status = e.code
+            raise
+        finally:
+            metrics.record_request(parts.hostname or "", module, time.perf_counter() - start,
+                                   _body_len(data), down, status)
+
+    urllib.request.urlopen = urlopen
+
+
+def _patch_sleep(metrics):
+    original = time.sleep
+
+    def sleep(seconds):
+        metrics.record_sleep(seconds)
+        return original(seconds)
+
+    time.sleep = sleep
+
+    try:
+        from mwclient.sleep import Sleeper
+    except ImportError:
+        return
+    original_retry = Sleeper.sleep
+
+    def retry_sleep(self, *args, **kwargs):
+        metrics.retries += 1
+        metrics._in_retry = True
+        try:
+            return original_retry(self, *args, **kwargs)
+        finally:
+            metrics._in_retry = False
+
+    Sleeper.sleep = retry_sleep
+
+
+def _write(path):
+    # Imported here: wiki.py imports this module.
+    from wiki import append_log
+    append_log(path, _metrics.to_record())
+
+
+def install(path, script=None):
+    """Start counting this process's traffic and append its record to path (if any) at exit. Idempotent."""
+    global _metrics
+    if _metrics is not None:
+        return _metrics
+    script = script or os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+    _metrics = RunMetrics(script)
+    _patch_requests(_metrics)
+    _patch_urllib(_metrics)
+    _patch_sleep(_metrics)
+
+    previous_hook = sys.excepthook
+
+    def excepthook(*exc_info):
+        _metrics.status = "error"
+        previous_hook(*exc_info)
+
+    sys.excepthook = excepthook
+    if path:
+        atexit.register(_write, path)
+    return _metrics
+
+
+def install_from_env():
+    """install() into the file named by WIKI_METRICS_LOG, if it is set."""
+    path = os.getenv(METRICS_LOG_ENV, "").strip()
+    if path:
+        return install(path)
+    return None
+
+
+def current():
+    """The RunMetrics for this process, or None if install() has not run."""
+    return _metrics
+
+
+def load_records(path, run_id=None):
+    """Records from a metrics log, only those of run_id if given."""
+    records = []
+    if not path or not os.path.exists(path):
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if run_id is None or record.get("run_id") == run_id:
+                records.append(record)
+    return records
+
+
+def summarize(records, home_host):
+    """One line of run totals, e.g. for the bot's status block."""
+    requests_ = sum(r.get("requests", 0) for r in records)
+    foreign = sum(n for r in records for host, n in r.get("hosts", {}).items() if host != home_host)
+    writes = sum(r.get("writes", 0) for r in records)
+    errors = sum(r.get("errors", 0) for r in records)
+    retries = sum(r.get("retries", 0) for r in records)
+    wall_min = sum(r.get("wall_s", 0) for r in records) / 60
+    sleep_min = sum(r.get("sleep_s", 0) + r.get("retry_sleep_s", 0) for r in records) / 60
+    per_write = f"{requests_ / writes:.1f}" if writes else "-"
+    rate = f"{writes / wall_min:.1f}" if wall_min else "-"
+    return (f"{len(records)} scripts, {requests_:,} requests ({foreign:,} to other wikis), "
+            f"{writes:,} writes ({per_write} requests/write, {rate} writes/min), "
+            f"{errors} errors, {retries} retries, {wall_min:.1f} min "
+            f"of which {sleep_min:.1f} min sleeping")
@@ -14,9 +14,7 @@ Examples:
 
 import argparse
 import datetime as dt
-import io
 import json
-import os
 import re
 import sys
 import time
@@ -26,12 +24,10 @@ from urllib.error import URLError, HTTPError
 
 import mwclient
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL, append_log, append_state, load_state
+
+sys.stdout.reconfigure(encoding="utf-8")
 
-WIKI_URL = "shinto.miraheze.org"
-WIKI_PATH = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "[REDACTED_SECRET_1]")
 THROTTLE = 1.5
 DEFAULT_STATE_FILE = "shinto_miraheze/migrate_talk_pages.state"
 DEFAULT_LOG_FILE = "shinto_miraheze/migrate_talk_pages.log"
@@ -75,30 +71,6 @@ def make_site():
     return site
 
 
-def load_state(path):
-    completed = set()
-    if not os.path.exists(path):
-        return completed
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            s = line.strip()
-            if s:
-                completed.add(s)
-    return completed
-
-
-def append_state(path, title):
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(title + "\n")
-
-
-def append_log(path, data):
-    payload = dict(data)
-    payload["ts_utc"] = dt.datetime.utcnow().isoformat(timespec="seconds") + "Z"
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(payload, ensure_ascii=False) + "\n")
-
-
 def extract_qid(page_text):
     m = QID_RE.search(page_text or "")
     return m.group(1).upper() if m else None
@@ -111,6 +83,7 @@ def get_sitelinks_from_wikidata(qid):
             "action": "wbgetentities",
             "ids": qid,
             "props": "sitelinks",
+            "sitefilter": "jawiki|enwiki|simplewiki",
             "format": "json",
         },
     )
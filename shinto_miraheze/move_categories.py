@@ -10,7 +10,8 @@ For each pair:
     - Source already has {{category move error|...}}.
 
   Tag if:
-    - Source exists AND destination also exists as a real page:
+    - Source exists AND destination also exists as a real page (or is the
+      destination of an earlier row in the CSV):
       Prepend {{category move error|DESTINATION}} to source page.
 
   Move if:
@@ -18,6 +19,21 @@ For each pair:
       1. Recategorize all members from source category to destination.
       2. Move source category page to destination (leaves redirect at source).
 
+The whole CSV is planned before anything is edited:
+  1. Source pages (with text) and destination pages are checked in batches
+     of 50 titles per request.
+  2. Members of every source to be moved are listed, and the renames that
+     apply to each member page are combined, so a page in several source
+     categories is read once and saved once.
+  3. Conflict tags are saved first. Then the renames run one group at a
+     time: a group is the renames that share member pages. Its member pages
+     are saved, then its category pages are moved. A group that no longer
+     fits in the remaining --max-edits is left for the next run, so a run
+     does not stop with members pointing at destinations not yet created.
+     A group larger than --max-edits on its own runs as far as the cap
+     allows; its remaining members are listed again next run. A group whose
+     member edits failed or were cut short is not moved.
+
 CSV format (header line required):
     source,destination
     Category:日本語名,Category:English Name
@@ -29,73 +45,170 @@ Usage:
 import os
 import re
 import time
-import io
 import sys
 import csv
 import argparse
 import mwclient
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+from category_rewrite import CategoryRewriter
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL
+
+sys.stdout.reconfigure(encoding="utf-8")
 
-WIKI_URL  = "shinto.miraheze.org"
-WIKI_PATH = "/w/"
-USERNAME  = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD  = os.getenv("WIKI_PASSWORD", "")
 THROTTLE  = 1.5
+BATCH_SIZE = 50  # max titles per API query
 
 REDIRECT_RE   = re.compile(r"^\s*#redirect\b", re.IGNORECASE | re.MULTILINE)
 MOVE_ERROR_RE = re.compile(r"\{\{\s*category[ _]move[ _]error\b", re.IGNORECASE)
 
 
-def recategorize_members(site, from_name, to_name, apply, run_tag, edit_counter, max_edits):
-    """Replace [[Category:from_name]] with [[Category:to_name]] on all member pages."""
-    cat = site.categories[from_name]
-    members = list(cat)
-    print(f"    {len(members)} member(s) to recategorize")
+def fetch_pages(site, titles, content=False):
+    """Return {title: (text, revid)} for existing pages among titles (text is "" when content=False).
 
-    pattern = re.compile(
-        r"\[\[Category:" + re.escape(from_name).replace(r"\ ", r"[_ ]") + r"(\|[^\]]*)??\]\]",
-        re.IGNORECASE,
-    )
+    Titles are looked up BATCH_SIZE per request; missing pages are absent
+    from the result. Keys are the titles as given, not the normalized ones.
+    """
+    found = {}
+    for i in range(0, len(titles), BATCH_SIZE):
+        batch = titles[i : i + BATCH_SIZE]
+        params = {"titles": "|".join(batch), "formatversion": 2}
+        if content:
+            params.update(prop="revisions", rvprop="ids|content", rvslots="main")
+        else:
+            params["prop"] = "info"
+        while True:
+            data = site.api("query", **params)
+            query = data.get("query", {})
+            normalized = {n["to"]: n["from"] for n in query.get("normalized", [])}
+            for page in query.get("pages", []):
+                if page.get("missing") or page.get("invalid"):
+                    continue
+                title = normalized.get(page["title"], page["title"])
+                if content:
+                    revisions = page.get("revisions") or []
+                    if not revisions:
+                        continue
+                    rev = revisions[0]
+                    found[title] = (rev.get("slots", {}).get("main", {}).get("content", ""), rev.get("revid"))
+                else:
+                    found[title] = ("", page.get("lastrevid"))
+            if "continue" in data:
+                params.update(data["continue"])
+            else:
+                break
+    return found
+
+
+def list_members(site, category):
+    """Return the titles of all members of Category:category."""
+    titles = []
+    params = {
+        "list": "categorymembers",
+        "cmtitle": f"Category:{category}",
+        "cmlimit": "max",
+    }
+    while True:
+        data = site.api("query", **params)
+        for entry in data.get("query", {}).get("categorymembers", []):
+            titles.append(entry["title"])
+        if "continue" in data:
+            params.update(data["continue"])
+        else:
+            break
+    return titles
 
-    for page in members:
-        if edit_counter[0] >= max_edits:
-            print("      MAX EDITS reached, stopping member recategorization.")
-            return
 
-        text = page.text()
-        new_text = pattern.sub(f"[[Category:{to_name}]]", text)
-        if new_text == text:
-            print(f"      SKIP (tag not found in wikitext): {page.name}")
-            continue
+def plan_moves(moves, sources, destinations):
+    """Classify each CSV row. Returns (skips, tags, renames) as lists of (src_full, dst_full[, reason]).
 
-        if not apply:
-            print(f"      DRY RUN: would recategorize {page.name}")
+    sources maps existing source titles to (text, revid); destinations is the
+    set of existing destination titles.
+    """
+    skips, tags, renames = [], [], []
+    claimed = set()
+    for src_full, dst_full in moves:
+        if src_full not in sources:
+            skips.append((src_full, dst_full, "source page does not exist"))
+            continue
+        src_text = sources[src_full][0]
+        if REDIRECT_RE.search(src_text):
+            skips.append((src_full, dst_full, "source is already a redirect"))
             continue
+        if MOVE_ERROR_RE.search(src_text):
+            skips.append((src_full, dst_full, "source already has {{category move error}}"))
+            continue
+        if dst_full in destinations or dst_full in claimed:
+            tags.append((src_full, dst_full))
+            continue
+        claimed.add(dst_full)
+        renames.append((src_full, dst_full))
+    return skips, tags, renames
 
-        summary = f"Bot: recategorize [[Category:{from_name}]] → [[Category:{to_name}]] {run_tag}".strip()
-        try:
-            page.save(new_text, summary=summary)
-            print(f"      RECATEGORIZED: {page.name}")
-            edit_counter[0] += 1
-        except Exception as e:
-            if "editconflict" in str(e).lower():
-                print(f"      CONFLICT on {page.name}, retrying...")
-                time.sleep(5)
-                try:
-                    fresh = page.text()
-                    fresh_new = pattern.sub(f"[[Category:{to_name}]]", fresh)
-                    if fresh_new != fresh:
-                        page.save(fresh_new, summary=summary)
-                        print(f"      RECATEGORIZED (retry): {page.name}")
-                        edit_counter[0] += 1
-                    else:
-                        print(f"      SKIP (already moved on retry): {page.name}")
-                except Exception as e2:
-                    print(f"      ERROR (retry failed): {page.name}: {e2}")
-            else:
-                print(f"      ERROR: {page.name}: {e}")
-        time.sleep(THROTTLE)
+
+def plan_member_edits(site, renames):
+    """Return {member title: [(src_name, dst_name), ...]} over all source categories to be moved."""
+    edits = {}
+    for src_full, dst_full in renames:
+        src_name = src_full.removeprefix("Category:")
+        dst_name = dst_full.removeprefix("Category:")
+        for title in list_members(site, src_name):
+            edits.setdefault(title, []).append((src_name, dst_name))
+    return edits
+
+
+def group_renames(renames, member_edits):
+    """Split renames into groups that share member pages.
+
+    Returns [(renames, member titles)] in CSV order of each group's first
+    rename. Every member page's renames fall in a single group, so the page
+    is saved once and all of its destinations are moved in the same group.
+    """
+    parent = list(range(len(renames)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    index = {src.removeprefix("Category:"): i for i, (src, _) in enumerate(renames)}
+    for pairs in member_edits.values():
+        first = find(index[pairs[0][0]])
+        for src_name, _ in pairs[1:]:
+            parent[find(index[src_name])] = first
+
+    groups = {}
+    for i, rename in enumerate(renames):
+        groups.setdefault(find(i), ([], []))[0].append(rename)
+    for title, pairs in member_edits.items():
+        groups[find(index[pairs[0][0]])][1].append(title)
+    return [(group, sorted(titles)) for group, titles in groups.values()]
+
+
+def save_with_retry(site, title, transform, summary, text=None, revid=None):
+    """Save transform(text) to title, retrying once on edit conflict. Returns True if saved.
+
+    text/revid come from a bulk read; if the page has been edited since, it
+    is re-read first.
+    """
+    page = site.pages[title]
+    if text is None or page.revision != revid:
+        text = page.text()
+    try:
+        page.save(transform(text), summary=summary)
+        return True
+    except Exception as e:
+        if "editconflict" not in str(e).lower():
+            raise
+        print(f"      CONFLICT on {title}, retrying...")
+        time.sleep(5)
+        page = site.pages[title]
+        fresh = page.text(cache=False)
+        fresh_new = transform(fresh)
+        if fresh_new == fresh:
+            return False
+        page.save(fresh_new, summary=summary)
+        return True
 
 
 def main():
@@ -126,101 +239,135 @@ def main():
             if src and dst:
                 moves.append((src, dst))
 
-    print(f"Loaded {len(moves)} move(s) from {args.csv}\n")
-
-    edit_counter = [0]
-    moved = tagged = skipped = errors = 0
+    print(f"Loaded {len(moves)} move(s) from {args.csv}")
 
-    for i, (src_full, dst_full) in enumerate(moves, 1):
-        if edit_counter[0] >= args.max_edits:
-            print("MAX EDITS reached, stopping.")
-            break
+    sources = fetch_pages(site, list(dict.fromkeys(src for src, _ in moves)), content=True)
+    destinations = set(fetch_pages(site, list(dict.fromkeys(dst for _, dst in moves))))
+    skips, tags, renames = plan_moves(moves, sources, destinations)
+    print(f"  {len(renames)} to move, {len(tags)} conflicts to tag, {len(skips)} to skip")
 
-        src_name = src_full.removeprefix("Category:")
-        dst_name = dst_full.removeprefix("Category:")
+    member_edits = plan_member_edits(site, renames)
+    pairs = sum(len(v) for v in member_edits.values())
+    print(f"  {len(member_edits)} member page(s) to recategorize ({pairs} page/category pairs)\n")
 
-        print(f"[{i}/{len(moves)}] {src_full} → {dst_full}")
+    edits = 0
+    skipped = len(skips)
+    tagged = moved = errors = 0
 
-        try:
-            src_page = site.pages[src_full]
-            if not src_page.exists:
-                print("  SKIP: source page does not exist")
-                skipped += 1
-                continue
-            src_text = src_page.text()
-        except Exception as e:
-            print(f"  ERROR reading source: {e}")
-            errors += 1
-            continue
+    def cap_reached():
+        return edits >= args.max_edits
 
-        if REDIRECT_RE.search(src_text):
-            print("  SKIP: source is already a redirect")
-            skipped += 1
-            continue
+    for src_full, dst_full, reason in skips:
+        print(f"SKIP {src_full} → {dst_full}: {reason}")
 
-        if MOVE_ERROR_RE.search(src_text):
-            print("  SKIP: source already has {{category move error}}")
-            skipped += 1
+    # 1. Conflict tags
+    for src_full, dst_full in tags:
+        if cap_reached():
+            break
+        dst_name = dst_full.removeprefix("Category:")
+        print(f"CONFLICT: {dst_full} already exists → adding {{{{category move error|{dst_name}}}}} to {src_full}")
+        if not args.apply:
+            print(f"  DRY RUN: would tag {src_full}")
+            tagged += 1
             continue
-
+        summary = (
+            f"Bot: flag category move conflict, [[Category:{dst_name}]] already exists {args.run_tag}"
+        ).strip()
         try:
-            dst_page = site.pages[dst_full]
-            dst_exists = dst_page.exists
+            save_with_retry(
+                site, src_full, lambda text: "{{category move error|" + dst_name + "}}\n" + text, summary,
+                *sources[src_full],
+            )
+            print(f"  TAGGED: {src_full}")
+            edits += 1
+            tagged += 1
         except Exception as e:
-            print(f"  ERROR checking destination: {e}")
+            print(f"  ERROR tagging: {e}")
             errors += 1
+        time.sleep(THROTTLE)
+
+    # 2. One group of renames at a time: its member pages, then its category moves
+    rewriter = CategoryRewriter(rename={
+        src.removeprefix("Category:"): dst.removeprefix("Category:") for src, dst in renames
+    })
+    deferred = 0
+    groups = group_renames(renames, member_edits)
+    for n, (group, titles) in enumerate(groups):
+        if cap_reached():
+            deferred += sum(len(g) for g, _ in groups[n:])
+            print("MAX EDITS reached, leaving the remaining moves for the next run.")
+            break
+        cost = len(titles) + len(group)
+        if edits + cost > args.max_edits and cost <= args.max_edits:
+            print(f"DEFER {', '.join(src for src, _ in group)}: {cost} edit(s) left for the next run")
+            deferred += len(group)
             continue
 
-        if dst_exists:
-            # Both source and destination exist — tag source with conflict marker
-            print(f"  CONFLICT: destination already exists → adding {{{{category move error|{dst_name}}}}}")
-            new_src_text = "{{category move error|" + dst_name + "}}\n" + src_text
-            if not args.apply:
-                print(f"  DRY RUN: would tag {src_full}")
-            else:
-                summary = (
-                    f"Bot: flag category move conflict, [[Category:{dst_name}]] already exists {args.run_tag}"
-                ).strip()
+        # Member pages, one save each with every applicable rename
+        complete = True
+        for i in range(0, len(titles), BATCH_SIZE):
+            if cap_reached():
+                complete = False
+                break
+            texts = fetch_pages(site, titles[i : i + BATCH_SIZE], content=True)
+            for title in titles[i : i + BATCH_SIZE]:
+                if cap_reached():
+                    print("MAX EDITS reached, stopping member recategorization.")
+                    complete = False
+                    break
+                if title not in texts:
+                    continue
+                text, revid = texts[title]
+                new_text, changes = rewriter.apply(text)
+                if not changes:
+                    print(f"      SKIP (tag not found in wikitext): {title}")
+                    continue
+                if not args.apply:
+                    print(f"      DRY RUN: would recategorize {title} ({len(changes)} tag(s))")
+                    continue
+                links = ", ".join(f"[[Category:{old}]] → [[Category:{new}]]" for old, new in changes if new)
+                summary = f"Bot: recategorize {links} {args.run_tag}".strip()
                 try:
-                    src_page.save(new_src_text, summary=summary)
-                    print(f"  TAGGED: {src_full}")
-                    edit_counter[0] += 1
+                    if save_with_retry(site, title, lambda t: rewriter.apply(t)[0], summary, text, revid):
+                        print(f"      RECATEGORIZED: {title}")
+                        edits += 1
+                    else:
+                        print(f"      SKIP (already moved on retry): {title}")
                 except Exception as e:
-                    print(f"  ERROR tagging: {e}")
+                    print(f"      ERROR: {title}: {e}")
                     errors += 1
-                    continue
+                    complete = False
                 time.sleep(THROTTLE)
-            tagged += 1
-            continue
-
-        # Destination does not exist — perform the move
-        print("  ACTION: recategorize members then move category page")
-        recategorize_members(
-            site, src_name, dst_name, args.apply, args.run_tag, edit_counter, args.max_edits
-        )
 
-        if edit_counter[0] >= args.max_edits:
-            print("  MAX EDITS reached after recategorizing members, skipping page move.")
-            break
+        if not complete:
+            print(f"Not moving {', '.join(src for src, _ in group)}: member pages left for the next run.")
+            deferred += len(group)
+            continue
 
-        if not args.apply:
-            print(f"  DRY RUN: would move {src_full} → {dst_full}")
-        else:
+        # Category page moves, once every member is recategorized
+        for src_full, dst_full in group:
+            if cap_reached():
+                print("MAX EDITS reached, skipping remaining page moves.")
+                deferred += 1
+                continue
+            if not args.apply:
+                print(f"DRY RUN: would move {src_full} → {dst_full}")
+                moved += 1
+                continue
             summary = f"Bot: move untranslated category to English equivalent {args.run_tag}".strip()
             try:
-                src_page.move(dst_full, reason=summary, no_redirect=False)
-                print(f"  MOVED: {src_full} → {dst_full}")
-                edit_counter[0] += 1
+                site.pages[src_full].move(dst_full, reason=summary, no_redirect=False)
+                print(f"MOVED: {src_full} → {dst_full}")
+                edits += 1
+                moved += 1
             except Exception as e:
-                print(f"  ERROR moving page: {e}")
+                print(f"ERROR moving {src_full}: {e}")
                 errors += 1
-                continue
             time.sleep(THROTTLE)
-        moved += 1
 
     print(f"\n{'=' * 60}")
-    print(f"Done. Moved: {moved} | Conflict-tagged: {tagged} | Skipped: {skipped} | Errors: {errors}")
-    print(f"Total edits made: {edit_counter[0]}")
+    print(f"Done. Moved: {moved} | Deferred: {deferred} | Conflict-tagged: {tagged} | Skipped: {skipped} | Errors: {errors}")
+    print(f"Total edits made: {edits}")
 
 
 if __name__ == "__main__":
@@ -15,25 +15,24 @@ Output layout:
 ...category links...
 
 Default mode is dry-run. Use --apply to save.
+
+A full --apply scan first asks recentchanges whether any category page was
+created, moved or deleted since the last complete scan (sweep_probe.py) and
+exits at once if not. --full-sweep skips that check.
 """
 
 import argparse
-import datetime as dt
-import io
-import json
-import os
 import re
 import sys
 import time
 
 import mwclient
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+from sweep_probe import clear_sweep, created_since, load_last_sweep, now_utc, record_sweep
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL, append_log, append_state, iter_allpages, load_state
+
+sys.stdout.reconfigure(encoding="utf-8")
 
-WIKI_URL = "shinto.miraheze.org"
-WIKI_PATH = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "[REDACTED_SECRET_1]")
 THROTTLE = 1.5
 DEFAULT_STATE_FILE = "shinto_miraheze/normalize_category_pages.state"
 DEFAULT_LOG_FILE = "shinto_miraheze/normalize_category_pages.log"
@@ -114,51 +113,6 @@ def build_normalized_text(text):
     return "\n".join(lines).rstrip() + "\n"
 
 
-def iter_category_titles(site, start_title=None, include_redirects=False):
-    params = {
-        "list": "allpages",
-        "apnamespace": 14,
-        "aplimit": "max",
-    }
-    if not include_redirects:
-        params["apfilterredir"] = "nonredirects"
-    if start_title:
-        params["apfrom"] = start_title
-
-    while True:
-        result = site.api("query", **params)
-        for entry in result.get("query", {}).get("allpages", []):
-            yield entry["title"]
-        if "continue" in result:
-            params.update(result["continue"])
-        else:
-            break
-
-
-def load_state(path):
-    completed = set()
-    if not os.path.exists(path):
-        return completed
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            s = line.strip()
-            if s:
-                completed.add(s)
-    return completed
-
-
-def append_state(path, title):
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(title + "\n")
-
-
-def append_log(path, data):
-    payload = dict(data)
-    payload["ts_utc"] = dt.datetime.utcnow().isoformat(timespec="seconds") + "Z"
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(payload, ensure_ascii=False) + "\n")
-
-
 def parse_titles_arg(titles_arg):
     if not titles_arg:
         return []
@@ -175,6 +129,11 @@ def parse_titles_file(path):
     return titles
 
 
+def has_work(site, state_file):
+    """False if no category page was created, moved or deleted since the last complete scan; None if unknown."""
+    return created_since(site, 14, load_last_sweep(state_file))
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--apply", action="store_true", help="Save edits (default is dry-run).")
@@ -187,6 +146,8 @@ def main():
     parser.add_argument("--include-redirects", action="store_true", help="Include redirect category pages.")
     parser.add_argument("--state-file", default=DEFAULT_STATE_FILE, help="Path to resume-state file.")
     parser.add_argument("--log-file", default=DEFAULT_LOG_FILE, help="Path to JSONL run log.")
+    parser.add_argument("--full-sweep", action="store_true",
+                        help="Scan all category pages even if nothing changed since the last complete scan.")
     args = parser.parse_args()
 
     site = mwclient.Site(
@@ -207,12 +168,20 @@ def main():
         explicit_titles.extend(parse_titles_file(args.titles_file))
     explicit_titles = list(dict.fromkeys(explicit_titles))
 
+    sweep_started = now_utc()
+    full_scan = args.apply and not explicit_titles and not args.start_title
+    if full_scan and not args.full_sweep and has_work(site, args.state_file) is False:
+        print(f"No category pages created, moved or deleted since the last complete scan "
+              f"({load_last_sweep(args.state_file):%Y-%m-%d %H:%M}Z); nothing to do.")
+        return
+
     if explicit_titles:
         titles_iter = iter(explicit_titles)
         print(f"Processing explicit list: {len(explicit_titles)} categories")
     else:
-        titles_iter = iter_category_titles(
+        titles_iter = iter_allpages(
             site,
+            14,
             start_title=args.start_title or None,
             include_redirects=args.include_redirects,
         )
@@ -220,12 +189,15 @@ def main():
 
     processed = edited = skipped = errors = 0
     api_nochange = 0
+    stopped = False
 
     for title in titles_iter:
         if args.max_edits and edited >= args.max_edits:
             print(f"Reached max edits ({args.max_edits}); stopping run.")
+            stopped = True
             break
         if args.limit and processed >= args.limit:
+            stopped = True
             break
         if not title.startswith("Category:"):
             title = f"Category:{title}"
@@ -305,6 +277,10 @@ def main():
         f"Skipped: {skipped} | Errors: {errors} | Mode: {'APPLY' if args.apply else 'DRY-RUN'}"
     )
     print(f"API nochange responses: {api_nochange}")
+    if full_scan and errors:
+        clear_sweep(args.state_file)
+    elif full_scan and not stopped:
+        record_sweep(args.state_file, sweep_started)
 
 
 if __name__ == "__main__":
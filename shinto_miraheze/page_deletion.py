@@ -0,0 +1,244 @@
+"""
+page_deletion.py
+================
+Shared pre-deletion verification for the delete_* cleanup scripts.
+
+Special-page results (Special:UnusedCategories, Special:UnusedTemplates,
+Special:OrphanedTalkPages) come from a cached querypage table that can be
+days old. Before a title is deleted it is re-checked against live data,
+50 titles per request:
+
+- the page still exists
+- categories: still empty (prop=categoryinfo)
+- templates: still not transcluded anywhere (prop=transcludedin)
+- talk pages: the subject page still does not exist (prop=info, inprop=subjectid)
+- the page is not in an exemption set (e.g. pages transcluding
+  {{Possibly empty category}}, loaded once with list=embeddedin)
+
+Verified titles are then deleted by DeletionExecutor, which keeps a small
+number of deletes in flight with a prefetched CSRF token, spaces request
+starts to stay polite to the host, pauses everyone when the API reports
+"ratelimited" (or HTTP 429), and records each outcome to a JSONL log.
+
+Not a standalone script; imported by the delete_* scripts.
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import mwclient
+import requests
+
+from wiki import append_log
+
+VERIFY_BATCH = 50  # max titles per API query
+DEFAULT_WORKERS = 3  # deletes in flight at once
+MIN_INTERVAL = 0.5  # seconds between delete request starts
+RATELIMIT_BACKOFF = 60  # seconds to pause all workers after a ratelimit response
+MAX_ATTEMPTS = 3
+
+
+def load_embeddedin(site, template, namespace=None):
+    """Return the set of page titles that transclude the given template."""
+    params = {
+        "list": "embeddedin",
+        "eititle": template,
+        "eilimit": "max",
+    }
+    if namespace is not None:
+        params["einamespace"] = namespace
+    titles = set()
+    while True:
+        data = site.api("query", **params)
+        for entry in data.get("query", {}).get("embeddedin", []):
+            titles.add(entry["title"])
+        if "continue" in data:
+            params.update(data["continue"])
+        else:
+            break
+    return titles
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def check_batch(site, titles, require_empty=False, require_untranscluded=False,
+                require_orphaned=False, exempt=()):
+    """Verify up to VERIFY_BATCH titles in one query (plus continuations).
+
+    Returns {title: skip_reason}, where skip_reason is None for titles that
+    are safe to delete.
+    """
+    props = ["info"]
+    params = {"titles": "|".join(titles), "formatversion": 2}
+    if require_empty:
+        props.append("categoryinfo")
+    if require_untranscluded:
+        props.append("transcludedin")
+        params["tiprop"] = "pageid"
+        params["tilimit"] = "max"
+    if require_orphaned:
+        params["inprop"] = "subjectid"
+    params["prop"] = "|".join(props)
+
+    pages = {}
+    while True:
+        data = site.api("query", **params)
+        query = data.get("query", {})
+        normalized = {n["to"]: n["from"] for n in query.get("normalized", [])}
+        for page in query.get("pages", []):
+            title = normalized.get(page["title"], page["title"])
+            merged = pages.setdefault(title, {})
+            transcluded = merged.get("transcludedin", []) + page.get("transcludedin", [])
+            merged.update(page)
+            merged["transcludedin"] = transcluded
+        if "continue" in data:
+            params.update(data["continue"])
+        else:
+            break
+
+    verdicts = {}
+    for title in titles:
+        page = pages.get(title)
+        if page is None or page.get("missing") or page.get("invalid"):
+            verdicts[title] = "missing"
+        elif title in exempt:
+            verdicts[title] = "exempt"
+        elif require_empty and page.get("categoryinfo", {}).get("size", 0) > 0:
+            verdicts[title] = "category no longer empty"
+        elif require_untranscluded and page["transcludedin"]:
+            verdicts[title] = "template is transcluded"
+        elif require_orphaned and "subjectid" in page:
+            verdicts[title] = "subject page exists"
+        else:
+            verdicts[title] = None
+    return verdicts
+
+
+def iter_verified(site, titles, **checks):
+    """Yield (title, skip_reason) for each title, verifying them VERIFY_BATCH at a time.
+
+    Keyword arguments are passed through to check_batch. Titles are consumed
+    lazily, so callers that stop early do not verify the whole list.
+    """
+    for batch in _batched(titles, VERIFY_BATCH):
+        verdicts = check_batch(site, batch, **checks)
+        for title in batch:
+            yield title, verdicts[title]
+
+
+class DeletionExecutor:
+    """Runs page deletions with bounded concurrency against one wiki host."""
+
+    def __init__(self, site, reason, log_file, workers=DEFAULT_WORKERS, min_interval=MIN_INTERVAL):
+        self.site = site
+        self.reason = reason
+        self.log_file = log_file
+        self.workers = max(1, workers)
+        self.min_interval = min_interval
+        self.token = site.get_token("csrf")
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+        self._paused_until = 0.0
+
+    def _wait_turn(self):
+        """Block until this worker may start a request (spacing + ratelimit pause)."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start, self._paused_until)
+            self._next_start = start + self.min_interval
+        delay = start - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _delete_one(self, title):
+        """Delete one page. Returns (status, error) where status is "deleted", "missing" or "error"."""
+        last_error = None
+        for _attempt in range(MAX_ATTEMPTS):
+            self._wait_turn()
+            try:
+                self.site.api("delete", title=title, reason=self.reason, token=self.token)
+                return "deleted", None
+            except mwclient.errors.APIError as e:
+                last_error = e
+                if e.code == "ratelimited":
+                    self._pause(RATELIMIT_BACKOFF)
+                    continue
+                if e.code == "badtoken":
+                    with self._lock:
+                        self.token = self.site.get_token("csrf", force=True)
+                    continue
+                if e.code == "missingtitle":
+                    return "missing", None
+                return "error", str(e)
+            except requests.exceptions.HTTPError as e:
+                last_error = e
+                if e.response is not None and e.response.status_code == 429:
+                    retry_after = e.response.headers.get("Retry-After", "")
+                    self._pause(int(retry_after) if retry_after.isdigit() else RATELIMIT_BACKOFF)
+                    continue
+                return "error", str(e)
+            except Exception as e:
+                return "error", str(e)
+        return "error", f"gave up after {MAX_ATTEMPTS} attempts: {last_error}"
+
+    def run(self, titles, max_deletes=0):
+        """Delete titles from an iterable, stopping cleanly after max_deletes (0 = no limit).
+
+        Titles are pulled lazily, so an upstream verification generator only
+        runs as far as needed. Returns (deleted, errors).
+        """
+        deleted = errors = 0
+        in_flight = {}
+
+        def collect(done):
+            nonlocal deleted, errors
+            for future in done:
+                title = in_flight.pop(future)
+                status, error = future.result()
+                if status == "deleted":
+                    deleted += 1
+                    print(f"{title} DELETED")
+                    append_log(self.log_file, {"title": title, "status": "deleted"})
+                elif status == "missing":
+                    print(f"{title} SKIP (already deleted)")
+                    append_log(self.log_file, {"title": title, "status": "skipped_missing"})
+                else:
+                    errors += 1
+                    print(f"{title} ERROR deleting: {error}")
+                    append_log(self.log_file, {"title": title, "status": "error_delete", "error": error})
+
+        remaining = iter(titles)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                while len(in_flight) >= self.workers:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                # Never queue more deletes than the cap allows; if in-flight
+                # work could fill it, drain first and re-check.
+                if max_deletes and deleted + len(in_flight) >= max_deletes:
+                    done, _ = wait(in_flight)
+                    collect(done)
+                    if deleted >= max_deletes:
+                        print(f"Reached max deletions ({max_deletes}); stopping run.")
+                        break
+                title = next(remaining, None)
+                if title is None:
+                    break
+                in_flight[pool.submit(self._delete_one, title)] = title
+            done, _ = wait(in_flight)
+            collect(done)
+        return deleted, errors
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+profiling.py
+============
+Profiles a script run and splits its wall time into network wait, sleep and
+CPU, so optimization work goes to where the time actually went.
+
+When WIKI_PROFILE_DIR is set (cleanup_loop.sh --profile sets it to a run
+directory), wiki.py starts profiling on import. At exit the script writes
+three files to that directory, numbered in run order:
+
+    NN_<script>.pstats     cProfile stats of the main thread
+                           (python -m pstats, snakeviz, ...)
+    NN_<script>.collapsed  sampled stacks of all threads, one
+                           "frame;frame;frame count" line per stack, the
+                           input format of flamegraph.pl and speedscope
+    NN_<script>.json       wall / network / sleep / CPU breakdown
+
+Network and sleep time come from the metrics.py counters: the time spent
+inside HTTP calls, and in time.sleep and mwclient's retry back-off. CPU time
+is the process's CPU time. "other" is what is left, e.g. disk I/O or
+waiting on worker processes. Network time is summed over threads, so with
+the delete_* scripts' worker threads it can exceed the wall time.
+
+Usage:
+    python3 shinto_miraheze/profiling.py run [--out DIR] shinto_miraheze/remove_crud_categories.py --apply ...
+    python3 shinto_miraheze/profiling.py report shinto_miraheze/profiles/run-123 [--top 25]
+"""
+
+import argparse
+import atexit
+import cProfile
+import glob
+import json
+import os
+import pstats
+import runpy
+import sys
+import threading
+import time
+from collections import Counter
+
+import metrics
+
+PROFILE_DIR_ENV = "WIKI_PROFILE_DIR"
+DEFAULT_PROFILE_DIR = "shinto_miraheze/profiles"
+SAMPLE_INTERVAL = 0.005
+
+_profile = None
+
+
+class StackSampler(threading.Thread):
+    """Samples the stacks of all other threads every SAMPLE_INTERVAL seconds."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, "thread"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class ScriptProfile:
+    """A cProfile profiler and a stack sampler for one script process."""
+
+    def __init__(self, out_dir, script):
+        self.out_dir = out_dir
+        self.script = script
+        self.metrics = metrics.install(os.getenv(metrics.METRICS_LOG_ENV, "").strip() or None)
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler()
+        self._t0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+
+    def start(self):
+        self.sampler.start()
+        self.profiler.enable()
+
+    def breakdown(self):
+        wall = time.perf_counter() - self._t0
+        cpu = time.process_time() - self._cpu0
+        network = sum(self.metrics.latency_s.values())
+        sleep = self.metrics.sleep_s + self.metrics.retry_sleep_s
+        return {
+            "script": self.script,
+            "argv": sys.argv[1:],
+            "wall_s": round(wall, 3),
+            "network_s": round(network, 3),
+            "sleep_s": round(sleep, 3),
+            "cpu_s": round(cpu, 3),
+            "other_s": round(max(0.0, wall - network - sleep - cpu), 3),
+            "requests": self.metrics.requests,
+            "samples": self.sampler.samples,
+        }
+
+    def stop(self):
+        """Stop profiling and write the .pstats, .collapsed and .json files."""
+        self.profiler.disable()
+        self.sampler.stop()
+        os.makedirs(self.out_dir, exist_ok=True)
+        n = len(glob.glob(os.path.join(self.out_dir, "*.json"))) + 1
+        base = os.path.join(self.out_dir, f"{n:02d}_{self.script}")
+
+        self.profiler.dump_stats(base + ".pstats")
+        with open(base + ".collapsed", "w", encoding="utf-8") as f:
+            for stack, count in self.sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        summary = self.breakdown()
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+            f.write("\n")
+        print(f"[profile] {self.script}: wall {summary['wall_s']:.1f}s = network {summary['network_s']:.1f}s"
+              f" + sleep {summary['sleep_s']:.1f}s + CPU {summary['cpu_s']:.1f}s"
+              f" + other {summary['other_s']:.1f}s -> {base}.*", file=sys.stderr, flush=True)
+
+
+def install(out_dir, script=None):
+    """Start profiling this process; the results are written to out_dir at exit. Idempotent."""
+    global _profile
+    if _profile is not None:
+        return _profile
+    script = script or os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+    _profile = ScriptProfile(out_dir, script)
+    _profile.start()
+    atexit.register(_profile.stop)
+    return _profile
+
+
+def install_from_env():
+    """install() into the directory named by WIKI_PROFILE_DIR, if it is set."""
+    out_dir = os.getenv(PROFILE_DIR_ENV, "").strip()
+    if out_dir:
+        return install(out_dir)
+    return None
+
+
+def report(out_dir, top=20):
+    """Print the per-script breakdowns in out_dir and the hottest functions across all of them."""
+    rows = []
+    for path in sorted(glob.glob(os.path.join(out_dir, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            rows.append((os.path.basename(path)[:-5], json.load(f)))
+    if not rows:
+        print(f"No profiles in {out_dir}")
+        return
+
+    print(f"{'stage':<48} {'wall s':>8} {'network':>8} {'sleep':>8} {'CPU':>8} {'other':>8}")
+    print("-" * 92)
+    totals = Counter()
+    for name, row in rows:
+        print(f"{name:<48} {row['wall_s']:>8.1f} {row['network_s']:>8.1f} {row['sleep_s']:>8.1f}"
+              f" {row['cpu_s']:>8.1f} {row['other_s']:>8.1f}")
+        for key in ("wall_s", "network_s", "sleep_s", "cpu_s", "other_s"):
+            totals[key] += row[key]
+    wall = totals["wall_s"] or 1.0
+    print("-" * 92)
+    print(f"{'TOTAL':<48} {totals['wall_s']:>8.1f} {totals['network_s']:>8.1f} {totals['sleep_s']:>8.1f}"
+          f" {totals['cpu_s']:>8.1f} {totals['other_s']:>8.1f}")
+    print(f"{'':<48} {'':>8} {totals['network_s'] / wall:>8.0%} {totals['sleep_s'] / wall:>8.0%}"
+          f" {totals['cpu_s'] / wall:>8.0%} {totals['other_s'] / wall:>8.0%}")
+
+    stats_files = [os.path.join(out_dir, name + ".pstats") for name, _ in rows]
+    stats_files = [p for p in stats_files if os.path.exists(p)]
+    if stats_files:
+        print(f"\nTop {top} functions by own time, all stages:")
+        stats = pstats.Stats(*stats_files, stream=sys.stdout)
+        stats.sort_stats("tottime").print_stats(top)
+
+
+def run_script(out_dir, script, argv):
+    """Run script as __main__ with profiling, the way cleanup_loop.sh runs it."""
+    sys.argv = [script] + list(argv)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    install(out_dir, os.path.splitext(os.path.basename(script))[0])
+    runpy.run_path(script, run_name="__main__")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Run a script with profiling.")
+    run.add_argument("--out", default=os.getenv(PROFILE_DIR_ENV) or DEFAULT_PROFILE_DIR,
+                     help="Directory for the profile files.")
+    run.add_argument("script")
+    run.add_argument("args", nargs=argparse.REMAINDER)
+
+    rep = sub.add_parser("report", help="Summarize the profiles in a run directory.")
+    rep.add_argument("dir")
+    rep.add_argument("--top", type=int, default=20, help="Number of hottest functions to list.")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run_script(args.out, args.script, args.args)
+    else:
+        report(args.dir, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+qid_index.py
+============
+Local index of every Q{QID} mainspace page on shintowiki.
+
+Each Q page is either a redirect (#REDIRECT [[Category:X]]) or, when several
+categories claim the same QID, a disambiguation list:
+
+    # [[:Category:X]]
+    # [[:Category:Y]]
+    [[Category:duplicated qid category redirects]]
+
+The index keeps, per QID: the page's revid, its redirect target (or None),
+its list entries, and the categories tagged on the page. It is stored as
+JSONL (one Q page per line) in qid_index.state and refreshed incrementally:
+
+1. generator=allpages (gapprefix=Q, 500 per request) with prop=info gives
+   every Q page's lastrevid
+2. only pages whose lastrevid differs from the stored revid are re-read,
+   50 per request
+3. pages that no longer exist are dropped
+
+Scripts can then answer "does Q123 exist", "which category does Q123 point
+to" and "which QIDs are duplicated" in memory instead of one request per
+QID.
+
+Not a standalone script; imported by the QID redirect scripts.
+
+    from qid_index import QidIndex
+    index = QidIndex.load()
+    index.refresh(site)
+    index.category_target("Q12345")   # "Foo" for #REDIRECT [[Category:Foo]]
+"""
+
+import json
+import os
+import re
+
+DEFAULT_INDEX_FILE = "shinto_miraheze/qid_index.state"
+CONTENT_BATCH = 50  # max titles per content query
+
+QID_TITLE_RE = re.compile(r"^Q\d+$")
+REDIRECT_RE = re.compile(r"^#REDIRECT\s*\[\[(.+?)\]\]", re.IGNORECASE | re.MULTILINE)
+LIST_RE = re.compile(r"^#\s*\[\[:([^\]|]+)", re.MULTILINE)
+CATEGORY_RE = re.compile(r"\[\[\s*Category\s*:\s*([^\]|]+)", re.IGNORECASE)
+
+
+def parse_qid_page(text):
+    """Return (redirect target or None, list entries, categories) for Q page text."""
+    m = REDIRECT_RE.search(text)
+    if m:
+        return m.group(1).strip().lstrip(":"), [], []
+    entries = [e.strip() for e in LIST_RE.findall(text)]
+    categories = [c.strip() for c in CATEGORY_RE.findall(text)]
+    return None, entries, categories
+
+
+class QidIndex:
+    """In-memory table of Q pages, loaded from and saved to a JSONL state file."""
+
+    def __init__(self, path=DEFAULT_INDEX_FILE):
+        self.path = path
+        self.pages = {}  # qid -> {"revid", "redirect", "entries", "categories"}
+
+    @classmethod
+    def load(cls, path=DEFAULT_INDEX_FILE):
+        index = cls(path)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    entry = json.loads(line)
+                    index.pages[entry.pop("qid")] = entry
+        return index
+
+    def save(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            for qid in sorted(self.pages, key=lambda q: int(q[1:])):
+                f.write(json.dumps({"qid": qid, **self.pages[qid]}, ensure_ascii=False) + "\n")
+
+    # ── Refresh ────────────────────────────────────────────
+
+    def _list_revids(self, site):
+        """Return {qid: lastrevid} for every Q\\d+ page in the main namespace."""
+        revids = {}
+        params = {
+            "generator": "allpages",
+            "gapnamespace": 0,
+            "gapprefix": "Q",
+            "gaplimit": "max",
+            "prop": "info",
+            "formatversion": 2,
+        }
+        while True:
+            data = site.api("query", **params)
+            for page in data.get("query", {}).get("pages", []):
+                if QID_TITLE_RE.match(page["title"]):
+                    revids[page["title"]] = page.get("lastrevid")
+            if "continue" in data:
+                params.update(data["continue"])
+            else:
+                break
+        return revids
+
+    def _fetch(self, site, qids):
+        """Re-read and re-parse the given Q pages, CONTENT_BATCH per request."""
+        for i in range(0, len(qids), CONTENT_BATCH):
+            batch = qids[i : i + CONTENT_BATCH]
+            params = {
+                "prop": "revisions",
+                "rvprop": "ids|content",
+                "rvslots": "main",
+                "titles": "|".join(batch),
+                "formatversion": 2,
+            }
+            while True:
+                data = site.api("query", **params)
+                for page in data.get("query", {}).get("pages", []):
+                    if page.get("missing"):
+                        self.pages.pop(page["title"], None)
+                        continue
+                    revisions = page.get("revisions") or []
+                    if not revisions:
+                        continue
+                    rev = revisions[0]
+                    text = rev.get("slots", {}).get("main", {}).get("content", "")
+                    self.record(page["title"], text, revid=rev.get("revid"))
+                if "continue" in data:
+                    params.update(data["continue"])
+                else:
+                    break
+
+    def refresh(self, site, save=True):
+        """Bring the index up to date. Returns (fetched, removed) counts."""
+        revids = self._list_revids(site)
+        removed = [qid for qid in self.pages if qid not in revids]
+        for qid in removed:
+            del self.pages[qid]
+        stale = [qid for qid, revid in revids.items() if self.pages.get(qid, {}).get("revid") != revid]
+        self._fetch(site, stale)
+        if save:
+            self.save()
+        return len(stale), len(removed)
+
+    def record(self, qid, text, revid=None):
+        """Store a Q page's current text. Use revid=None after a local save so the next refresh re-reads it."""
+        redirect, entries, categories = parse_qid_page(text)
+        self.pages[qid] = {
+            "revid": revid,
+            "redirect": redirect,
+            "entries": entries,
+            "categories": categories,
+        }
+
+    # ── Lookups ────────────────────────────────────────────
+
+    def __contains__(self, qid):
+        return qid in self.pages
+
+    def __len__(self):
+        return len(self.pages)
+
+    def redirect_target(self, qid):
+        """Full redirect target title of Q page, or None."""
+        return self.pages.get(qid, {}).get("redirect")
+
+    def category_target(self, qid):
+        """Bare category name the Q page redirects to, or None if it is not a category redirect."""
+        target = self.redirect_target(qid)
+        if target and target[:9].lower() == "category:":
+            return target[9:].strip()
+        return None
+
+    def entries(self, qid):
+        """Titles listed on a duplicate-disambiguation Q page (empty for redirects)."""
+        return self.pages.get(qid, {}).get("entries", [])
+
+    def has_category(self, qid, category):
+        wanted = category.replace("_", " ").casefold()
+        return any(c.replace("_", " ").casefold() == wanted for c in self.pages.get(qid, {}).get("categories", []))
+
+    def duplicated(self):
+        """QIDs whose page is a disambiguation list of two or more titles."""
+        return sorted((q for q, p in self.pages.items() if len(p.get("entries", [])) > 1), key=lambda q: int(q[1:]))
+
+    def qids_by_target(self):
+        """Return {target title: [qids]} over redirects and list entries."""
+        by_target = {}
+        for qid, page in self.pages.items():
+            targets = [page["redirect"]] if page.get("redirect") else page.get("entries", [])
+            for target in targets:
+                by_target.setdefault(target, []).append(qid)
+        return by_target
@@ -2,47 +2,67 @@
 """
 reimport_from_enwiki.py
 ========================
-Downloads XML exports from enwiki (with templates, current revision only)
-and reimports them into shintowiki with mangled timestamps so that the
-import always overwrites the current revision.
+Downloads XML exports from enwiki (current revision only) and reimports
+them into shintowiki with mangled timestamps so that the import always
+overwrites the current revision.
 
-This fixes erroneous transclusions by pulling the full dependency tree
-(templates, modules) from enwiki in one shot.
+This fixes erroneous transclusions by pulling the dependency tree
+(templates, modules) of each listed page from enwiki.
 
 **How it works:**
-1. Read page titles from a text file (one per line).
-2. For each page, download its XML via enwiki Special:Export with
-   ``templates=1`` and ``curonly=1``.
-3. Replace ``timestamp`` with ``timestam`` in the XML so MediaWiki
+1. Read page titles from a text file (one per line) and take the next
+   ``--max-imports`` pending ones.
+2. Plan the import for all of them at once:
+   - resolve each title on enwiki (unprefixed titles fall back to
+     ``Template:``), 50 per request
+   - collect every template/module each one transcludes
+     (``prop=templates``; enwiki's templatelinks are already transitive),
+     and take the union across titles
+   - compare each page's enwiki ``sha1`` with the local revision's
+     ``sha1`` (``prop=revisions``, 50 per request on each wiki)
+   Only pages that are missing locally or differ are exported; the shared
+   citation and navbox modules are imported once, not once per title.
+3. Download the differing pages from enwiki Special:Export in multi-page
+   exports of at most ``EXPORT_MAX_PAGES`` pages / ``EXPORT_MAX_BYTES``.
+4. Rename the ``<timestamp>`` elements to ``<timestam>`` so MediaWiki
    treats the import as having no timestamp — the import time becomes
    the revision time, forcing an overwrite even if the local revision
    is newer.
-4. Import the modified XML into shintowiki via ``action=import``.
+5. Import the modified XML into shintowiki via ``action=import``.
+   A title is marked complete once every page of its dependency closure
+   has been imported (or was already identical).
+
+Exports never sit in memory whole: each one is streamed to a temporary
+file, split page by page into the export cache by a SAX transformer
+(steps 3–4), reassembled, and uploaded from disk. Cached pages are keyed
+by (title, enwiki revid), so a failed import, or a dry run followed by
+``--apply``, reuses them instead of downloading again (see export_cache.py).
 
 Default mode is dry-run.  Use ``--apply`` to actually import.
-Processes only 1 page per run by default (``--max-imports 1``).
+Processes up to 10 listed titles per run by default (``--max-imports 10``).
 """
 
 import argparse
-import io
-import json
 import os
 import re
+import shutil
 import sys
+import tempfile
 import time
+import uuid
 
 import mwclient
 import requests as requests_lib
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+from export_cache import DEFAULT_CACHE_DIR, ExportCache
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL, append_state, load_state
+
+sys.stdout.reconfigure(encoding="utf-8")
 
-WIKI_URL = "shinto.miraheze.org"
-WIKI_PATH = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "")
 THROTTLE = 1.5
 
 ENWIKI_EXPORT_URL = "https://en.wikipedia.org/w/index.php"
+ENWIKI_API_URL = "https://en.wikipedia.org/w/api.php"
 USER_AGENT = "EmmaBot/1.0 (User:EmmaBot; shinto.miraheze.org)"
 
 STATE_FILE = os.path.join(os.path.dirname(__file__), "reimport_from_enwiki.state")
@@ -50,6 +70,11 @@ DEFAULT_PAGES_FILE = os.path.join(
     os.path.dirname(__file__), "erroneous_transclusion_pages.txt"
 )
 
+BATCH_SIZE = 50  # max titles per API query
+EXPORT_MAX_PAGES = 50  # pages per Special:Export request
+EXPORT_MAX_BYTES = 5_000_000  # approximate wikitext bytes per export
+CHUNK_SIZE = 1 << 16  # bytes per read/write when streaming exports
+
 # Known namespace prefixes that already have their namespace in the title.
 KNOWN_PREFIXES = (
     "Module:", "Template:", "Help:", "Category:", "Wikipedia:",
@@ -57,23 +82,6 @@ KNOWN_PREFIXES = (
 )
 
 
-def load_state(path):
-    completed = set()
-    if not os.path.exists(path):
-        return completed
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            s = line.strip()
-            if s:
-                completed.add(s)
-    return completed
-
-
-def append_state(path, title):
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(title + "\n")
-
-
 def parse_pages_file(path):
     titles = []
     with open(path, "r", encoding="utf-8") as f:
@@ -84,41 +92,141 @@ def parse_pages_file(path):
     return titles
 
 
-def download_enwiki_export(page_title):
-    """Download XML export from enwiki for a single page with templates."""
+def enwiki_query(params):
+    """Run one action=query request against enwiki and return the JSON response."""
+    resp = requests_lib.get(
+        ENWIKI_API_URL,
+        params={"action": "query", "format": "json", "formatversion": 2, **params},
+        headers={"User-Agent": USER_AGENT},
+        timeout=60,
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+def _query_pages(query, params):
+    """Yield (page, normalized map) over every response of a continued query."""
+    params = dict(params)
+    while True:
+        data = query(params)
+        q = data.get("query", {})
+        normalized = {n["to"]: n["from"] for n in q.get("normalized", [])}
+        for page in q.get("pages", []):
+            yield page, normalized
+        if "continue" in data:
+            params.update(data["continue"])
+        else:
+            break
+
+
+def resolve_enwiki_titles(titles):
+    """Return {listed title: enwiki title or None}.
+
+    Unprefixed titles that do not exist in the main namespace fall back to
+    the Template: namespace, as the per-title export used to.
+    """
+    candidates = {}
+    for title in titles:
+        candidates[title] = [title]
+        if not any(title.startswith(p) for p in KNOWN_PREFIXES):
+            candidates[title].append(f"Template:{title}")
+    lookup = list(dict.fromkeys(c for cs in candidates.values() for c in cs))
+    existing = {}
+    for i in range(0, len(lookup), BATCH_SIZE):
+        batch = lookup[i : i + BATCH_SIZE]
+        for page, normalized in _query_pages(enwiki_query, {"titles": "|".join(batch), "prop": "info"}):
+            if not page.get("missing") and not page.get("invalid"):
+                existing[normalized.get(page["title"], page["title"])] = page["title"]
+    return {title: next((existing[c] for c in cs if c in existing), None) for title, cs in candidates.items()}
+
+
+def get_enwiki_dependencies(titles):
+    """Return {enwiki title: set of transcluded templates/modules} for the given pages."""
+    deps = {title: set() for title in titles}
+    for i in range(0, len(titles), BATCH_SIZE):
+        batch = titles[i : i + BATCH_SIZE]
+        params = {"titles": "|".join(batch), "prop": "templates", "tllimit": "max"}
+        for page, _ in _query_pages(enwiki_query, params):
+            for tl in page.get("templates", []):
+                deps.setdefault(page["title"], set()).add(tl["title"])
+    return deps
+
+
+def get_revision_info(query, titles):
+    """Return {title: {"revid", "sha1", "size"}} for the current revision of each existing title."""
+    info = {}
+    for i in range(0, len(titles), BATCH_SIZE):
+        batch = titles[i : i + BATCH_SIZE]
+        params = {"titles": "|".join(batch), "prop": "revisions", "rvprop": "ids|sha1|size"}
+        for page, normalized in _query_pages(query, params):
+            revisions = page.get("revisions") or []
+            if revisions:
+                title = normalized.get(page["title"], page["title"])
+                rev = revisions[0]
+                info[title] = {"revid": rev.get("revid"), "sha1": rev.get("sha1"), "size": rev.get("size", 0)}
+    return info
+
+
+def group_exports(titles, sizes, max_pages=EXPORT_MAX_PAGES, max_bytes=EXPORT_MAX_BYTES):
+    """Split titles into export groups bounded by page count and total wikitext size."""
+    groups, current, current_bytes = [], [], 0
+    for title in titles:
+        size = sizes.get(title, 0)
+        if current and (len(current) >= max_pages or current_bytes + size > max_bytes):
+            groups.append(current)
+            current, current_bytes = [], 0
+        current.append(title)
+        current_bytes += size
+    if current:
+        groups.append(current)
+    return groups
+
+
+def download_enwiki_export(page_titles, dest, templates=False):
+    """Stream one XML export from enwiki for the given pages into the binary file dest."""
     params = {
         "title": "Special:Export",
         "action": "submit",
     }
     data = {
-        "pages": page_title,
-        "templates": "1",
+        "pages": "\n".join(page_titles),
         "curonly": "1",
         "wpDownload": "1",
     }
-    resp = requests_lib.post(
+    if templates:
+        data["templates"] = "1"
+    with requests_lib.post(
         ENWIKI_EXPORT_URL,
         params=params,
         data=data,
         headers={"User-Agent": USER_AGENT},
         timeout=120,
+        stream=True,
+    ) as resp:
+        resp.raise_for_status()
+        for chunk in resp.iter_content(CHUNK_SIZE):
+            dest.write(chunk)
+
+
+def write_import_body(xml_path, fields, dest):
+    """Write a multipart/form-data body (fields + the XML file) to dest. Returns the content type."""
+    boundary = uuid.uuid4().hex
+    for name, value in fields.items():
+        dest.write(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8")
+        )
+    dest.write(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="xml"; filename="import.xml"\r\n'
+        f"Content-Type: application/xml\r\n\r\n".encode("utf-8")
     )
-    resp.raise_for_status()
-    return resp.text
-
-
-def export_has_pages(xml_text):
-    """Check if the XML export actually contains any <page> elements."""
-    return "<page>" in xml_text
+    with open(xml_path, "rb") as f:
+        shutil.copyfileobj(f, dest, CHUNK_SIZE)
+    dest.write(f"\r\n--{boundary}--\r\n".encode("utf-8"))
+    return f"multipart/form-data; boundary={boundary}"
 
 
-def mangle_timestamps(xml_text):
-    """Replace 'timestamp' with 'timestam' so MediaWiki ignores revision dates."""
-    return xml_text.replace("timestamp", "timestam")
-
-
-def import_xml(site, xml_text, summary="", interwiki_prefix="en"):
-    """Import XML into the wiki via action=import."""
+def import_xml(site, xml_path, summary="", interwiki_prefix="en"):
+    """Import an XML file into the wiki via action=import, uploading from disk."""
     # Get CSRF token
     token_result = site.api("query", meta="tokens", type="csrf")
     csrf_token = token_result["query"]["tokens"]["csrftoken"]
@@ -132,13 +240,22 @@ def import_xml(site, xml_text, summary="", interwiki_prefix="en"):
     if summary:
         import_data["summary"] = summary
 
-    xml_bytes = xml_text.encode("utf-8")
-    files = {
-        "xml": ("import.xml", xml_bytes, "application/xml"),
-    }
-
-    raw_response = site.raw_call("api", import_data, files=files)
-    result = json.loads(raw_response)
+    # requests would build a multipart upload in memory; write the body to a
+    # file instead and let requests stream it with a known Content-Length.
+    body_path = xml_path + ".body"
+    try:
+        with open(body_path, "wb") as body:
+            content_type = write_import_body(xml_path, import_data, body)
+        url = f"{site.scheme}://{site.host}{site.path}api{site.ext}"
+        with open(body_path, "rb") as body:
+            resp = site.connection.post(
+                url, data=body, headers={"Content-Type": content_type}, **site.requests
+            )
+        resp.raise_for_status()
+        result = resp.json()
+    finally:
+        if os.path.exists(body_path):
+            os.remove(body_path)
 
     if "error" in result:
         raise RuntimeError(
@@ -148,6 +265,28 @@ def import_xml(site, xml_text, summary="", interwiki_prefix="en"):
     return result
 
 
+def prepare_export(page_titles, revids, cache, workdir):
+    """Build the import file for page_titles, downloading only pages not already in the export cache.
+
+    revids maps titles to their current enwiki revid and is updated with the
+    revids actually exported. Returns (path of import XML, titles in it,
+    how many of those were downloaded). A title missing from the result was
+    not in the export, e.g. deleted or renamed on enwiki since planning.
+    """
+    missing = [t for t in page_titles if not cache.has(t, revids.get(t))]
+    if missing:
+        raw_path = os.path.join(workdir, "export.xml")
+        with open(raw_path, "wb") as raw:
+            download_enwiki_export(missing, raw)
+        with open(raw_path, "rb") as src:
+            revids.update(cache.store_export(src))
+        os.remove(raw_path)
+    xml_path = os.path.join(workdir, "import.xml")
+    assembled = cache.assemble([(t, revids.get(t)) for t in page_titles], xml_path)
+    downloaded = len(set(missing) & set(assembled))
+    return xml_path, assembled, downloaded
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Reimport pages from enwiki to fix erroneous transclusions."
@@ -158,11 +297,11 @@ def main():
     )
     parser.add_argument(
         "--max-imports", type=int, default=10,
-        help="Max successful imports per run (default 10).",
+        help="Max listed titles to plan and import per run (default 10).",
     )
     parser.add_argument(
         "--max-errors", type=int, default=10,
-        help="Bail if this many errors with zero successes (default 10).",
+        help="Bail if this many export/import errors with zero successes (default 10).",
     )
     parser.add_argument(
         "--pages-file", default=DEFAULT_PAGES_FILE,
@@ -172,6 +311,10 @@ def main():
         "--state-file", default=STATE_FILE,
         help="Path to the state file for tracking completed imports.",
     )
+    parser.add_argument(
+        "--cache-dir", default=DEFAULT_CACHE_DIR,
+        help="Directory for cached export pages (keyed by enwiki title and revid).",
+    )
     parser.add_argument(
         "--run-tag", required=True,
         help="Wiki-formatted run tag link for import summaries.",
@@ -199,53 +342,74 @@ def main():
     site.login(USERNAME, PASSWORD)
     print(f"Logged in as {USERNAME}\n")
 
-    imported = skipped = errors = 0
-    checked = 0
-
-    for title in pending:
-        if args.max_imports and imported >= args.max_imports:
-            print(f"Reached max imports ({args.max_imports}); stopping.")
-            break
+    batch = pending[: args.max_imports] if args.max_imports else pending
+
+    # Plan: resolve titles, collect the dependency union, diff by sha1
+    print(f"Planning import for {len(batch)} title(s)...")
+    resolved = resolve_enwiki_titles(batch)
+    skipped = 0
+    for title in batch:
+        if resolved[title] is None:
+            print(f"  SKIP (no page content found on enwiki): {title}")
+            skipped += 1
+            if args.apply:
+                append_state(args.state_file, title)
+    roots = [resolved[t] for t in batch if resolved[t]]
+    deps = get_enwiki_dependencies(roots)
+    closure = {t: {resolved[t]} | deps.get(resolved[t], set()) for t in batch if resolved[t]}
+    union = sorted(set().union(*closure.values()))
+
+    remote = get_revision_info(enwiki_query, union)
+    local = get_revision_info(lambda params: site.api("query", formatversion=2, **params), union)
+    to_import = [t for t in union if t in remote and local.get(t, {}).get("sha1") != remote[t]["sha1"]]
+    sizes = {t: remote[t]["size"] for t in to_import}
+    print(
+        f"  {len(union)} page(s) in dependency union, {len(union) - len(to_import)} already identical, "
+        f"{len(to_import)} to import ({sum(sizes.values()):,} bytes)"
+    )
 
-        if imported == 0 and errors >= args.max_errors:
+    groups = group_exports(to_import, sizes)
+    revids = {t: remote[t]["revid"] for t in to_import}
+    cache = ExportCache(args.cache_dir)
+    pruned = cache.prune()
+    cached = sum(1 for t in to_import if cache.has(t, revids[t]))
+    print(f"  {len(groups)} export(s) planned, {cached} page(s) already in export cache"
+          + (f" ({pruned} stale removed)" if pruned else "") + "\n")
+
+    done_groups = errors = pages_imported = 0
+    failed = set()
+    workdir = tempfile.mkdtemp(prefix="reimport_from_enwiki_")
+
+    for n, group in enumerate(groups, 1):
+        prefix = f"[export {n}/{len(groups)}]"
+        if done_groups == 0 and errors >= args.max_errors:
             print(f"Reached {args.max_errors} errors with zero successes; bailing.")
+            failed.update(t for g in groups[n - 1 :] for t in g)
             break
 
-        checked += 1
-        prefix = f"[{checked}] {title}"
-
         # Download from enwiki
         try:
-            print(f"{prefix} Downloading from enwiki...")
-            xml = download_enwiki_export(title)
-
-            # If no pages found and title has no namespace prefix, retry with Template:
-            if not export_has_pages(xml):
-                has_ns = any(title.startswith(p) for p in KNOWN_PREFIXES)
-                if not has_ns:
-                    alt_title = f"Template:{title}"
-                    print(f"{prefix} No pages found, retrying as {alt_title}...")
-                    xml = download_enwiki_export(alt_title)
-
-            if not export_has_pages(xml):
-                print(f"{prefix} SKIP (no page content found on enwiki)")
-                skipped += 1
-                if args.apply:
-                    append_state(args.state_file, title)
-                continue
-
-            # Count pages in the export
-            page_count = xml.count("<page>")
-            print(f"{prefix} Downloaded {page_count} page(s) (with templates)")
-
+            # Streamed to disk and split into the cache; <timestamp> is mangled on the way through.
+            xml_path, assembled, downloaded = prepare_export(group, revids, cache, workdir)
+            page_count = len(assembled)
+            if not page_count:
+                raise RuntimeError("export contains no pages")
+            not_exported = set(group) - set(assembled)
+            if not_exported:
+                # Their listed titles must not be marked complete.
+                print(f"{prefix} WARN {len(not_exported)} page(s) not in the export: "
+                      f"{', '.join(sorted(not_exported)[:5])}{' ...' if len(not_exported) > 5 else ''}")
+                failed.update(not_exported)
+            print(
+                f"{prefix} {page_count} page(s) ready, {downloaded} downloaded, "
+                f"{page_count - downloaded} from cache ({os.path.getsize(xml_path):,} bytes)"
+            )
         except Exception as e:
             print(f"{prefix} ERROR downloading: {e}")
             errors += 1
+            failed.update(group)
             continue
 
-        # Mangle timestamps
-        xml = mangle_timestamps(xml)
-
         if not args.apply:
             print(f"{prefix} DRY RUN: would import {page_count} page(s)")
             continue
@@ -253,25 +417,38 @@ def main():
         # Import into shintowiki
         try:
             summary = f"Bot: reimport from enwiki to fix erroneous transclusions {args.run_tag}"
-            result = import_xml(site, xml, summary=summary)
+            result = import_xml(site, xml_path, summary=summary)
             import_pages = result.get("import", [])
             print(f"{prefix} IMPORTED {len(import_pages)} page(s)")
             for ip in import_pages[:5]:
                 print(f"    - {ip.get('title', '?')} (revisions: {ip.get('revisions', 0)})")
             if len(import_pages) > 5:
                 print(f"    ... and {len(import_pages) - 5} more")
-            imported += 1
-            append_state(args.state_file, title)
+            done_groups += 1
+            pages_imported += len(import_pages)
             time.sleep(THROTTLE)
         except Exception as e:
             print(f"{prefix} ERROR importing: {e}")
             errors += 1
+            failed.update(group)
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    # A listed title is complete once its whole closure is up to date.
+    completed_titles = 0
+    for title, pages_needed in closure.items():
+        if pages_needed & failed:
+            continue
+        completed_titles += 1
+        if args.apply:
+            append_state(args.state_file, title)
 
     print("\n" + "=" * 60)
-    print(f"Checked:  {checked}")
-    print(f"Imported: {imported}")
-    print(f"Skipped:  {skipped}")
-    print(f"Errors:   {errors}")
+    print(f"Titles checked:   {len(batch)}")
+    print(f"Titles completed: {completed_titles}")
+    print(f"Skipped:          {skipped}")
+    print(f"Pages imported:   {pages_imported}")
+    print(f"Errors:           {errors}")
 
 
 if __name__ == "__main__":
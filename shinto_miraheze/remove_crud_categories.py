@@ -3,40 +3,164 @@ remove_crud_categories.py
 ==========================
 Removes all crud category tags from pages.
 
-For every subcategory of Category:Crud_categories:
-  - Iterate all member pages
-  - Strip [[Category:SubcatName]] (and variants with sort keys) from each page
-  - After processing, the subcategory should be empty
+Works page by page rather than category by category, so a page tagged with
+several crud categories is read once and saved once:
+
+  - List every subcategory of Category:Crud_categories
+  - Walk the members of each subcategory with generator=categorymembers +
+    prop=categories (500 per request); each page is queued once, with the
+    full list of crud categories it is in
+  - Read queued pages 50 per request and strip all of their crud tags in a
+    single pass (category_rewrite.CategoryRewriter)
+  - Save each page once
+
+Progress is checkpointed per page in remove_crud_categories.state
+("title<TAB>revid"). A page is skipped while its current revision is the
+one recorded, so pages whose crud tags come from a template are not
+re-read every run, but a page that is edited and re-tagged is picked up
+again.
 
 Run dry-run first:
     python remove_crud_categories.py --dry-run
 """
 
 import os
-import re
 import time
-import io
 import sys
 import argparse
 import mwclient
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+from category_rewrite import CategoryRewriter, category_key
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL
+
+sys.stdout.reconfigure(encoding='utf-8')
 
-WIKI_URL   = "shinto.miraheze.org"
-WIKI_PATH  = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "[REDACTED_SECRET_1]")
 THROTTLE   = 1.5
 CRUD_CAT   = "Crud_categories"
+CONTENT_BATCH = 50  # max titles per content query
+DEFAULT_STATE_FILE = "shinto_miraheze/remove_crud_categories.state"
+
+
+def load_state(path):
+    """Return {title: revid} for pages already handled."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line:
+                continue
+            title, _, revid = line.partition("\t")
+            done[title] = int(revid) if revid.isdigit() else None
+    return done
+
+
+def append_state(path, title, revid):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(f"{title}\t{revid or ''}\n")
+
+
+def get_crud_subcategories(site):
+    """Return the names (without prefix) of all subcategories of Category:Crud_categories."""
+    names = []
+    params = {
+        "list": "categorymembers",
+        "cmtitle": f"Category:{CRUD_CAT}",
+        "cmnamespace": 14,
+        "cmlimit": "max",
+    }
+    while True:
+        data = site.api("query", **params)
+        for entry in data.get("query", {}).get("categorymembers", []):
+            names.append(entry["title"].removeprefix("Category:"))
+        if "continue" in data:
+            params.update(data["continue"])
+        else:
+            break
+    return names
+
+
+def iter_crud_pages(site, subcats):
+    """Yield (title, lastrevid, crud categories) once per page in any crud subcategory."""
+    crud_keys = {category_key(name) for name in subcats}
+    seen = set()
+    for subcat in subcats:
+        params = {
+            "generator": "categorymembers",
+            "gcmtitle": f"Category:{subcat}",
+            "gcmlimit": "max",
+            "prop": "info|categories",
+            "cllimit": "max",
+            "formatversion": 2,
+        }
+        batch = {}
+        while True:
+            data = site.api("query", **params)
+            for page in data.get("query", {}).get("pages", []):
+                entry = batch.setdefault(page["title"], {"revid": page.get("lastrevid"), "crud": []})
+                if page.get("lastrevid"):
+                    entry["revid"] = page["lastrevid"]
+                for cat in page.get("categories", []):
+                    name = cat["title"].removeprefix("Category:")
+                    if category_key(name) in crud_keys:
+                        entry["crud"].append(name)
+            # prop=categories can spread one generator batch over several
+            # responses; only hand pages on once the batch is complete.
+            if "batchcomplete" in data:
+                for title, entry in batch.items():
+                    if title not in seen:
+                        seen.add(title)
+                        yield title, entry["revid"], sorted(set(entry["crud"]))
+                batch = {}
+            if "continue" in data:
+                params.update(data["continue"])
+            else:
+                break
+
+
+def fetch_texts(site, titles):
+    """Return {title: (text, revid)} for up to CONTENT_BATCH titles."""
+    texts = {}
+    params = {
+        "prop": "revisions",
+        "rvprop": "ids|content",
+        "rvslots": "main",
+        "titles": "|".join(titles),
+        "formatversion": 2,
+    }
+    while True:
+        data = site.api("query", **params)
+        for page in data.get("query", {}).get("pages", []):
+            revisions = page.get("revisions") or []
+            if not revisions:
+                continue
+            rev = revisions[0]
+            texts[page["title"]] = (rev.get("slots", {}).get("main", {}).get("content", ""), rev.get("revid"))
+        if "continue" in data:
+            params.update(data["continue"])
+        else:
+            break
+    return texts
 
 
-def make_cat_pattern(cat_name):
-    """Return a regex that matches [[Category:Name]] or [[Category:Name|sortkey]]."""
-    escaped = re.escape(cat_name).replace(r'\ ', r'[_ ]')
-    return re.compile(
-        r'\[\[Category:' + escaped + r'(\|[^\]]*)?\]\]\n?',
-        re.IGNORECASE
-    )
+def iter_page_batches(site, subcats, done):
+    """Yield batches of (title, crud categories, text, revid), skipping checkpointed pages."""
+    pending = []
+    for title, revid, crud in iter_crud_pages(site, subcats):
+        if revid is not None and done.get(title) == revid:
+            continue
+        pending.append((title, crud))
+        if len(pending) >= CONTENT_BATCH:
+            yield _with_texts(site, pending)
+            pending = []
+    if pending:
+        yield _with_texts(site, pending)
+
+
+def _with_texts(site, pending):
+    texts = fetch_texts(site, [title for title, _ in pending])
+    return [(title, crud, *texts[title]) for title, crud in pending if title in texts]
 
 
 def main():
@@ -44,6 +168,7 @@ def main():
     parser.add_argument("--dry-run", action="store_true")
     parser.add_argument("--max-edits", type=int, default=0, help="Max edits to save in this run (0 = no limit).")
     parser.add_argument("--run-tag", required=True, help="Wiki-formatted run tag link for edit summaries.")
+    parser.add_argument("--state-file", default=DEFAULT_STATE_FILE, help="Path to per-page checkpoint file.")
     args = parser.parse_args()
 
     site = mwclient.Site(WIKI_URL, path=WIKI_PATH,
@@ -51,71 +176,72 @@ def main():
     site.login(USERNAME, PASSWORD)
     print(f"Logged in as {USERNAME}\n")
 
-    crud_cat = site.categories[CRUD_CAT]
-    subcats = [p for p in crud_cat if p.namespace == 14]
-    print(f"Found {len(subcats)} subcategories of Category:{CRUD_CAT}\n")
+    subcats = get_crud_subcategories(site)
+    print(f"Found {len(subcats)} subcategories of Category:{CRUD_CAT}")
+    rewriter = CategoryRewriter(remove=subcats)
 
-    total_edits = 0
+    done = load_state(args.state_file) if not args.dry_run else {}
+    if not args.dry_run:
+        print(f"Loaded {len(done)} checkpointed pages from state: {args.state_file}")
+    print()
+
+    total_edits = checked = skipped = errors = 0
     limit_reached = False
 
-    for subcat in subcats:
+    for batch in iter_page_batches(site, subcats, done):
         if limit_reached:
             break
-        subcat_name = subcat.name.removeprefix("Category:")
-        print(f"--- Category:{subcat_name} ---")
-        pattern = make_cat_pattern(subcat_name)
-        members = list(site.categories[subcat_name])
-
-        if not members:
-            print(f"  Already empty, skipping.\n")
-            continue
-
-        print(f"  {len(members)} members to clean")
-        for page in members:
+        for title, crud, text, revid in batch:
             if args.max_edits and total_edits >= args.max_edits:
-                print(f"  Reached max edits ({args.max_edits}); stopping run.")
+                print(f"Reached max edits ({args.max_edits}); stopping run.")
                 limit_reached = True
                 break
-            try:
-                text = page.text()
-            except Exception as e:
-                print(f"  ERROR reading {page.name}: {e}")
-                continue
-            new_text = pattern.sub("", text).rstrip("\n")
-            if new_text == text.rstrip("\n"):
-                print(f"  SKIP (tag not found): {page.name}")
+            checked += 1
+            new_text, changes = rewriter.apply(text)
+            new_text = new_text.rstrip("\n")
+            if not changes:
+                print(f"  SKIP (tag not found in wikitext): {title} [{', '.join(crud)}]")
+                skipped += 1
+                if not args.dry_run:
+                    append_state(args.state_file, title, revid)
                 continue
+            removed = sorted({name for name, _ in changes})
             if args.dry_run:
-                print(f"  DRY RUN: would strip [[Category:{subcat_name}]] from {page.name}")
-            else:
-                for attempt in range(3):
-                    try:
-                        page.save(
-                            new_text,
-                            summary=(
-                                f"Bot: remove [[Category:{subcat_name}]] (crud category cleanup) "
-                                f"{args.run_tag}"
-                            ),
-                        )
-                        print(f"  CLEANED: {page.name}")
-                        total_edits += 1
+                print(f"  DRY RUN: would strip {len(removed)} crud categor{'y' if len(removed) == 1 else 'ies'} from {title}")
+                continue
+
+            links = ", ".join(f"[[:Category:{name}]]" for name in removed)
+            summary = f"Bot: remove {links} (crud category cleanup) {args.run_tag}"
+            page = site.pages[title]
+            if page.revision != revid:
+                # Edited since the bulk read; start again from the current text.
+                new_text = rewriter.apply(page.text(cache=False))[0].rstrip("\n")
+            for attempt in range(3):
+                try:
+                    result = page.save(new_text, summary=summary)
+                    print(f"  CLEANED: {title} ({len(removed)} removed)")
+                    total_edits += 1
+                    append_state(args.state_file, title, result.get("newrevid"))
+                    break
+                except mwclient.errors.EditError as e:
+                    if 'editconflict' in str(e).lower() and attempt < 2:
+                        print(f"  CONFLICT (retry {attempt+1}/3): {title}")
+                        time.sleep(3)
+                        # Re-fetch and re-apply the strip
+                        page = site.pages[title]
+                        new_text = rewriter.apply(page.text(cache=False))[0].rstrip("\n")
+                    else:
+                        print(f"  ERROR: {title} — {e}")
+                        errors += 1
                         break
-                    except mwclient.errors.EditError as e:
-                        if 'editconflict' in str(e).lower() and attempt < 2:
-                            print(f"  CONFLICT (retry {attempt+1}/3): {page.name}")
-                            time.sleep(3)
-                            # Re-fetch and re-apply the strip
-                            text = page.text()
-                            new_text = pattern.sub("", text).rstrip("\n")
-                        else:
-                            print(f"  ERROR: {page.name} — {e}")
-                            break
-                time.sleep(THROTTLE)
-
-        print()
-
-    print(f"{'='*60}")
-    print(f"Done! Total edits: {total_edits}")
+                except Exception as e:
+                    print(f"  ERROR: {title} — {e}")
+                    errors += 1
+                    break
+            time.sleep(THROTTLE)
+
+    print(f"\n{'='*60}")
+    print(f"Done! Pages checked: {checked} | Total edits: {total_edits} | Skipped: {skipped} | Errors: {errors}")
 
 
 if __name__ == "__main__":
@@ -10,23 +10,25 @@ passes onto category pages and should not be there:
 
 Iterates all Category: namespace pages using a state file for resumability.
 Default mode is dry-run; use --apply to save edits.
+
+With --apply the script first looks for category pages that still carry
+either template and are not in the state file (list=embeddedin and an
+insource: search, see sweep_probe.py) and exits at once if there are none.
+--full-sweep skips that check.
 """
 
 import argparse
-import io
-import os
 import re
 import sys
 import time
 
 import mwclient
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+from sweep_probe import unvisited_hits
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL, append_state, iter_allpages, load_state
+
+sys.stdout.reconfigure(encoding="utf-8")
 
-WIKI_URL = "shinto.miraheze.org"
-WIKI_PATH = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "[REDACTED_SECRET_1]")
 THROTTLE = 1.5
 DEFAULT_STATE_FILE = "shinto_miraheze/remove_legacy_cat_templates.state"
 
@@ -41,39 +43,9 @@ STRIP_PATTERNS = [
 
 REDIRECT_RE = re.compile(r"^\s*#redirect\b", re.IGNORECASE)
 
-
-def iter_category_titles(site):
-    params = {
-        "list": "allpages",
-        "apnamespace": 14,
-        "aplimit": "max",
-        "apfilterredir": "nonredirects",
-    }
-    while True:
-        result = site.api("query", **params)
-        for entry in result.get("query", {}).get("allpages", []):
-            yield entry["title"]
-        if "continue" in result:
-            params.update(result["continue"])
-        else:
-            break
-
-
-def load_state(path):
-    completed = set()
-    if not os.path.exists(path):
-        return completed
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            s = line.strip()
-            if s:
-                completed.add(s)
-    return completed
-
-
-def append_state(path, title):
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(title + "\n")
+# Where the two templates show up without reading every category page.
+PROBE_TEMPLATE = "Template:Citation needed"
+PROBE_SEARCH = 'insource:"デフォルトソート"'
 
 
 def strip_legacy_templates(text):
@@ -82,12 +54,19 @@ def strip_legacy_templates(text):
     return text
 
 
+def has_work(site, state_file):
+    """False if no category page outside the state file still has a legacy template; None if unknown."""
+    return unvisited_hits(site, load_state(state_file), 14, embedding=PROBE_TEMPLATE, search=PROBE_SEARCH)
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--apply", action="store_true", help="Save edits (default is dry-run).")
     parser.add_argument("--max-edits", type=int, default=0, help="Max edits to save in this run (0 = no limit).")
     parser.add_argument("--run-tag", required=True, help="Wiki-formatted run tag link for edit summaries.")
     parser.add_argument("--state-file", default=DEFAULT_STATE_FILE, help="Path to resume-state file.")
+    parser.add_argument("--full-sweep", action="store_true",
+                        help="Read all category pages even if the template check finds nothing to remove.")
     args = parser.parse_args()
 
     site = mwclient.Site(
@@ -98,13 +77,17 @@ def main():
     site.login(USERNAME, PASSWORD)
     print(f"Logged in as {USERNAME}\n")
 
+    if args.apply and not args.full_sweep and has_work(site, args.state_file) is False:
+        print("No category pages outside the state file use the legacy templates; nothing to do.")
+        return
+
     completed_titles = load_state(args.state_file) if args.apply else set()
     if args.apply:
         print(f"Loaded {len(completed_titles)} completed titles from state: {args.state_file}")
 
     processed = edited = skipped = errors = 0
 
-    for title in iter_category_titles(site):
+    for title in iter_allpages(site, 14):
         if args.max_edits and edited >= args.max_edits:
             print(f"Reached max edits ({args.max_edits}); stopping run.")
             break
@@ -16,42 +16,24 @@ This script:
 4. Handles all language interwikis
 """
 
-import os
 import time
 import re
 import mwclient
-import requests
 import sys
 
+from wiki import get_session, lazy_site
+
 # Fix Unicode encoding issues on Windows
 if sys.platform == 'win32':
-    import io
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stdout.reconfigure(encoding='utf-8')
 
 # ─── CONFIG ─────────────────────────────────────────────────
-WIKI_URL  = 'shinto.miraheze.org'
-WIKI_PATH = '/w/'
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "[REDACTED_SECRET_1]")
 BOT_USER_AGENT = "EmmaBotCategoryWikidataBot/1.0 (https://shinto.miraheze.org/wiki/User:EmmaBot)"
 
 # Wait 30 minutes at startup to avoid race conditions
 STARTUP_WAIT = 30 * 60  # 30 minutes in seconds
 
-site = mwclient.Site(
-    WIKI_URL,
-    path=WIKI_PATH,
-    clients_useragent=BOT_USER_AGENT,
-)
-site.login(USERNAME, PASSWORD)
-
-# Retrieve username in a way that works on all mwclient versions
-try:
-    ui = site.api('query', meta='userinfo')
-    logged_user = ui['query']['userinfo'].get('name', USERNAME)
-    print(f"Logged in as {logged_user}")
-except Exception:
-    print("Logged in (could not fetch username via API, but login succeeded).")
+site = lazy_site(BOT_USER_AGENT)
 
 
 # ─── REGEX PATTERNS ─────────────────────────────────────────
@@ -138,7 +120,7 @@ def query_wikipedia_for_wikidata(lang_code, category_title):
             "format": "json"
         }
         headers = {"User-Agent": BOT_USER_AGENT}
-        response = requests.get(url, params=params, headers=headers, timeout=10)
+        response = get_session().get(url, params=params, headers=headers, timeout=10)
         response.raise_for_status()
         data = response.json()
 
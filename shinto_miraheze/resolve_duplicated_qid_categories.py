@@ -27,20 +27,16 @@ Run dry-run first:
     python resolve_duplicated_qid_categories.py --dry-run
 """
 
-import os
 import re
 import time
-import io
 import sys
 import argparse
 import mwclient
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL
+
+sys.stdout.reconfigure(encoding='utf-8')
 
-WIKI_URL  = "shinto.miraheze.org"
-WIKI_PATH = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "[REDACTED_SECRET_1]")
 THROTTLE  = 1.5
 
 DUP_CAT     = "duplicated qid category redirects"
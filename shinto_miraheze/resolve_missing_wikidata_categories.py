@@ -28,21 +28,18 @@ Run dry-run first:
     python resolve_missing_wikidata_categories.py --dry-run
 """
 
-import os
 import re
 import time
-import io
 import sys
 import argparse
 import mwclient
 import requests
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+from qid_index import QidIndex
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL
+
+sys.stdout.reconfigure(encoding='utf-8')
 
-WIKI_URL    = "shinto.miraheze.org"
-WIKI_PATH   = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "[REDACTED_SECRET_1]")
 THROTTLE    = 1.5
 WD_THROTTLE = 0.5   # between Wikipedia API calls
 
@@ -175,6 +172,10 @@ def main():
         cats = cats[:args.limit]
         print(f"(Limited to first {args.limit})\n")
 
+    index = QidIndex.load()
+    fetched, removed = index.refresh(site)
+    print(f"Q page index: {len(index)} pages ({fetched} re-read, {removed} removed)\n")
+
     linked = merged = created = skipped = errors = 0
 
     for i, cat_page in enumerate(cats, 1):
@@ -209,18 +210,17 @@ def main():
 
         print(f"[{i}/{len(cats)}] {cat_name} → {qid}")
 
-        # Check Q page on shintowiki
-        q_page = site.pages[qid]
-
-        if not q_page.exists:
+        # Check Q page on shintowiki (from the local index)
+        if qid not in index:
             # Case A: create Q page + add wikidata link
             print(f"  Case A: Q page does not exist — creating + adding link")
             if not args.dry_run:
                 try:
-                    q_page.save(
+                    site.pages[qid].save(
                         f"#REDIRECT [[Category:{cat_name}]]",
                         summary=f"Bot: create QID redirect for [[Category:{cat_name}]]"
                     )
+                    index.record(qid, f"#REDIRECT [[Category:{cat_name}]]")
                     print(f"  CREATED: {qid} → Category:{cat_name}")
                     time.sleep(THROTTLE)
                 except Exception as e:
@@ -234,23 +234,14 @@ def main():
                 created += 1
             continue
 
-        try:
-            q_text = q_page.text()
-        except Exception as e:
-            print(f"  ERROR reading {qid}: {e}")
-            errors += 1
-            continue
+        target = index.category_target(qid)
 
-        redir_m = REDIRECT_RE.search(q_text)
-
-        if not redir_m:
+        if not target:
             # Case D: disambiguation or something else
             print(f"  Case D: SKIP ({qid} is not a simple redirect)")
             skipped += 1
             continue
 
-        target = redir_m.group(1).strip()
-
         if target.lower() == cat_name.lower():
             # Case B: Q page already points to this category
             print(f"  Case B: Q page already points to this category — adding link")
@@ -283,6 +274,7 @@ def main():
             print(f"  SKIP (target is also CJK): {target}")
             skipped += 1
 
+    index.save()
     print(f"\n{'='*60}")
     print(f"Done. Linked: {linked} | Created: {created} | Merged: {merged} | Skipped: {skipped} | Errors: {errors}")
 
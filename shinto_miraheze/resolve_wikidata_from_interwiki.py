@@ -15,35 +15,21 @@ This script:
 
 """
 
-import os
 import time
 import re
 import mwclient
-import requests
 import sys
 
+from wiki import WIKI_PATH, WIKI_URL, get_session, lazy_site
+
 # Fix Unicode encoding issues on Windows
 if sys.platform == 'win32':
-    import io
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stdout.reconfigure(encoding='utf-8')
 
 # ─── CONFIG ─────────────────────────────────────────────────
-WIKI_URL  = 'shinto.miraheze.org'
-WIKI_PATH = '/w/'
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "[REDACTED_SECRET_1]")
 CATEGORY_NAME = 'Missing wikidata'
 
-site = mwclient.Site(WIKI_URL, path=WIKI_PATH)
-site.login(USERNAME, PASSWORD)
-
-# Retrieve username in a way that works on all mwclient versions
-try:
-    ui = site.api('query', meta='userinfo')
-    logged_user = ui['query']['userinfo'].get('name', USERNAME)
-    print(f"Logged in as {logged_user}")
-except Exception:
-    print("Logged in (could not fetch username via API, but login succeeded).")
+site = lazy_site(None)
 
 # ─── REGEX PATTERNS ─────────────────────────────────────────
 # Match [[en:...]], [[ja:...]], [[de:...]], [[zh:...]], and [[ru:...]] interwiki links
@@ -76,7 +62,7 @@ def get_category_pages(category_name):
 
     while True:
         try:
-            response = requests.get(
+            response = get_session().get(
                 f'https://{WIKI_URL}{WIKI_PATH}api.php',
                 params=params,
                 headers={'User-Agent': 'Shinto Wiki Bot (https://shinto.miraheze.org/)'},
@@ -132,7 +118,7 @@ def check_wikipedia_page(wiki, page_title):
         headers = {
             "User-Agent": "Shinto Wiki Bot (https://shinto.miraheze.org/)"
         }
-        response = requests.get(url, params=params, headers=headers, timeout=10)
+        response = get_session().get(url, params=params, headers=headers, timeout=10)
         response.raise_for_status()
         data = response.json()
 
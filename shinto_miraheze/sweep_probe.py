@@ -0,0 +1,137 @@
+"""
+sweep_probe.py
+==============
+Cheap "is there any work?" checks for the stages that sweep a whole
+namespace or category against a resume-state file, so a stage whose domain
+is already done exits after one or two requests instead of re-listing
+thousands of titles only to skip every one.
+
+normalize_category_pages.py and tag_shikinaisha_talk_pages.py record when
+their last complete sweep started (every title visited, not cut short by
+--max-edits/--limit, no errors) in "<name>_sweep.state" next to the state
+file; the workflow commits it with the other state files. A sweep with
+errors clears it, as the failed titles are neither in the state file nor in
+recentchanges. The probes then look only at what changed since then:
+
+    created_since()          list=recentchanges: pages created, moved or
+                             deleted in a namespace
+    category_changed_since() list=categorymembers sorted by the time a page
+                             was added: the newest member
+    unvisited_hits()         list=embeddedin / list=search: pages that still
+                             match, minus the ones in the state file
+
+Each probe returns True (work), False (nothing to do) or None (cannot tell:
+no sweep recorded yet, the sweep is older than recentchanges keeps, or the
+API call failed). Scripts only skip their sweep on False.
+
+Not a standalone script.
+"""
+
+import datetime as dt
+import os
+
+import mwclient
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+# Miraheze keeps 90 days of recentchanges; stay well inside that.
+RC_MAX_AGE = dt.timedelta(days=80)
+# Edits saved while a sweep was starting, and clock skew against the wiki.
+SWEEP_SLACK = dt.timedelta(minutes=5)
+HIT_LIMIT = 50
+
+
+def sweep_path(state_file):
+    """The sweep-state file kept next to a resume-state file."""
+    base = state_file[:-len(".state")] if state_file.endswith(".state") else state_file
+    return base + "_sweep.state"
+
+
+def now_utc():
+    return dt.datetime.now(dt.timezone.utc).replace(microsecond=0)
+
+
+def load_last_sweep(state_file):
+    """When the last complete sweep started, or None if none is recorded."""
+    path = sweep_path(state_file)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read().strip()
+    try:
+        return dt.datetime.strptime(text, TIMESTAMP_FORMAT).replace(tzinfo=dt.timezone.utc)
+    except ValueError:
+        return None
+
+
+def record_sweep(state_file, started):
+    """Record that a sweep which started at `started` visited every title."""
+    with open(sweep_path(state_file), "w", encoding="utf-8") as f:
+        f.write(started.strftime(TIMESTAMP_FORMAT) + "\n")
+
+
+def clear_sweep(state_file):
+    """Forget the last sweep, e.g. after errors left titles out of the state file."""
+    path = sweep_path(state_file)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _since(last_sweep, max_age=None):
+    if last_sweep is None or (max_age is not None and now_utc() - last_sweep > max_age):
+        return None
+    return (last_sweep - SWEEP_SLACK).strftime(TIMESTAMP_FORMAT)
+
+
+def created_since(site, namespace, last_sweep):
+    """Whether a page in namespace was created, moved or deleted since last_sweep."""
+    since = _since(last_sweep, RC_MAX_AGE)
+    if since is None:
+        return None
+    try:
+        data = site.api("query", list="recentchanges", rcnamespace=namespace, rctype="new|log",
+                        rcend=since, rcdir="older", rcprop="title|timestamp", rclimit=1)
+    except mwclient.errors.APIError:
+        return None
+    return bool(data.get("query", {}).get("recentchanges"))
+
+
+def category_changed_since(site, category, last_sweep):
+    """Whether a page was added to category since last_sweep."""
+    since = _since(last_sweep)
+    if since is None:
+        return None
+    try:
+        data = site.api("query", list="categorymembers", cmtitle=f"Category:{category}",
+                        cmsort="timestamp", cmdir="desc", cmprop="title|timestamp", cmlimit=1)
+    except mwclient.errors.APIError:
+        return None
+    members = data.get("query", {}).get("categorymembers", [])
+    return bool(members) and members[0].get("timestamp", "") >= since
+
+
+def unvisited_hits(site, completed, namespace, embedding=None, search=None):
+    """
+    Whether a page transcluding `embedding` or matching the `search` query is
+    missing from completed. Looks at the first HIT_LIMIT hits of each; a
+    full page of visited hits counts as unknown.
+    """
+    try:
+        if embedding:
+            data = site.api("query", list="embeddedin", eititle=embedding, einamespace=namespace,
+                            eilimit=HIT_LIMIT)
+            hits = data.get("query", {}).get("embeddedin", [])
+            if any(hit["title"] not in completed for hit in hits):
+                return True
+            if len(hits) >= HIT_LIMIT:
+                return None
+        if search:
+            data = site.api("query", list="search", srsearch=search, srnamespace=namespace,
+                            srwhat="text", srprop="", srlimit=HIT_LIMIT)
+            hits = data.get("query", {}).get("search", [])
+            if any(hit["title"] not in completed for hit in hits):
+                return True
+            if len(hits) >= HIT_LIMIT:
+                return None
+    except mwclient.errors.APIError:
+        return None
+    return False
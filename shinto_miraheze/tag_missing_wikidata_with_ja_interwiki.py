@@ -14,20 +14,16 @@ Run dry-run first:
     python tag_missing_wikidata_with_ja_interwiki.py --dry-run
 """
 
-import os
 import re
 import time
-import io
 import sys
 import argparse
 import mwclient
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL
+
+sys.stdout.reconfigure(encoding='utf-8')
 
-WIKI_URL   = "shinto.miraheze.org"
-WIKI_PATH  = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "[REDACTED_SECRET_1]")
 THROTTLE   = 1.5
 
 SOURCE_CAT = "Categories_missing_wikidata"
@@ -9,26 +9,27 @@ following section to its talk page if not already present:
 
 Default mode is dry-run. Use --apply to save edits.
 
+With --apply the script first checks whether a page was added to the
+category since the last complete pass (sweep_probe.py) and exits at once if
+not. --full-sweep skips that check.
+
 Examples:
     python shinto_miraheze/tag_shikinaisha_talk_pages.py --limit 10
     python shinto_miraheze/tag_shikinaisha_talk_pages.py --apply
 """
 
 import argparse
-import io
-import os
 import re
 import sys
 import time
 
 import mwclient
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+from sweep_probe import category_changed_since, clear_sweep, load_last_sweep, now_utc, record_sweep
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL, append_state, load_state
+
+sys.stdout.reconfigure(encoding="utf-8")
 
-WIKI_URL = "shinto.miraheze.org"
-WIKI_PATH = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "[REDACTED_SECRET_1]")
 THROTTLE = 1.5
 CATEGORY = "Wikidata_generated_shikinaisha_pages"
 DEFAULT_STATE_FILE = "shinto_miraheze/tag_shikinaisha_talk_pages.state"
@@ -37,23 +38,6 @@ QID_RE = re.compile(r"\{\{\s*wikidata\s*link\s*\|\s*(Q\d+)\s*[\|\}]", re.IGNOREC
 SECTION_RE = re.compile(r"==\s*This page was generated from Wikidata\s*==", re.IGNORECASE)
 
 
-def load_state(path):
-    completed = set()
-    if not os.path.exists(path):
-        return completed
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            s = line.strip()
-            if s:
-                completed.add(s)
-    return completed
-
-
-def append_state(path, title):
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(title + "\n")
-
-
 def extract_qid(page_text):
     m = QID_RE.search(page_text or "")
     return m.group(1).upper() if m else None
@@ -67,6 +51,11 @@ def build_section(qid):
     )
 
 
+def has_work(site, state_file):
+    """False if no page was added to the category since the last complete pass; None if unknown."""
+    return category_changed_since(site, CATEGORY, load_last_sweep(state_file))
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--apply", action="store_true", help="Save edits (default is dry-run).")
@@ -74,6 +63,8 @@ def main():
     parser.add_argument("--max-edits", type=int, default=0, help="Max edits to save in this run (0 = no limit).")
     parser.add_argument("--run-tag", required=True, help="Wiki-formatted run tag link for edit summaries.")
     parser.add_argument("--state-file", default=DEFAULT_STATE_FILE, help="Path to resume-state file.")
+    parser.add_argument("--full-sweep", action="store_true",
+                        help="Go through the whole category even if no page was added since the last complete pass.")
     args = parser.parse_args()
 
     site = mwclient.Site(
@@ -84,21 +75,30 @@ def main():
     site.login(USERNAME, PASSWORD)
     print(f"Logged in as {USERNAME}\n")
 
+    sweep_started = now_utc()
+    if args.apply and not args.full_sweep and has_work(site, args.state_file) is False:
+        print(f"No pages added to Category:{CATEGORY} since the last complete pass "
+              f"({load_last_sweep(args.state_file):%Y-%m-%d %H:%M}Z); nothing to do.")
+        return
+
     completed = load_state(args.state_file) if args.apply else set()
     if args.apply:
         print(f"Loaded {len(completed)} completed titles from state file: {args.state_file}")
 
     cat = site.categories[CATEGORY]
     processed = edited = skipped = errors = 0
+    stopped = False
 
     for page in cat:
         if args.max_edits and edited >= args.max_edits:
             print(f"Reached max edits ({args.max_edits}); stopping run.")
+            stopped = True
             break
         if page.namespace != 0:
             continue
         title = page.name
         if args.limit and processed >= args.limit:
+            stopped = True
             break
         if args.apply and title in completed:
             skipped += 1
@@ -164,6 +164,10 @@ def main():
         f"Done. Processed: {processed} | Edited: {edited} | "
         f"Skipped: {skipped} | Errors: {errors} | Mode: {'APPLY' if args.apply else 'DRY-RUN'}"
     )
+    if args.apply and errors:
+        clear_sweep(args.state_file)
+    elif args.apply and not stopped:
+        record_sweep(args.state_file, sweep_started)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The scripts import their siblings by bare name, as when run from shinto_miraheze/.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,111 @@
+"""
+ingest_wikidata_dump.py against fixtures/wikidata_dump_small.json.{gz,bz2}:
+two shrines (Q1001, Q1002), a non-shrine (Q1003), the items they refer to,
+property entities, and two referenced items that are not in the dump (Q9999
+deleted, Q2003 redirected).
+"""
+
+import gzip
+import json
+import os
+
+import pytest
+
+import generate_shikinaisha_pages_v25_with_redirects as gen
+from ingest_wikidata_dump import ingest, iter_dump_entities, write_store
+from wikidata_entity import Entity, load_entity_store
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+DUMPS = [os.path.join(FIXTURES, "wikidata_dump_small.json" + ext) for ext in (".gz", ".bz2")]
+
+SHRINES = {"Q1001", "Q1002"}
+REFERENCED = {"Q2001", "Q2002", "Q3001", "Q4001", "Q845945"}
+NOT_IN_DUMP = {"Q9999", "Q2003"}
+PROPERTY_LABELS = {
+    "P17": "country",
+    "P31": "instance of",
+    "P131": "located in the administrative territorial entity",
+    "P248": "stated in",
+    "P361": "part of",
+    "P580": "start time",
+    "P625": "coordinate location",
+    "P825": "dedicated to",
+    "P854": "reference URL",
+    "P2699": "URL",
+}
+
+
+@pytest.fixture(params=DUMPS, ids=["gz", "bz2"])
+def store(request, tmp_path):
+    entities, labels = ingest(request.param, seeds={"Q1002"}, instance_of={"Q845945"})
+    path = str(tmp_path / "store.jsonl.gz")
+    write_store(path, entities, labels)
+    return request.param, path
+
+
+def test_store_keeps_shrines_and_referenced_items(store):
+    _, path = store
+    entities, labels = load_entity_store(path)
+    assert set(entities) == SHRINES | REFERENCED
+    assert labels == PROPERTY_LABELS
+
+
+def test_shrines_are_kept_in_full(store):
+    _, path = store
+    entities, _ = load_entity_store(path)
+    shrine = entities["Q1001"]
+    assert not shrine.partial
+    assert shrine.lastrevid == 501
+    assert shrine.labels == {"en": "Ōmiwa Shrine", "ja": "大神神社"}
+    assert shrine.sitelinks["commonswiki"] == "Category:Ōmiwa Shrine"
+    assert set(shrine.claims) == {"P31", "P361", "P131", "P625", "P825", "P17", "P1448", "P11250"}
+    p361 = shrine.claims["P361"][0]
+    assert p361.value == {"id": "Q2001"}
+    assert p361.references == ({"P248": ({"id": "Q3001"},), "P854": ("https://example.org/engishiki",)},)
+    assert shrine.claims["P131"][0].qualifiers["P580"][0]["time"] == "+0927-00-00T00:00:00Z"
+
+
+def test_referenced_items_keep_only_ref_claims(store):
+    _, path = store
+    entities, _ = load_entity_store(path)
+    for qid in REFERENCED:
+        assert entities[qid].partial, qid
+        assert set(entities[qid].claims) <= set(gen.REF_CLAIMS), qid
+    assert entities["Q2001"].claims == {}
+    assert entities["Q2001"].labels == {"en": "List of Shikinaisha in Yamato Province", "ja": "大和国の式内社一覧"}
+    assert entities["Q2002"].claims["P2699"][0].value == "https://example.org/sakurai"
+    assert entities["Q3001"].claims["P2699"][0].value == "https://example.org/engishiki-text"
+
+
+def _render(entities, labels):
+    gen.ENTITY_CACHE.clear()
+    gen.ENTITY_CACHE.update(entities)
+    gen.ENTITY_CACHE.update({qid: None for qid in NOT_IN_DUMP})  # as fetch_entities records them
+    gen.PROPERTY_LABELS.clear()
+    gen.PROPERTY_LABELS.update(labels)
+    return {qid: gen.format_page_content(entities[qid].labels["en"], qid, entities[qid]) for qid in sorted(SHRINES)}
+
+
+def test_render_from_store_matches_full_entities(store):
+    dump, path = store
+    full = {e["id"]: Entity.from_json(e) for e in iter_dump_entities(dump) if e["id"].startswith("Q")}
+    all_labels = {e["id"]: e["labels"]["en"]["value"]
+                  for e in iter_dump_entities(dump) if e["id"].startswith("P") and "en" in e["labels"]}
+    try:
+        expected = _render(full, all_labels)
+        stored, labels = load_entity_store(path)
+        assert _render(stored, labels) == expected
+    finally:
+        gen.ENTITY_CACHE.clear()
+        gen.PROPERTY_LABELS.clear()
+    page = expected["Q1001"]
+    assert "It is located in [[Yamato Province]]." in page
+    assert "Engishiki (Q3001) https://example.org/engishiki" in page
+    assert "https://example.org/engishiki-text" in expected["Q1002"]
+
+
+def test_store_lists_properties_first(store):
+    _, path = store
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        ids = [json.loads(line)["id"] for line in f]
+    assert ids[:len(PROPERTY_LABELS)] == sorted(PROPERTY_LABELS, key=lambda p: int(p[1:]))
@@ -0,0 +1,25 @@
+"""group_renames(): renames that share member pages run as one group."""
+
+from move_categories import group_renames
+
+
+def test_renames_sharing_a_member_are_grouped():
+    renames = [
+        ("Category:A", "Category:A2"),
+        ("Category:B", "Category:B2"),
+        ("Category:C", "Category:C2"),
+        ("Category:D", "Category:D2"),
+    ]
+    member_edits = {
+        "P1": [("A", "A2")],
+        "P2": [("A", "A2"), ("C", "C2")],
+        "P3": [("B", "B2")],
+    }
+
+    groups = group_renames(renames, member_edits)
+
+    assert groups == [
+        ([("Category:A", "Category:A2"), ("Category:C", "Category:C2")], ["P1", "P2"]),
+        ([("Category:B", "Category:B2")], ["P3"]),
+        ([("Category:D", "Category:D2")], []),
+    ]
@@ -0,0 +1,43 @@
+"""prepare_export() when enwiki's Special:Export leaves out a planned page."""
+
+import reimport_from_enwiki
+from export_cache import ExportCache
+
+EXPORT = b"""<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.11/" version="0.11" xml:lang="en">
+  <siteinfo>
+    <sitename>Wikipedia</sitename>
+  </siteinfo>
+  <page>
+    <title>Template:Kept</title>
+    <ns>10</ns>
+    <id>1</id>
+    <revision>
+      <id>111</id>
+      <timestamp>2026-01-01T00:00:00Z</timestamp>
+      <text bytes="4" xml:space="preserve">kept</text>
+    </revision>
+  </page>
+</mediawiki>
+"""
+
+
+def test_pages_missing_from_export_are_not_assembled(tmp_path, monkeypatch):
+    requested = []
+
+    def fake_export(titles, dest, templates=False):
+        requested.extend(titles)
+        dest.write(EXPORT)
+
+    monkeypatch.setattr(reimport_from_enwiki, "download_enwiki_export", fake_export)
+    cache = ExportCache(str(tmp_path / "cache"))
+    revids = {"Template:Kept": 111, "Template:Deleted since planning": 222}
+
+    xml_path, assembled, downloaded = reimport_from_enwiki.prepare_export(
+        list(revids), revids, cache, str(tmp_path))
+
+    assert requested == ["Template:Kept", "Template:Deleted since planning"]
+    assert assembled == ["Template:Kept"]
+    assert downloaded == 1
+    with open(xml_path, "rb") as f:
+        xml = f.read()
+    assert xml.count(b"<page>") == 1 and b"<title>Template:Kept</title>" in xml
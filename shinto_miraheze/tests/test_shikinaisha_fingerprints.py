@@ -0,0 +1,47 @@
+"""Incremental-run fingerprints for pages that refer to missing or redirected Wikidata items."""
+
+import pytest
+
+import generate_shikinaisha_pages_v25_with_redirects as gen
+
+ITEMS = {
+    "Q2001": {"type": "item", "id": "Q2001", "lastrevid": 601, "labels": {}, "claims": {}},
+    "Q9999": {"id": "Q9999", "missing": ""},
+    # wbgetentities answers a redirected id with the target entity
+    "Q2003": {"type": "item", "id": "Q2010", "lastrevid": 610, "redirects": {"from": "Q2003", "to": "Q2010"},
+              "labels": {}, "claims": {}},
+}
+
+
+@pytest.fixture
+def wikidata(monkeypatch):
+    items = dict(ITEMS)
+    monkeypatch.setattr(gen, "_wbgetentities", lambda ids, props=None, languages=None:
+                        ((qid, items.get(qid)) for qid in ids))
+    monkeypatch.setattr(gen, "ENTITY_CACHE", {})
+    monkeypatch.setattr(gen, "UNAVAILABLE", {})
+    return items
+
+
+def _fingerprint(refs):
+    gen.fetch_entities(refs, claims=gen.REF_CLAIMS)
+    return {"revids": {r: gen.ref_revid(r) for r in refs}, "render": gen.RENDER_VERSION}
+
+
+def test_missing_and_redirected_refs_get_stable_markers(wikidata):
+    fingerprint = _fingerprint(["Q2001", "Q9999", "Q2003"])
+    assert fingerprint["revids"] == {"Q2001": 601, "Q9999": gen.MISSING, "Q2003": "redirect:Q2010"}
+    revisions = gen.get_entity_revisions(fingerprint["revids"])
+    assert gen.is_current(fingerprint, revisions)
+
+
+def test_restored_item_invalidates_fingerprint(wikidata):
+    fingerprint = _fingerprint(["Q2001", "Q9999"])
+    wikidata["Q9999"] = {"type": "item", "id": "Q9999", "lastrevid": 999, "labels": {}, "claims": {}}
+    assert not gen.is_current(fingerprint, gen.get_entity_revisions(fingerprint["revids"]))
+
+
+def test_retargeted_redirect_invalidates_fingerprint(wikidata):
+    fingerprint = _fingerprint(["Q2003"])
+    wikidata["Q2003"] = dict(ITEMS["Q2003"], id="Q2020", redirects={"from": "Q2003", "to": "Q2020"})
+    assert not gen.is_current(fingerprint, gen.get_entity_revisions(fingerprint["revids"]))
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+triage_emmabot_categories_combined.py
+=====================================
+Single-pass replacement for the three EmmaBot category triage scripts
+(triage_emmabot_categories.py, _jawiki.py and _secondary.py).
+
+Reads categories from every triage source category:
+- [[Category:Categories autocreated by EmmaBot]]
+- [[Category:Emmabot categories without enwiki]]
+- [[Category:Emmabot categories without enwiki or jawiki]]
+
+and decides the final bucket for each one in memory:
+
+1. enwiki has a category with the same name →
+   [[Category:Emmabot categories with enwiki]]
+2. else jawiki has one → [[Category:Emmabot categories with jawiki]]
+3. else the secondary heuristics:
+   - name starts with "Articles" → [[Category:Bad template generated categories]]
+   - exactly one member whose name matches the category →
+     [[Category:Category reflection error]] (member counts come from
+     batched prop=categoryinfo; only count == 1 names are checked further)
+   - otherwise → [[Category:Secondary category triage]]
+
+Each batch of up to 50 names is checked against enwiki and jawiki
+concurrently. Existence results are cached in a JSONL state file with a TTL,
+so names that were already checked are not re-queried on the next run.
+Every page is read once and saved once, with all source tags removed.
+
+Default mode is dry-run. Use --apply to save edits.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import mwclient
+import requests
+
+from category_triage import find_reflections, get_member_counts
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL
+
+sys.stdout.reconfigure(encoding="utf-8")
+
+THROTTLE = 1.5
+DEFAULT_CACHE_FILE = "shinto_miraheze/triage_emmabot_categories.state"
+DEFAULT_CACHE_TTL_DAYS = 30
+
+SOURCE_CATS = [
+    "Categories autocreated by EmmaBot",
+    "Emmabot categories without enwiki",
+    "Emmabot categories without enwiki or jawiki",
+]
+WITH_ENWIKI_CAT = "Emmabot categories with enwiki"
+WITH_JAWIKI_CAT = "Emmabot categories with jawiki"
+BAD_TEMPLATE_CAT = "Bad template generated categories"
+REFLECTION_CAT = "Category reflection error"
+SECONDARY_CAT = "Secondary category triage"
+
+FOREIGN_APIS = {
+    "enwiki": "https://en.wikipedia.org/w/api.php",
+    "jawiki": "https://ja.wikipedia.org/w/api.php",
+}
+BATCH_SIZE = 50  # max titles per API query
+
+SOURCE_CAT_RE = re.compile(
+    r"\[\[\s*Category\s*:\s*(?:"
+    + "|".join(re.escape(c).replace(r"\ ", "[ _]") for c in SOURCE_CATS)
+    + r")\s*\]\]\s*\n?",
+    re.IGNORECASE,
+)
+
+
+def load_cache(path, ttl_seconds):
+    """Load {(wiki, name): exists} from the JSONL cache, dropping expired entries."""
+    cache = {}
+    if not os.path.exists(path):
+        return cache
+    cutoff = time.time() - ttl_seconds
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            key = (entry.get("wiki"), entry.get("name"))
+            if entry.get("ts", 0) < cutoff:
+                cache.pop(key, None)
+                continue
+            cache[key] = (bool(entry.get("exists")), entry["ts"])
+    return cache
+
+
+def save_cache(path, cache):
+    """Rewrite the cache file with only the live entries."""
+    with open(path, "w", encoding="utf-8") as f:
+        for (wiki, name), (exists, ts) in sorted(cache.items()):
+            f.write(json.dumps({"wiki": wiki, "name": name, "exists": exists, "ts": ts}, ensure_ascii=False) + "\n")
+
+
+def check_foreign_categories(wiki, titles):
+    """Check which category titles exist on a foreign wiki.
+
+    Returns (set of existing titles, set of titles whose batch failed).
+    """
+    existing = set()
+    failed = set()
+    for i in range(0, len(titles), BATCH_SIZE):
+        batch = titles[i : i + BATCH_SIZE]
+        query_titles = "|".join(f"Category:{t}" for t in batch)
+        try:
+            resp = requests.get(
+                FOREIGN_APIS[wiki],
+                params={
+                    "action": "query",
+                    "titles": query_titles,
+                    "format": "json",
+                },
+                headers={"User-Agent": "EmmaBot/1.0 (shinto.miraheze.org)"},
+                timeout=30,
+            )
+            resp.raise_for_status()
+            data = resp.json()
+        except (requests.RequestException, ValueError) as e:
+            print(f"  WARN {wiki} lookup failed for {len(batch)} names: {e}")
+            failed.update(batch)
+            continue
+        pages = data.get("query", {}).get("pages", {})
+        for page in pages.values():
+            if page.get("missing") is not None:
+                continue
+            full_title = page.get("title", "")
+            if full_title.startswith("Category:"):
+                existing.add(full_title[len("Category:"):])
+        time.sleep(0.5)  # be polite to the foreign wiki
+    return existing, failed
+
+
+def resolve_existence(names, cache):
+    """Fill the cache for any names not already known, querying enwiki and jawiki concurrently.
+
+    Names whose lookup failed are left out of the cache, so they are retried
+    on the next run. Returns (number of names looked up, set of names still
+    unresolved on either wiki).
+    """
+    missing = {
+        wiki: [n for n in names if (wiki, n) not in cache]
+        for wiki in FOREIGN_APIS
+    }
+    if not any(missing.values()):
+        return 0, set()
+    unresolved = set()
+    with ThreadPoolExecutor(max_workers=len(FOREIGN_APIS)) as pool:
+        futures = {wiki: pool.submit(check_foreign_categories, wiki, todo) for wiki, todo in missing.items() if todo}
+        now = int(time.time())
+        for wiki, future in futures.items():
+            try:
+                existing, failed = future.result()
+            except Exception as e:
+                print(f"  WARN {wiki} lookup failed: {e}")
+                existing, failed = set(), set(missing[wiki])
+            unresolved |= failed
+            for name in missing[wiki]:
+                if name not in failed:
+                    cache[(wiki, name)] = (name in existing, now)
+    return len(set(missing["enwiki"]) | set(missing["jawiki"])), unresolved
+
+
+def iter_source_categories(site):
+    """Yield bare category names from all triage source categories, without duplicates."""
+    seen = set()
+    for source in SOURCE_CATS:
+        cat = site.categories[source]
+        for page in cat.members(namespace=14):
+            name = page.name
+            if name.startswith("Category:"):
+                name = name[len("Category:"):]
+            if name not in seen:
+                seen.add(name)
+                yield name
+
+
+def classify_category(name, cache, reflected):
+    """Return (target_cat, tag) for a category given the cached existence results.
+
+    reflected is the set returned by find_reflections for this batch.
+    """
+    if cache.get(("enwiki", name), (False, 0))[0]:
+        return WITH_ENWIKI_CAT, "enwiki"
+    if cache.get(("jawiki", name), (False, 0))[0]:
+        return WITH_JAWIKI_CAT, "jawiki"
+    if name.startswith("Articles"):
+        return BAD_TEMPLATE_CAT, "bad template"
+    if name in reflected:
+        return REFLECTION_CAT, "reflection"
+    return SECONDARY_CAT, "secondary"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--apply", action="store_true", help="Actually edit pages (default is dry-run).")
+    parser.add_argument("--max-edits", type=int, default=100, help="Max pages to process (default 100).")
+    parser.add_argument("--run-tag", required=True, help="Wiki-formatted run tag link for edit summaries.")
+    parser.add_argument("--cache-file", default=DEFAULT_CACHE_FILE, help="Path to enwiki/jawiki existence cache.")
+    parser.add_argument("--cache-ttl-days", type=float, default=DEFAULT_CACHE_TTL_DAYS,
+                        help=f"Re-check cached existence results older than this (default {DEFAULT_CACHE_TTL_DAYS}).")
+    args = parser.parse_args()
+
+    site = mwclient.Site(
+        WIKI_URL,
+        path=WIKI_PATH,
+        clients_useragent="TriageEmmaBotCatsCombined/1.0 (User:EmmaBot; shinto.miraheze.org)",
+    )
+    site.login(USERNAME, PASSWORD)
+    print(f"Logged in as {USERNAME}\n")
+
+    # Collect up to max-edits category names
+    names = []
+    for name in iter_source_categories(site):
+        names.append(name)
+        if len(names) >= args.max_edits:
+            break
+
+    if not names:
+        print("No categories to triage.")
+        return
+
+    print(f"Collected {len(names)} categories to triage.\n")
+
+    cache = load_cache(args.cache_file, args.cache_ttl_days * 86400)
+    print(f"Loaded {len(cache)} cached existence results from {args.cache_file}")
+    print("Checking enwiki and jawiki for matching categories...")
+    looked_up, unresolved = resolve_existence(names, cache)
+    save_cache(args.cache_file, cache)
+    print(f"  Looked up {looked_up} names; {len(names) - looked_up} answered from cache.")
+    if unresolved:
+        names = [n for n in names if n not in unresolved]
+        print(f"  {len(unresolved)} names could not be checked; leaving them for the next run.")
+    print()
+
+    # Secondary heuristics only for names with no enwiki or jawiki match
+    unmatched = [
+        n for n in names
+        if not cache[("enwiki", n)][0] and not cache[("jawiki", n)][0] and not n.startswith("Articles")
+    ]
+    try:
+        counts = get_member_counts(site, unmatched)
+        singles = [n for n in unmatched if counts.get(n) == 1]
+        reflected = find_reflections(site, singles)
+    except Exception as e:
+        print(f"ERROR checking category members: {e}")
+        return
+    print(f"Secondary heuristics: {len(singles)} single-member categories, {len(reflected)} reflections.\n")
+
+    edited = skipped = errors = 0
+    for i, name in enumerate(names, 1):
+        prefix = f"[{i}/{len(names)}] Category:{name}"
+
+        page = site.pages[f"Category:{name}"]
+        try:
+            text = page.text() if page.exists else ""
+        except Exception as e:
+            print(f"{prefix} ERROR reading: {e}")
+            errors += 1
+            continue
+
+        if not page.exists:
+            print(f"{prefix} SKIP (missing)")
+            skipped += 1
+            continue
+
+        target_cat, tag = classify_category(name, cache, reflected)
+
+        # Remove every triage source tag
+        new_text = SOURCE_CAT_RE.sub("", text)
+
+        # Check if target category is already present
+        target_pattern = re.compile(
+            rf"\[\[\s*Category\s*:\s*{re.escape(target_cat)}\s*\]\]",
+            re.IGNORECASE,
+        )
+        if target_pattern.search(new_text):
+            if new_text == text:
+                print(f"{prefix} SKIP (already triaged)")
+                skipped += 1
+                continue
+        else:
+            new_text = new_text.rstrip() + f"\n[[Category:{target_cat}]]\n"
+
+        if new_text == text:
+            print(f"{prefix} SKIP (no change)")
+            skipped += 1
+            continue
+
+        if not args.apply:
+            print(f"{prefix} DRY RUN: would recategorize ({tag})")
+            continue
+
+        try:
+            page.save(
+                new_text,
+                summary=f"Bot: triage autocreated category ({tag}) {args.run_tag}",
+            )
+            edited += 1
+            print(f"{prefix} EDITED ({tag})")
+            time.sleep(THROTTLE)
+        except Exception as e:
+            print(f"{prefix} ERROR: {e}")
+            errors += 1
+
+    print("\n" + "=" * 60)
+    print(f"Processed: {len(names)}")
+    print(f"Edited:    {edited}")
+    print(f"Skipped:   {skipped}")
+    print(f"Errors:    {errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,8 +20,6 @@ Default mode is dry-run. Use --apply to save edits.
 """
 
 import argparse
-import io
-import os
 import re
 import sys
 import time
@@ -29,12 +27,10 @@ import time
 import mwclient
 import requests
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL
+
+sys.stdout.reconfigure(encoding="utf-8")
 
-WIKI_URL = "shinto.miraheze.org"
-WIKI_PATH = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "")
 THROTTLE = 1.5
 
 SOURCE_CAT = "Emmabot categories without enwiki"
@@ -19,20 +19,17 @@ Default mode is dry-run. Use --apply to save edits.
 """
 
 import argparse
-import io
-import os
 import re
 import sys
 import time
 
 import mwclient
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+from category_triage import find_reflections, get_member_counts
+from wiki import PASSWORD, USERNAME, WIKI_PATH, WIKI_URL
+
+sys.stdout.reconfigure(encoding="utf-8")
 
-WIKI_URL = "shinto.miraheze.org"
-WIKI_PATH = "/w/"
-USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
-PASSWORD = os.getenv("WIKI_PASSWORD", "")
 THROTTLE = 1.5
 
 SOURCE_CAT = "Emmabot categories without enwiki or jawiki"
@@ -56,34 +53,20 @@ def iter_source_categories(site):
         yield name
 
 
-def get_category_members(site, cat_name):
-    """Return a list of (namespace, title) tuples for all members of a category."""
-    cat = site.categories[cat_name]
-    members = []
-    for page in cat.members():
-        members.append((page.namespace, page.name))
-    return members
-
-
-def classify_category(name, members):
+def classify_category(name, reflected):
     """Classify a category into one of the three target buckets.
 
-    Returns (target_cat, tag) where tag is a short description for logging.
+    reflected is True when the category's only member has the category's
+    own name (see find_reflections). Returns (target_cat, tag) where tag is
+    a short description for logging.
     """
     # Rule 1: name starts with "Articles"
     if name.startswith("Articles"):
         return BAD_TEMPLATE_CAT, "bad template"
 
     # Rule 2: exactly one member with the same name as the category
-    if len(members) == 1:
-        member_ns, member_name = members[0]
-        # The member's full title may or may not have a namespace prefix.
-        # Strip "Category:" if present for comparison.
-        bare_member = member_name
-        if bare_member.startswith("Category:"):
-            bare_member = bare_member[len("Category:"):]
-        if bare_member == name:
-            return REFLECTION_CAT, "reflection"
+    if reflected:
+        return REFLECTION_CAT, "reflection"
 
     # Rule 3: everything else
     return SECONDARY_CAT, "secondary"
@@ -117,6 +100,17 @@ def main():
 
     print(f"Collected {len(names)} categories to triage.\n")
 
+    # Rule 2 inputs: member counts for all names, reflection check only for count == 1
+    print("Checking member counts...")
+    try:
+        counts = get_member_counts(site, names)
+        singles = [n for n in names if counts.get(n) == 1 and not n.startswith("Articles")]
+        reflected = find_reflections(site, singles)
+    except Exception as e:
+        print(f"ERROR checking category members: {e}")
+        return
+    print(f"  {len(singles)} have exactly one member, {len(reflected)} of them are reflections.\n")
+
     edited = skipped = errors = 0
     for i, name in enumerate(names, 1):
         prefix = f"[{i}/{len(names)}] Category:{name}"
@@ -134,15 +128,7 @@ def main():
             skipped += 1
             continue
 
-        # Fetch category members to check reflection rule
-        try:
-            members = get_category_members(site, name)
-        except Exception as e:
-            print(f"{prefix} ERROR fetching members: {e}")
-            errors += 1
-            continue
-
-        target_cat, tag = classify_category(name, members)
+        target_cat, tag = classify_category(name, name in reflected)
 
         # Remove the source category tag
         new_text = SOURCE_CAT_RE.sub("", text)
@@ -10,6 +10,9 @@ from pathlib import Path
 
 import mwclient
 
+import metrics
+import profiling
+
 WIKI_URL = "shinto.miraheze.org"
 WIKI_PATH = "/w/"
 USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot@EmmaBot")
@@ -21,6 +24,10 @@ END_MARKER = "<!-- BOT-RUN-STATUS:END -->"
 IMMEDIATE_START = "<!-- BOT-IMMEDIATE:START -->"
 IMMEDIATE_END = "<!-- BOT-IMMEDIATE:END -->"
 TODO_PATH = os.getenv("WIKI_TODO_PATH", "TODO.md")
+THROUGHPUT_PREFIX = "* Throughput so far:"
+
+metrics.install_from_env()
+profiling.install_from_env()
 
 
 def load_event_data():
@@ -49,6 +56,15 @@ def summarize_trigger(event_name, event):
     return event_name or "unknown"
 
 
+def throughput_line():
+    """Totals of this run's metrics records (see metrics.py), or None if there are none yet."""
+    path = os.getenv(metrics.METRICS_LOG_ENV, "").strip()
+    records = metrics.load_records(path, run_id=os.getenv("GITHUB_RUN_ID", ""))
+    if not records:
+        return None
+    return f"{THROUGHPUT_PREFIX} {metrics.summarize(records, WIKI_URL)}"
+
+
 def build_status_block(workflow_status=None, stage=None):
     event_name = os.getenv("GITHUB_EVENT_NAME", "local")
     event = load_event_data()
@@ -74,6 +90,9 @@ def build_status_block(workflow_status=None, stage=None):
     ])
     if run_url:
         lines.append(f"* Workflow run: {run_url}")
+    throughput = throughput_line()
+    if throughput:
+        lines.append(throughput)
     lines.append(END_MARKER)
     return "\n".join(lines)
 
@@ -154,8 +173,8 @@ def update_stage_only(site, stage_text, run_tag):
     new_lines = []
     stage_added = False
     for line in old_block.splitlines():
-        if line.startswith("* Current stage:"):
-            continue  # drop old stage line
+        if line.startswith("* Current stage:") or line.startswith(THROUGHPUT_PREFIX):
+            continue  # drop old stage and throughput lines
         new_lines.append(line)
         if line.startswith("* Workflow status:") and not stage_added:
             new_lines.append(f"* Current stage: '''{stage_text}'''")
@@ -164,6 +183,9 @@ def update_stage_only(site, stage_text, run_tag):
     # If there was no workflow status line, append stage at end
     if not stage_added:
         new_lines.append(f"* Current stage: '''{stage_text}'''")
+    throughput = throughput_line()
+    if throughput:
+        new_lines.append(throughput)
 
     new_block = "\n".join(new_lines)
     merged = f"{before}\n{START_MARKER}{new_block}{END_MARKER}\n\n{after}".strip() + "\n"
@@ -0,0 +1,153 @@
+"""
+wiki.py
+=======
+Connection settings and helpers shared by the shinto_miraheze scripts.
+
+Scripts used to log in to the wiki when imported, and each carried its own
+copy of WIKI_URL, load_state/append_state and the querypage/allpages
+loops. Importing a script now has no network side effects, so its
+transform functions can be reused in-process (benchmarks, other scripts):
+
+    site = lazy_site("SomeBot/1.0 (User:EmmaBot; shinto.miraheze.org)")
+    # ... nothing has connected yet ...
+    site.pages["Foo"].text()   # first use connects and logs in
+
+get_session() returns one requests.Session for the process, so calls to
+Wikidata and the Wikipedias reuse connections instead of opening one per
+request.
+
+When WIKI_METRICS_LOG is set, importing this module also starts the
+traffic counters in metrics.py. They append one record per script to that
+file at exit. When WIKI_PROFILE_DIR is set, it starts the profiler in
+profiling.py as well.
+
+Not a standalone script.
+"""
+
+import datetime as dt
+import json
+import os
+
+import mwclient
+import requests
+
+import metrics
+import profiling
+
+WIKI_URL = "shinto.miraheze.org"
+WIKI_PATH = "/w/"
+USERNAME = os.getenv("WIKI_USERNAME", "EmmaBot")
+PASSWORD = os.getenv("WIKI_PASSWORD", "")
+THROTTLE = 1.5
+
+_session = None
+
+metrics.install_from_env()
+profiling.install_from_env()
+
+
+def connect(useragent, login=True):
+    """Create an mwclient.Site for the wiki and (by default) log in."""
+    site = mwclient.Site(WIKI_URL, path=WIKI_PATH, clients_useragent=useragent)
+    if login:
+        site.login(USERNAME, PASSWORD)
+        print(f"Logged in as {USERNAME}", flush=True)
+    return site
+
+
+class LazySite:
+    """Stands in for an mwclient.Site; connects and logs in on first attribute access."""
+
+    def __init__(self, useragent, login=True):
+        self._useragent = useragent
+        self._login = login
+        self._site = None
+
+    def connect(self):
+        if self._site is None:
+            self._site = connect(self._useragent, self._login)
+        return self._site
+
+    def __getattr__(self, name):
+        return getattr(self.connect(), name)
+
+
+def lazy_site(useragent, login=True):
+    return LazySite(useragent, login)
+
+
+def get_session():
+    """The process-wide requests.Session, created on first use."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+    return _session
+
+
+def load_state(path):
+    """Return the set of non-empty lines in a state file (empty if it does not exist)."""
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            s = line.strip()
+            if s:
+                completed.add(s)
+    return completed
+
+
+def append_state(path, title):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(title + "\n")
+
+
+def append_log(path, data):
+    """Append data, stamped with the current UTC time (and workflow run id), as one JSONL line."""
+    payload = dict(data)
+    payload["ts_utc"] = dt.datetime.utcnow().isoformat(timespec="seconds") + "Z"
+    if os.getenv("GITHUB_RUN_ID"):
+        payload.setdefault("run_id", os.getenv("GITHUB_RUN_ID"))
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+
+
+def iter_querypage(site, page):
+    """Yield titles listed on a special page (e.g. "Wantedcategories") via list=querypage."""
+    params = {
+        "list": "querypage",
+        "qppage": page,
+        "qplimit": "max",
+    }
+    while True:
+        data = site.api("query", **params)
+        entries = data.get("query", {}).get("querypage", {}).get("results", [])
+        for entry in entries:
+            title = entry.get("title", "")
+            if title:
+                yield title
+        if "continue" in data:
+            params.update(data["continue"])
+        else:
+            break
+
+
+def iter_allpages(site, namespace, start_title=None, include_redirects=False):
+    """Yield titles in a namespace via list=allpages, non-redirects only unless include_redirects."""
+    params = {
+        "list": "allpages",
+        "apnamespace": namespace,
+        "aplimit": "max",
+    }
+    if not include_redirects:
+        params["apfilterredir"] = "nonredirects"
+    if start_title:
+        params["apfrom"] = start_title
+    while True:
+        result = site.api("query", **params)
+        for entry in result.get("query", {}).get("allpages", []):
+            yield entry["title"]
+        if "continue" in result:
+            params.update(result["continue"])
+        else:
+            break
@@ -0,0 +1,174 @@
+"""
+wikidata_entity.py
+==================
+Compact in-memory record for Wikidata entities.
+
+The Wikidata scripts used to keep whole entity JSON around: every label,
+description and alias in every language, plus hashes, ranks, snak types and
+datatypes on every claim. They only ever read en/ja labels, sitelink
+titles and claim values. An Entity keeps just that:
+
+    entity.id          "Q123"
+    entity.lastrevid   2345678
+    entity.labels      {"en": "...", "ja": "..."}   (requested languages only)
+    entity.sitelinks   {"jawiki": "title", ...}
+    entity.claims      {"P31": (Claim, ...), ...}
+
+and each Claim keeps its main value, its qualifier values and its
+reference values:
+
+    claim.value        "text", {"id": "Q5"}, {"latitude": ..., ...}, or None
+    claim.qualifiers   {"P580": (value, ...), ...}
+    claim.references   ({"P248": (value, ...), "P854": (...)}, ...)
+
+Item values are cut down to {"id": QID}; other values (times, quantities,
+coordinates) are kept as Wikidata returns them. Property ids, language
+codes and site ids are interned, so the thousands of entities cached in a
+run share one copy of each. With claims=(...), only those properties are
+kept and the entity is marked partial; fetchers use that for items that
+are only looked up for a label or a link.
+
+Entities are built from wbgetentities / dump JSON with Entity.from_json
+and round-trip through the entity store written by ingest_wikidata_dump.py
+with to_record / from_record (load_entity_store).
+
+Not a standalone script; imported by the shikinaisha generator,
+ingest_wikidata_dump.py and generate_p11250_quickstatements.py.
+"""
+
+import gzip
+import json
+import sys
+
+LANGUAGES = ("en", "ja")
+API_LANGUAGES = "|".join(LANGUAGES)  # wbgetentities languages= for these labels
+API_PROPS = "info|labels|sitelinks|claims"  # wbgetentities props= for a full Entity
+
+_intern = sys.intern
+
+
+def _value(snak):
+    """The essential value of a snak: {"id": QID} for items, the raw value otherwise."""
+    value = snak.get("datavalue", {}).get("value")
+    if isinstance(value, dict) and "id" in value:
+        return {"id": _intern(value["id"])}
+    return value
+
+
+def _snak_values(snaks):
+    return {_intern(pid): tuple(_value(s) for s in group) for pid, group in snaks.items()}
+
+
+class Claim:
+    __slots__ = ("value", "qualifiers", "references")
+
+    def __init__(self, value, qualifiers=None, references=()):
+        self.value = value
+        self.qualifiers = qualifiers or {}
+        self.references = references
+
+    @classmethod
+    def from_json(cls, claim):
+        return cls(
+            _value(claim.get("mainsnak", {})),
+            _snak_values(claim.get("qualifiers", {})),
+            tuple(_snak_values(ref.get("snaks", {})) for ref in claim.get("references", [])),
+        )
+
+    def to_record(self):
+        record = {"value": self.value}
+        if self.qualifiers:
+            record["qualifiers"] = {pid: list(values) for pid, values in self.qualifiers.items()}
+        if self.references:
+            record["references"] = [{pid: list(values) for pid, values in ref.items()} for ref in self.references]
+        return record
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(
+            record.get("value"),
+            {_intern(pid): tuple(values) for pid, values in record.get("qualifiers", {}).items()},
+            tuple({_intern(pid): tuple(values) for pid, values in ref.items()}
+                  for ref in record.get("references", [])),
+        )
+
+
+class Entity:
+    __slots__ = ("id", "lastrevid", "labels", "sitelinks", "claims", "partial")
+
+    def __init__(self, id, lastrevid=None, labels=None, sitelinks=None, claims=None, partial=False):
+        self.id = id
+        self.lastrevid = lastrevid
+        self.labels = labels or {}
+        self.sitelinks = sitelinks or {}
+        self.claims = claims or {}
+        self.partial = partial
+
+    @classmethod
+    def from_json(cls, entity, languages=LANGUAGES, claims=None):
+        """Build from wbgetentities / dump JSON. claims=(pid, ...) keeps only those properties."""
+        return cls(
+            entity["id"],
+            entity.get("lastrevid"),
+            {_intern(lang): v["value"] for lang, v in entity.get("labels", {}).items() if lang in languages},
+            {_intern(site): v["title"] for site, v in entity.get("sitelinks", {}).items()},
+            {_intern(pid): tuple(Claim.from_json(c) for c in group)
+             for pid, group in entity.get("claims", {}).items() if claims is None or pid in claims},
+            claims is not None,
+        )
+
+    def to_record(self):
+        record = {"id": self.id, "lastrevid": self.lastrevid, "labels": self.labels,
+                  "sitelinks": self.sitelinks,
+                  "claims": {pid: [c.to_record() for c in group] for pid, group in self.claims.items()}}
+        if self.partial:
+            record["partial"] = True
+        return record
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(
+            record["id"],
+            record.get("lastrevid"),
+            {_intern(lang): label for lang, label in record.get("labels", {}).items()},
+            {_intern(site): title for site, title in record.get("sitelinks", {}).items()},
+            {_intern(pid): tuple(Claim.from_record(c) for c in group)
+             for pid, group in record.get("claims", {}).items()},
+            record.get("partial", False),
+        )
+
+    def __repr__(self):
+        return f"Entity({self.id!r}, lastrevid={self.lastrevid!r})"
+
+
+def referenced_qids(entity):
+    """Item QIDs referenced from an entity's claims, qualifiers and references."""
+    refs = set()
+    for group in entity.claims.values():
+        for claim in group:
+            values = [claim.value]
+            for quals in claim.qualifiers.values():
+                values.extend(quals)
+            for ref in claim.references:
+                for ref_values in ref.values():
+                    values.extend(ref_values)
+            for value in values:
+                if isinstance(value, dict) and "id" in value:
+                    refs.add(value["id"])
+    return refs
+
+
+def load_entity_store(path):
+    """Return ({QID: Entity}, {property id: English label}) from a store written by ingest_wikidata_dump.py."""
+    entities, property_labels = {}, {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record["id"].startswith("P"):
+                property_labels[record["id"]] = record["label"]
+            else:
+                entities[record["id"]] = Entity.from_record(record)
+    return entities, property_labels